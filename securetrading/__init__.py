@@ -5,6 +5,8 @@
 from __future__ import unicode_literals
 from .requestobject import Request
 from .requestobject import Requests
+from .requestobject import RequestTemplate
+from .requestobject import TemplateRequest
 from .responseobject import Response
 from .exceptions import SecureTradingError
 from .exceptions import ApiError
@@ -13,20 +15,15 @@ from .exceptions import ConnectionError
 from .exceptions import SendReceiveError
 from .converter import Converter
 from .config import Config
-from .api import Api
 from .phrasebook import PhraseBook
+from .retry import RetryPolicy
+from .retry import ExponentialBackoffRetryPolicy
+from .timing import Timings
 
 import securetrading.util
+import importlib
 import pkgutil
-import platform
-
-dataFile = 'data/errormessages.json'
-data = pkgutil.get_data('securetrading', dataFile).decode("utf-8")
-error_messages = securetrading.util.json.loads(data)
-
-dataFile = 'data/phrasebook.json'
-data = pkgutil.get_data('securetrading', dataFile).decode("utf-8")
-phrase_book = securetrading.util.json.loads(data)
+import sys
 
 
 __title__ = 'Trust Payments API'
@@ -35,9 +32,80 @@ __author__ = 'Trust Payments Ltd'
 __license__ = 'MIT'
 __copyright__ = 'Copyright 2016 Trust Payments Ltd'
 
-version_information = ["Python",
-                       platform.python_version(),
-                       securetrading.__version__,
-                       platform.platform(),
-                       ]
-version_info = "::".join(version_information)
+
+# The attributes below are only loaded when they are first used, so that
+# importing the package does not read the data files, probe the platform or
+# import requests and asyncio. Once loaded they are ordinary attributes and
+# may be reassigned.
+
+def _load_data(data_file):
+    data = pkgutil.get_data('securetrading', data_file).decode("utf-8")
+    return securetrading.util._json_loads(data)
+
+
+def _get_error_messages():
+    return _load_data('data/errormessages.json')
+
+
+def _get_phrase_book():
+    return _load_data('data/phrasebook.json')
+
+
+def _get_version_information():
+    import platform
+    return ["Python",
+            platform.python_version(),
+            securetrading.__version__,
+            platform.platform(),
+            ]
+
+
+def _get_version_info():
+    return "::".join(securetrading.version_information)
+
+
+def _get_api():
+    return importlib.import_module(".api", __name__).Api
+
+
+def _get_async_api():
+    return importlib.import_module(".asyncapi", __name__).AsyncApi
+
+
+_lazy_attributes = {"error_messages": _get_error_messages,
+                    "phrase_book": _get_phrase_book,
+                    "version_information": _get_version_information,
+                    "version_info": _get_version_info,
+                    "Api": _get_api,
+                    }
+
+# The submodules that used to be imported with the package, so that
+# securetrading.httpclient and the like still work after import securetrading
+_lazy_submodules = ["api", "circuitbreaker", "endpoint", "hooks", "httpclient",
+                    "metrics", "profile", "singleflight"]
+
+if not securetrading.util._is_python_2():
+    _lazy_attributes["AsyncApi"] = _get_async_api
+    _lazy_submodules.extend(["asyncapi", "asynchttpclient"])
+
+
+def __getattr__(name):
+    loader = _lazy_attributes.get(name)
+    if loader is not None:
+        # A thread that loads the attribute at the same time as another
+        # keeps the value that was stored first.
+        return globals().setdefault(name, loader())
+    if name in _lazy_submodules:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(
+        __name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
+
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ (PEP 562) is not supported, so load everything now
+    for _name in _lazy_attributes:
+        __getattr__(_name)
@@ -1,5 +1,33 @@
 from __future__ import unicode_literals
 import securetrading
+import logging
+
+# The validate and set methods of each class, by the key that they handle
+_dispatch_tables = {}
+
+
+def _get_dispatch_table(cls):
+    # Built from the class the first time one of its objects is set, so
+    # methods added to the class after that are not found.
+    dispatch_table = _dispatch_tables.get(cls)
+    if dispatch_table is None:
+        methods = {}
+        for name in dir(cls):
+            for index, prefix in enumerate(["_validate_", "_set_"]):
+                if name.startswith(prefix):
+                    key = name[len(prefix):]
+                    pair = methods.setdefault(key, [None, None])
+                    pair[index] = getattr(cls, name)
+        methods = dict((key, tuple(pair)) for key, pair in methods.items())
+        # update may only bypass __setitem__ if no subclass overrides it,
+        # or the class overriding it says that update does what it does.
+        setitem_class = [base for base in cls.__mro__
+                         if "__setitem__" in vars(base)][0]
+        fast_update = setitem_class is AbstractStObject or\
+            vars(setitem_class).get("_update_bypasses_setitem", False)
+        dispatch_table = (methods, frozenset(methods), fast_update)
+        _dispatch_tables[cls] = dispatch_table
+    return dispatch_table
 
 
 class AbstractStObject(dict):
@@ -26,12 +54,39 @@ will also automatically call validation on some of the values inserted.
            This method will raise a securetrading.ApiError during the
 automatic validation, if the value is invalid.
         """
+        methods, keys, fast_update = _get_dispatch_table(type(self))
+        if fast_update and not self.__dict__ and keys.isdisjoint(data) and\
+                not securetrading.util.logger.isEnabledFor(logging.DEBUG):
+            # None of the keys has a validate or set method
+            dict.update(self, data)
+            return
         for key in data:
             self.__setitem__(key, data[key])
 
     def __setitem__(self, key, value, use_set_method=True):
-        debug = "{0} Setting {1}".format(self.get("requestreference"), key)
-        securetrading.util.logger.debug(debug)
+        if securetrading.util.logger.isEnabledFor(logging.DEBUG):
+            securetrading.util._log(logging.DEBUG,
+                                    self.get("requestreference"),
+                                    "Setting %s", key)
+        if self.__dict__:
+            # Methods set on the object itself are looked up by name
+            self._setitem_by_name(key, value, use_set_method)
+            return
+        methods = _dispatch_tables.get(type(self)) or\
+            _get_dispatch_table(type(self))
+        pair = methods[0].get(key)
+        if pair is None:
+            dict.__setitem__(self, key, value)
+            return
+        validate_method, set_method = pair
+        if validate_method is not None:
+            validate_method(self, value)
+        if use_set_method and set_method is not None:
+            set_method(self, value)
+        else:
+            dict.__setitem__(self, key, value)
+
+    def _setitem_by_name(self, key, value, use_set_method):
         validate_method = "_validate_{0}".format(key)
         if hasattr(self, validate_method):
             getattr(self, validate_method)(value)
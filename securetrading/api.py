@@ -1,8 +1,20 @@
 from __future__ import unicode_literals
+import functools
+import logging
+import threading
+import time
 import securetrading
+import securetrading.cache as cache
+import securetrading.circuitbreaker as circuitbreaker
+import securetrading.endpoint as endpoint
+import securetrading.hooks as hooks
 import securetrading.httpclient as httpclient
+import securetrading.metrics as metrics
 import securetrading.phrasebook as phrasebook
-import six
+import securetrading.retry as retry
+import securetrading.singleflight as singleflight
+import securetrading.timing as timing
+from securetrading.profile import TransportProfile
 
 
 class Api(object):
@@ -18,7 +30,10 @@ Trust Payments and returns the response.
         This method will initialise the Trust Payments Python API
 that can submit requests to Trust Payments and handle
 the response. The API is thread-safe, therefore it can
-be used by multiple threads at the same time.
+be used by multiple threads at the same time. It is also fork-safe, an Api
+created and used before a pre-forking server forks its workers keeps its
+configuration and cached responses in each worker, while its connections,
+locks and worker threads are rebuilt there.
 
         Args:
            config:  A securetrading.SecureTradingConfig
@@ -30,7 +45,191 @@ object containing various settings.
         """
         self.config = config
         self.phrasebook = phrasebook.PhraseBook(self.config)
+        # Compiled now so that the first response does not wait for it
+        phrasebook._get_table(self.config.locale)
+        self.retry_budget = retry.RetryBudget(self.config)
+        self.circuit_breakers = circuitbreaker.CircuitBreakers(self.config)
+        self.endpoint_latencies = endpoint.EndpointLatencies()
+        self.response_cache = cache.ResponseCache(self.config)
+        self.single_flight = singleflight.SingleFlight(self.config)
+        self.timing_callbacks = []
+        self.metrics = metrics.Metrics()
+        self.hooks = hooks.Hooks()
+        self.http_client = self._get_http_client()
+        self._profile = None
+        self._executor = None
+        self._executor_workers = 0
+        self._executor_lock = threading.Lock()
         super(Api, self).__init__()
+        securetrading.util._register_after_fork(self)
+
+    @property
+    def http_pool(self):
+        """The connection pool of the HTTP client shared by every request."""
+        return self.http_client.pool
+
+    @http_pool.setter
+    def http_pool(self, pool):
+        self.http_client.pool = pool
+
+    def close(self):
+        """Closes the pooled connections and worker threads held by this Api.
+
+        The pool is rebuilt automatically if the Api is used again.
+
+        Usage:
+           >>> st_api.close()
+        """
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+            self._executor_workers = 0
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self.http_pool._close()
+
+    def get_circuit_states(self):
+        """Returns the state of the circuit breaker of each datacenter url.
+
+        Each state is either "closed", "open" or "half-open". Only the
+datacenter urls that this Api has sent requests to are included.
+
+        Returns:
+           A dict mapping each datacenter url to its circuit breaker state.
+
+        Usage:
+           >>> st_api.get_circuit_states()
+           {'https://webservices.securetrading.net': 'closed'}
+        """
+        return self.circuit_breakers._get_states()
+
+    def get_cache_stats(self):
+        """Returns the statistics of the response cache of this Api.
+
+        Returns:
+           A dict of the number of cache hits, misses, entries and the total
+size of the cached responses in bytes.
+
+        Usage:
+           >>> st_api.get_cache_stats()
+           {'hits': 10, 'misses': 2, 'entries': 2, 'bytes': 1024}
+        """
+        return self.response_cache._get_stats()
+
+    def add_hook(self, event, hook):
+        """Registers a hook called at an event of the request lifecycle.
+
+        The events are "before_encode", "after_encode", "before_attempt",
+"after_attempt", "after_decode" and "on_error". The hook is called with the
+requestreference, the securetrading.Timings of the request so far and a
+dict of the details of the event, on the thread or event loop processing
+the request:
+before_encode: {"request": the request}
+after_encode: {"size": the size of the encoded request}
+before_attempt: {"url": the url, "attempt": the attempt number from 0}
+after_attempt: {"url", "attempt", "seconds": the time the attempt took,
+"exception": the exception that ended the attempt or None}
+after_decode: {"response": the response}
+on_error: {"exception": the exception returned as an error response}
+An exception raised by a hook is logged and does not affect the request.
+
+        Args:
+           event: The name of the event.
+           hook: A callable taking the requestreference, timings and details.
+
+        Raises:
+           AssertionError: If the event is not one of the events above.
+
+        Usage:
+           >>> def on_attempt(request_reference, timings, details):
+           ...     span.add_event("attempt", details)
+           >>> st_api.add_hook("after_attempt", on_attempt)
+        """
+        self.hooks._add(event, hook)
+
+    def remove_hook(self, event, hook):
+        """Unregisters a hook added with add_hook.
+
+        Args:
+           event: The name of the event the hook was added for.
+           hook: The callable to remove.
+
+        Raises:
+           ValueError: If the hook is not registered for the event.
+
+        Usage:
+           >>> st_api.remove_hook("after_attempt", on_attempt)
+        """
+        self.hooks._remove(event, hook)
+
+    def get_metrics(self):
+        """Returns the metrics of the requests processed by this Api.
+
+        The metrics are securetrading_responses_total, counting responses
+by requesttype and errorcode, securetrading_request_duration_seconds, a
+histogram of the time taken by each request by requesttype and errorcode,
+securetrading_http_attempts_total, counting each attempt to send a request
+by endpoint and HTTP status (error when no response was received),
+securetrading_http_retries_total, counting the attempts after the first by
+endpoint, and securetrading_http_attempt_duration_seconds, a histogram of
+the time taken by each attempt by endpoint.
+
+        Returns:
+           A dict mapping each metric name to a list of samples. A counter
+sample is a dict of its "labels" and "value", a histogram sample is a dict
+of its "labels", the cumulative "buckets" as (upper bound, count) tuples,
+the "count" and the "sum" of the observed seconds.
+
+        Usage:
+           >>> st_api.get_metrics()["securetrading_responses_total"]
+           [{'labels': {'requesttype': 'AUTH', 'errorcode': '0'},
+             'value': 10}]
+        """
+        return self.metrics._get_snapshot()
+
+    def get_prometheus_metrics(self):
+        """Returns the metrics of this Api in the Prometheus text format.
+
+        Returns:
+           The metrics described in get_metrics in the Prometheus text
+exposition format.
+
+        Usage:
+           >>> print(st_api.get_prometheus_metrics())
+           # HELP securetrading_responses_total Responses by request type ...
+           # TYPE securetrading_responses_total counter
+           securetrading_responses_total{errorcode="0",requesttype="AUTH"} 10
+        """
+        return self.metrics._render_prometheus()
+
+    def add_timing_callback(self, callback):
+        """Registers a callback that receives the timings of every request.
+
+        The callback is called with a securetrading.Timings object once
+each request has been processed, on the thread that processed it. An
+exception raised by the callback is logged and does not affect the
+response.
+
+        Args:
+           callback: A callable taking a securetrading.Timings object.
+
+        Usage:
+           >>> st_api.add_timing_callback(lambda timings: print(timings.total))
+        """
+        self.timing_callbacks.append(callback)
+
+    def remove_timing_callback(self, callback):
+        """Unregisters a callback added with add_timing_callback.
+
+        Args:
+           callback: The callable to remove.
+
+        Raises:
+           ValueError: If the callback is not registered.
+
+        Usage:
+           >>> st_api.remove_timing_callback(on_timings)
+        """
+        self.timing_callbacks.remove(callback)
 
     def process(self, request):
         """Submits a request to be processed by Trust Payments.
@@ -50,46 +249,252 @@ details
         Usage:
            >>> response = st_api.process(request)
         """
-        request_reference = ""
+        return self._process(request)
+
+    def process_many(self, requests, max_workers=None, ordered=True,
+                     timeout=None):
+        """Submits many independent requests to be processed concurrently.
+
+        The requests are processed on a worker pool shared by this Api,
+over the same pooled connections as process. Each response is identical
+to the one process would have returned for that request. This is a
+generator, requests are only submitted while it is being consumed.
+
+        Args:
+           requests: An iterable of securetrading.Request,
+securetrading.Requests or dict objects.
+           max_workers: (optional [int]) The maximum number of these requests
+processed at the same time. Defaults to config.http_pool_maxsize.
+           ordered: (optional [bool]) When True the responses are yielded in
+the order of the requests, otherwise as soon as each one completes.
+           timeout: (optional [int or float]) The deadline in seconds for each
+request, measured from when it is submitted to the worker pool. A request
+that cannot connect before its deadline returns error code 7.
+
+        Returns:
+           A generator of securetrading.Response objects.
+
+        Usage:
+           >>> for response in st_api.process_many(requests):
+           ...     print(response["requestreference"])
+        """
+        if max_workers is None:
+            max_workers = self.config.http_pool_maxsize
+        msg = "An int greater than 0 is required for max_workers"
+        assert isinstance(max_workers, int) and max_workers > 0, msg
+        from concurrent import futures
+
+        iterator = enumerate(requests)
+        exhausted = False
+        in_flight = {}
+        completed = {}
+        next_index = 0
+        while True:
+            while not exhausted and len(in_flight) < max_workers:
+                try:
+                    index, request = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                deadline = None
+                if timeout is not None:
+                    deadline = time.time() + timeout
+                future = self._submit(max_workers, self._process, request,
+                                      deadline=deadline)
+                in_flight[future] = index
+            if not in_flight:
+                break
+            done, _ = futures.wait(in_flight,
+                                   return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                if ordered:
+                    completed[index] = future.result()
+                else:
+                    yield future.result()
+            while next_index in completed:
+                yield completed.pop(next_index)
+                next_index += 1
+
+    def _submit(self, max_workers, function, *args, **kwargs):
+        from concurrent import futures
+        with self._executor_lock:
+            if self._executor_workers < max_workers:
+                if self._executor is not None:
+                    # Work already submitted to the old pool still completes
+                    self._executor.shutdown(wait=False)
+                self._executor = futures.ThreadPoolExecutor(max_workers)
+                self._executor_workers = max_workers
+            return self._executor.submit(function, *args, **kwargs)
+
+    def _after_fork(self):
+        # Called in the child process of a fork. Only the forking thread
+        # survives it, so locks held by the other threads of the parent
+        # would never be released and its worker threads are gone.
+        self._executor = None
+        self._executor_workers = 0
+        self._executor_lock = threading.Lock()
+        for component in [self.http_pool, self.retry_budget,
+                          self.circuit_breakers, self.endpoint_latencies,
+                          self.response_cache, self.single_flight,
+                          self.metrics, self.hooks]:
+            component._after_fork()
+
+    def _process(self, request, deadline=None):
+        securetrading.util._check_fork()
+        timings = timing.Timings()
+        request = self._get_request(request)
         try:
-            if type(request) == dict:
-                st_request = securetrading.Request()
-                st_request.update(request)
-                request = st_request
+            profile = self._verify(request, timings)
+            cache_key, cache_ttl, result = self._get_cached(request, profile,
+                                                            timings)
+            if result is None:
+                send = functools.partial(self._send_request, request,
+                                         profile, deadline, cache_key,
+                                         cache_ttl, timings)
+                if self.single_flight._is_enabled(request):
+                    result = self.single_flight._do(
+                        cache_key, send, timings.request_reference, timings)
+                else:
+                    result = send()
+        except Exception as e:
+            result = self._get_error_result(e, timings)
+        return self._finish(request, result, timings)
+
+    def _get_request(self, request):
+        if type(request) == dict:
+            st_request = securetrading.Request()
+            st_request.update(request)
+            request = st_request
+        return request
 
+    def _verify(self, request, timings):
+        # The steps before a request is sent that are shared with AsyncApi,
+        # returning the TransportProfile to send the request with.
+        with timings._measure("verify"):
             self._verify_request(request)
             request_reference = request["requestreference"]
-            info = "{0} Begin request".format(request_reference)
-            securetrading.util.logger.info(info)
-            http_client = httpclient._get_client(request_reference,
-                                                 self.config)
+            timings.request_reference = request_reference
+            securetrading.util._log(logging.INFO, request_reference,
+                                    "Begin request")
+            profile = self._get_profile()
             request.verify()
-            url = six.moves.urllib.parse.urljoin(self.config.datacenterurl,
-                                                 self.config.datacenterpath)
-            converter = securetrading.Converter(self.config)
+            request_schema = self.config.request_schema
+            if request_schema is not None:
+                request_schema.check(request)
+        return profile
+
+    def _get_cached(self, request, profile, timings):
+        # The cache key and ttl of the request, with its cached response or
+        # None if it must be sent
+        cache_key, cache_ttl = self._get_cache_key(request, profile)
+        result = None
+        if cache_ttl is not None:
+            with timings._measure("cache"):
+                result = self.response_cache._get(cache_key,
+                                                  timings.request_reference)
+        return cache_key, cache_ttl, result
+
+    def _get_cache_key(self, request, profile):
+        cache_ttl = self.response_cache._get_ttl(request)
+        if cache_ttl is None and not self.single_flight._is_enabled(request):
+            return None, None
+        return self.response_cache._get_key(request, profile), cache_ttl
+
+    def _send_request(self, request, profile, deadline, cache_key, cache_ttl,
+                      timings):
+        request_reference = timings.request_reference
+        request_data = self._encode(profile.converter, request,
+                                    request_reference, timings)
+        response, response_headers = self.http_client._main(
+            profile.url, request_data, request_reference, request,
+            deadline=deadline, profile=profile, timings=timings)
+        return self._get_result(profile, response, response_headers,
+                                cache_key, cache_ttl, timings)
+
+    def _get_result(self, profile, response, response_headers, cache_key,
+                    cache_ttl, timings):
+        result = self._decode(profile.converter, response, response_headers,
+                              timings.request_reference, timings)
+        if cache_ttl is not None:
+            self.response_cache._put(cache_key, cache_ttl, result,
+                                     len(response))
+        return result
+
+    def _get_error_result(self, e, timings):
+        request_reference = timings.request_reference
+        self._call_hooks("on_error", request_reference, timings,
+                         {"exception": e})
+        if isinstance(e, securetrading.SecureTradingError):
+            return self._generate_st_error(e, request_reference)
+        return self._generate_error(e, request_reference)
+
+    def _finish(self, request, result, timings):
+        with timings._measure("errormessage"):
+            self._set_errormessages(result)
+        self._finish_timings(request, result, timings)
+        securetrading.util._log(logging.INFO, timings.request_reference,
+                                "Finished request")
+        return result
+
+    def _get_http_client(self):
+        return httpclient._get_client(
+            self.config, pool=httpclient.HTTPConnectionPool(self.config),
+            retry_budget=self.retry_budget,
+            circuit_breakers=self.circuit_breakers,
+            latencies=self.endpoint_latencies, hooks=self.hooks)
+
+    def _call_hooks(self, event, request_reference, timings, data):
+        if self.hooks._hooks:
+            self.hooks._call(event, request_reference, timings, data)
+
+    def _encode(self, converter, request, request_reference, timings):
+        self._call_hooks("before_encode", request_reference, timings,
+                         {"request": request})
+        with timings._measure("encode"):
             request_data = converter._encode(request)
-            response, response_headers = http_client._main(url,
-                                                           request_data,
-                                                           request_reference,
-                                                           request)
+        self._call_hooks("after_encode", request_reference, timings,
+                         {"size": len(request_data)})
+        return request_data
+
+    def _decode(self, converter, response, response_headers,
+                request_reference, timings):
+        with timings._measure("decode"):
             result = converter._decode(response, response_headers,
                                        request_reference)
             self._verify_result(result, request_reference)
-        except securetrading.SecureTradingError as e:
-            result = self._generate_st_error(e, request_reference)
-        except Exception as e:
-            result = self._generate_error(e, request_reference)
-        info = "{0} Finished request".format(request_reference)
+        self._call_hooks("after_decode", request_reference, timings,
+                         {"response": result})
+        return result
+
+    def _get_profile(self):
+        profile = self._profile
+        if profile is None or not profile._is_current():
+            profile = TransportProfile(self.config)
+            self._profile = profile
+        return profile
+
+    def _finish_timings(self, request, result, timings):
+        timings._finish()
+        self.metrics._record(request, result, timings)
+        if self.config.response_timings:
+            result["timings"] = timings.as_dict()
+        for callback in list(self.timing_callbacks):
+            try:
+                callback(timings)
+            except Exception:
+                securetrading.util._log(logging.ERROR,
+                                        timings.request_reference,
+                                        "Timing callback failed",
+                                        exc_info=True)
 
-        get_error_message = securetrading.util._get_errormessage
+    def _set_errormessages(self, result):
+        lookup_error = self.phrasebook.lookup_error
+        locale = self.config.locale
         for response in result["responses"]:
             response["errormessage"] =\
-                get_error_message(response["errorcode"],
-                                  response.get("errormessage", ""),
-                                  self.phrasebook)
-
-        securetrading.util.logger.info(info)
-        return result
+                lookup_error(response["errorcode"],
+                             response.get("errormessage", ""), locale)
 
     def _verify_request(self, request):
         if not isinstance(request, securetrading.Request):
@@ -104,8 +509,9 @@ details
             raise securetrading.SecureTradingError("9", data=data)
 
     def _generate_error(self, e, request_reference):
-        excep = "Trust Payments API had an unexpected error"
-        securetrading.util.logger.exception(excep)
+        securetrading.util._log(logging.ERROR, request_reference,
+                                "Trust Payments API had an unexpected error",
+                                exc_info=True)
         data = ["{0}".format("\n".join(e.args))]
         error = securetrading.SecureTradingError("9", data=data)
         return self._generate_st_error(error, request_reference)
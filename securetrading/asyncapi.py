@@ -0,0 +1,211 @@
+from __future__ import unicode_literals
+import asyncio
+import functools
+import time
+import securetrading
+import securetrading.asynchttpclient as asynchttpclient
+import securetrading.cache as cache
+import securetrading.singleflight as singleflight
+import securetrading.timing as timing
+from securetrading.api import Api
+
+
+class _AsyncCall(object):
+
+    def __init__(self, future):
+        super(_AsyncCall, self).__init__()
+        self.future = future
+        self.followers = 0
+
+
+class AsyncSingleFlight(singleflight.SingleFlight):
+    """Shares one in-flight call between identical concurrent coroutines.
+
+    The asyncio equivalent of securetrading.singleflight.SingleFlight. The
+call is a coroutine function, and a coroutine sending an identical request
+before that call completes awaits it rather than a thread waiting. Calls are
+only shared between coroutines of the same event loop.
+"""
+
+    async def _do(self, key, function, request_reference, timings=None):
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _AsyncCall(loop.create_future())
+                self._calls[key] = call
+            else:
+                call.followers += 1
+                self.shared += 1
+        if leader:
+            try:
+                result = await function()
+            except BaseException as e:
+                call.future.set_exception(e)
+                # Retrieved, so that a call without followers is not logged
+                # as an exception that was never retrieved
+                call.future.exception()
+                raise
+            else:
+                call.future.set_result(result)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+            if not call.followers:
+                return result
+            # The followers copy the result, so the leader must not be
+            # handed the same object to modify.
+        elif timings is not None:
+            with timings._measure("single_flight"):
+                # Shielded, so that cancelling a follower leaves the call
+                # of the others running
+                result = await asyncio.shield(call.future)
+        else:
+            result = await asyncio.shield(call.future)
+        return cache._copy_response(result, request_reference)
+
+
+class AsyncApi(Api):
+    """Trust Payments Python API for asyncio applications.
+
+    This is the asyncio equivalent of securetrading.Api. Requests are sent
+over a keep-alive connection pool shared by every coroutine using the
+AsyncApi, so one event loop can keep many transactions in flight without
+a thread for each of them.
+    """
+
+    def __init__(self, config):
+        """Initialises the asynchronous Trust Payments Python API.
+
+        At most config.http_pool_maxsize requests are sent at the same
+time, any further requests wait for a connection to become free.
+
+        Args:
+           config:  A securetrading.SecureTradingConfig
+object containing various settings.
+
+        Usage:
+           >>> import securetrading
+           >>> st_api = securetrading.AsyncApi(st_config)
+        """
+        super(AsyncApi, self).__init__(config)
+        self.single_flight = AsyncSingleFlight(self.config)
+
+    async def close(self):
+        """Closes the pooled connections held by this AsyncApi.
+
+        Usage:
+           >>> await st_api.close()
+        """
+        await self.http_pool._close()
+
+    def _get_http_client(self):
+        return asynchttpclient.AsyncHTTPClient(
+            self.config,
+            pool=asynchttpclient.AsyncHTTPConnectionPool(self.config),
+            retry_budget=self.retry_budget,
+            circuit_breakers=self.circuit_breakers,
+            latencies=self.endpoint_latencies, hooks=self.hooks)
+
+    async def process(self, request):
+        """Submits a request to be processed by Trust Payments.
+
+        This coroutine takes the details of the request and then connects
+and sends the data to Trust Payments, waiting for a reply or timeout
+before returning the response. Connection retries sleep without blocking
+the event loop.
+
+        Args:
+           request: Either a securetrading.Request or a securetrading.Requests
+object containing the details of the request.
+
+        Returns:
+           A securetrading.Response object containing all the response
+details
+
+        Usage:
+           >>> response = await st_api.process(request)
+        """
+        return await self._process(request)
+
+    async def process_many(self, requests, max_workers=None, ordered=True,
+                           timeout=None):
+        """Submits many independent requests to be processed concurrently.
+
+        The requests are processed by coroutines on the running event loop,
+over the same pooled connections as process. Each response is identical
+to the one process would have returned for that request.
+
+        Args:
+           requests: An iterable of securetrading.Request,
+securetrading.Requests or dict objects.
+           max_workers: (optional [int]) The maximum number of these requests
+processed at the same time. Defaults to config.http_pool_maxsize.
+           ordered: (optional [bool]) When True the responses are returned in
+the order of the requests, otherwise in the order they completed.
+           timeout: (optional [int or float]) The deadline in seconds for each
+request, measured from when it starts being processed. A request that cannot
+connect before its deadline returns error code 7.
+
+        Returns:
+           A list of securetrading.Response objects.
+
+        Usage:
+           >>> for response in await st_api.process_many(requests):
+           ...     print(response["requestreference"])
+        """
+        if max_workers is None:
+            max_workers = self.config.http_pool_maxsize
+        msg = "An int greater than 0 is required for max_workers"
+        assert isinstance(max_workers, int) and max_workers > 0, msg
+        semaphore = asyncio.Semaphore(max_workers)
+        completed = []
+
+        async def process(request):
+            async with semaphore:
+                deadline = None
+                if timeout is not None:
+                    deadline = time.time() + timeout
+                result = await self._process(request, deadline=deadline)
+            completed.append(result)
+            return result
+
+        results = await asyncio.gather(*[process(request)
+                                         for request in requests])
+        if ordered:
+            return results
+        return completed
+
+    async def _process(self, request, deadline=None):
+        securetrading.util._check_fork()
+        timings = timing.Timings()
+        request = self._get_request(request)
+        try:
+            profile = self._verify(request, timings)
+            cache_key, cache_ttl, result = self._get_cached(request, profile,
+                                                            timings)
+            if result is None:
+                send = functools.partial(self._send_request, request,
+                                         profile, deadline, cache_key,
+                                         cache_ttl, timings)
+                if self.single_flight._is_enabled(request):
+                    result = await self.single_flight._do(
+                        cache_key, send, timings.request_reference, timings)
+                else:
+                    result = await send()
+        except Exception as e:
+            result = self._get_error_result(e, timings)
+        return self._finish(request, result, timings)
+
+    async def _send_request(self, request, profile, deadline, cache_key,
+                            cache_ttl, timings):
+        request_reference = timings.request_reference
+        request_data = self._encode(profile.converter, request,
+                                    request_reference, timings)
+        response, response_headers = await self.http_client._main(
+            profile.url, request_data, request_reference, request,
+            deadline=deadline, profile=profile, timings=timings)
+        return self._get_result(profile, response, response_headers,
+                                cache_key, cache_ttl, timings)
@@ -0,0 +1,380 @@
+from __future__ import unicode_literals
+import asyncio
+import base64
+import logging
+import re
+import ssl
+import time
+import zlib
+import securetrading
+import securetrading.util
+from securetrading.httpclient import GenericHTTPClient
+from securetrading.httpclient import _Call
+from urllib.parse import urlsplit
+
+
+# A header value must not contain a line break or NUL, nor start with
+# whitespace
+_invalid_header_value = re.compile(r"^\s|[\r\n\x00]")
+
+
+class _StaleConnectionError(Exception):
+    """Raised when a reused keep-alive connection was closed by the server
+before any of the response was received."""
+
+
+class AsyncConnection(object):
+
+    def __init__(self, key, reader, writer, reused=False):
+        super(AsyncConnection, self).__init__()
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.reused = reused
+        self.last_used = time.time()
+
+    def _is_usable(self, idle_timeout):
+        if self.reader.at_eof() or self.writer.is_closing():
+            return False
+        if idle_timeout is not None and\
+                time.time() - self.last_used > idle_timeout:
+            return False
+        return True
+
+    def _close(self):
+        self.writer.close()
+
+    def _discard(self):
+        # The connection belongs to another event loop, which may already
+        # be closed.
+        try:
+            self.writer.close()
+        except RuntimeError:
+            pass
+
+
+class AsyncHTTPConnectionPool(object):
+    """An asyncio HTTP/1.1 keep-alive connection pool.
+
+    At most config.http_pool_maxsize requests are in flight at the same
+time, further requests wait for a free slot. Idle connections are closed
+once they have been unused for longer than config.http_pool_idle_timeout.
+"""
+
+    def __init__(self, config):
+        super(AsyncHTTPConnectionPool, self).__init__()
+        self.config = config
+        self._idle = {}
+        self._loop = None
+        self._semaphore = None
+        self._ssl_context = None
+
+    def _after_fork(self):
+        # The idle connections are shared with the parent process and the
+        # semaphore belongs to its event loop, the child builds its own.
+        self._idle = {}
+        self._loop = None
+        self._semaphore = None
+        self._ssl_context = None
+
+    def _get_semaphore(self):
+        # Built for the running event loop. An AsyncApi used from a new
+        # event loop, such as by a second asyncio.run, cannot use the
+        # semaphore or the streams of the previous one.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            idle, self._idle = self._idle, {}
+            for connections in idle.values():
+                for connection in connections:
+                    connection._discard()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.config.http_pool_maxsize)
+        return self._semaphore
+
+    def _get_ssl_context(self):
+        if self._ssl_context is None:
+            cafile = self.config.ssl_certificate_file
+            if cafile is None:
+                try:
+                    import certifi
+                    cafile = certifi.where()
+                except ImportError:
+                    cafile = None
+            self._ssl_context = ssl.create_default_context(cafile=cafile)
+        return self._ssl_context
+
+    async def _acquire(self, url_parts, connect_time_out):
+        key = (url_parts.scheme, url_parts.hostname, url_parts.port)
+        idle = self._idle.get(key, [])
+        while idle:
+            connection = idle.pop()
+            if connection._is_usable(self.config.http_pool_idle_timeout):
+                connection.reused = True
+                return connection
+            connection._close()
+        kwargs = {}
+        port = url_parts.port
+        if url_parts.scheme == "https":
+            kwargs["ssl"] = self._get_ssl_context()
+            port = port or 443
+        else:
+            port = port or 80
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(url_parts.hostname, port, **kwargs),
+            connect_time_out)
+        return AsyncConnection(key, reader, writer)
+
+    def _release(self, connection, keep_alive):
+        if keep_alive and not connection.writer.is_closing():
+            connection.last_used = time.time()
+            self._idle.setdefault(connection.key, []).append(connection)
+        else:
+            connection._close()
+
+    async def _close(self):
+        same_loop = asyncio.get_running_loop() is self._loop
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                if same_loop:
+                    connection._close()
+                else:
+                    connection._discard()
+
+
+class AsyncHTTPClient(GenericHTTPClient):
+
+    def _get_static_headers(self):
+        headers = super(AsyncHTTPClient, self)._get_static_headers()
+        headers["User-Agent"] = "{0}:asyncio".format(headers["User-Agent"])
+        return headers
+
+    def _get_authorization(self, profile=None):
+        if profile is not None:
+            return profile.authorization
+        credentials = "{0}:{1}".format(self.config.username,
+                                       self.config.password)
+        authorization = base64.b64encode(credentials.encode("latin-1"))
+        return "Basic {0}".format(authorization.decode("ascii"))
+
+    def _get_request_bytes(self, url_parts, request_data, request_reference,
+                           profile=None):
+        if not isinstance(request_data, bytes):
+            request_data = request_data.encode("utf-8")
+        path = url_parts.path or "/"
+        if url_parts.query:
+            path = "{0}?{1}".format(path, url_parts.query)
+        headers = self._get_headers(request_reference, profile)
+        headers.update({"Host": url_parts.netloc,
+                        "Authorization": self._get_authorization(profile),
+                        "Content-Length": "{0}".format(len(request_data)),
+                        })
+        lines = ["POST {0} HTTP/1.1".format(path)]
+        for name in headers:
+            value = "{0}".format(headers[name])
+            self._verify_header_value(name, value)
+            lines.append("{0}: {1}".format(name, value))
+        head = "\r\n".join(lines) + "\r\n\r\n"
+        return head.encode("latin-1") + request_data
+
+    def _verify_header_value(self, name, value):
+        # A line break would end the header and start another, such as one
+        # taken from a requestreference. requests rejects these values with
+        # an InvalidHeader, which the sync client reports as error 7.
+        try:
+            value.encode("latin-1")
+            valid = not _invalid_header_value.search(value)
+        except UnicodeEncodeError:
+            valid = False
+        if not valid:
+            msg = "Invalid return character or leading space in header: \
+{0}".format(name)
+            raise securetrading.ConnectionError("7", data=[msg])
+
+    async def _main(self, url, request_data, request_reference, request,
+                    deadline=None, profile=None, timings=None):
+        if self.config.http_proxy is not None:
+            msg = "http_proxy is not supported by the asynchronous transport"
+            raise securetrading.ApiError("10", data=[msg])
+        call = _Call(request_reference, deadline=deadline, profile=profile,
+                     timings=timings)
+        self._begin_endpoints(call, url)
+        try:
+            result = await self._transport(call, url, request_data)
+        except BaseException as e:
+            self._end_endpoints(call, e)
+            raise
+        self._end_endpoints(call)
+        return result
+
+    async def _transport(self, call, url, request_data):
+        request_reference = call.request_reference
+        securetrading.util._log(logging.INFO, request_reference,
+                                "Begin transport")
+        async with self.pool._get_semaphore():
+            recv_start = time.time()
+            try:
+                (status_code, response, response_headers) = await self._send(
+                    call, url, request_data)
+                self._set_status_timing(call, status_code)
+            except securetrading.SecureTradingError as e:
+                securetrading.util._log(logging.DEBUG, request_reference,
+                                        "%s", e, exc_info=True)
+                raise
+            except Exception as e:
+                securetrading.util._log(logging.DEBUG, request_reference,
+                                        "Receiving error", exc_info=True)
+                raise securetrading.SendReceiveError("4", data=e)
+            finally:
+                recv_time_taken = time.time() - recv_start
+                self._add_timing(call, "send_receive", recv_time_taken)
+                securetrading.util._log(logging.INFO, request_reference,
+                                        "Finished transport: %.2f",
+                                        recv_time_taken)
+        self._verify_response(status_code, response, response_headers)
+        if status_code != 200:
+            self._handle_invalid_response(status_code, response)
+        return response, self._get_response_headers(response_headers)
+
+    async def _send(self, call, url, request_data):
+        request_reference = call.request_reference
+        start_time = time.time()
+        self._record_request()
+
+        current_retry_count = 0
+        retry_sleep = None
+        payload_url = None
+        while True:
+            msg = None
+            (timed_out, connect_time_out) = self._get_connection_time_out(
+                start_time, call.deadline)
+            if timed_out:
+                msg = "{0} Maximum time reached whilst trying to connect to \
+{1}".format(request_reference, url)
+            elif current_retry_count > self.config.http_max_retries:
+                msg = "{0} Maximum number of attempts reached whilst trying \
+to connect to {1}".format(request_reference, url)
+            if msg is not None:
+                raise securetrading.ConnectionError("7", data=[msg])
+            url = self._get_attempt_url(call, url, current_retry_count)
+            if url != payload_url:
+                url_parts = urlsplit(url)
+                payload = self._get_request_bytes(url_parts, request_data,
+                                                  request_reference,
+                                                  call.profile)
+                payload_url = url
+            attempt_start = self._begin_attempt(call, url,
+                                                current_retry_count)
+            try:
+                connection = await self.pool._acquire(url_parts,
+                                                      connect_time_out)
+            except (OSError, asyncio.TimeoutError) as e:
+                securetrading.util._log(
+                    logging.INFO, request_reference,
+                    "Connection attempt %s failed due to %r, maximum \
+allowed %s", current_retry_count, e, self.config.http_max_retries)
+                self._record_latency(call, connect_time_out)
+                self._end_attempt(call, url, current_retry_count,
+                                  attempt_start, e)
+                current_retry_count += 1
+                self._verify_retry_budget(url, request_reference,
+                                          current_retry_count)
+                retry_sleep = self._get_retry_sleep(
+                    start_time, current_retry_count, retry_sleep,
+                    call.deadline)
+                await asyncio.sleep(retry_sleep)
+                continue
+            self._add_timing(call, "connect", time.time() - attempt_start)
+            try:
+                result = await asyncio.wait_for(
+                    self._exchange(connection, payload),
+                    self._get_read_time_out(call.deadline))
+                self._record_latency(call, time.time() - attempt_start)
+                self._end_attempt(call, url, current_retry_count,
+                                  attempt_start)
+                return result
+            except _StaleConnectionError as e:
+                # The server closed the idle connection, this is safe to
+                # retry as no part of the request was processed.
+                connection._close()
+                self._end_attempt(call, url, current_retry_count,
+                                  attempt_start, e)
+            except (OSError, EOFError, asyncio.TimeoutError) as e:
+                connection._close()
+                self._end_attempt(call, url, current_retry_count,
+                                  attempt_start, e)
+                raise securetrading.ConnectionError("7", data=e)
+            except BaseException:
+                connection._close()
+                raise
+
+    async def _exchange(self, connection, payload):
+        try:
+            connection.writer.write(payload)
+            await connection.writer.drain()
+            status_line = await connection.reader.readline()
+        except (ConnectionResetError, BrokenPipeError):
+            if connection.reused:
+                raise _StaleConnectionError()
+            raise
+        if not status_line:
+            if connection.reused:
+                raise _StaleConnectionError()
+            raise ConnectionResetError("Connection closed by the server")
+        (status_code, response, headers, keep_alive) =\
+            await self._read_response(status_line, connection.reader)
+        self.pool._release(connection, keep_alive)
+        return status_code, response, headers
+
+    async def _read_response(self, status_line, reader):
+        version, status_code = status_line.decode("latin-1").split()[:2]
+        status_code = int(status_code)
+        headers = {}
+        lowered = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip()] = value.strip()
+            lowered[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and\
+            lowered.get("connection", "").lower() != "close"
+        if lowered.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunked(reader)
+        elif "content-length" in lowered:
+            body = await reader.readexactly(int(lowered["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        if lowered.get("content-encoding", "").lower() == "gzip":
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        charset = "utf-8"
+        for param in lowered.get("content-type", "").split(";")[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "charset" and value:
+                charset = value.strip('"')
+        return status_code, body.decode(charset), headers, keep_alive
+
+    async def _read_chunked(self, reader):
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";")[0].strip(), 16)
+            if size == 0:
+                # Discard any trailers
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        return b"".join(chunks)
+
+    def _get_response_headers(self, response_headers):
+        result = {}
+        for header in response_headers:
+            if header.lower() in self.config.http_response_headers:
+                result[header] = response_headers[header]
+        return result
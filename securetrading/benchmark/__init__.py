@@ -0,0 +1,617 @@
+"""Micro-benchmarks of the request and response hot path.
+
+The benchmarks run offline, Api.process is measured against a stubbed
+transport that answers every request from memory. Run them with:
+
+    python -m securetrading.benchmark run --output results.json
+    python -m securetrading.benchmark compare baseline.json results.json
+
+How Api.process scales with the number of threads, which is only expected
+on free-threaded builds of Python such as 3.13t, is measured with:
+
+    python -m securetrading.benchmark scaling --threads 1 2 4 8
+
+The time taken to import the package in a new interpreter, which is part of
+every cold start, is measured with:
+
+    python -m securetrading.benchmark import-time
+"""
+from __future__ import unicode_literals
+import collections
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import securetrading
+import securetrading.httpclient as httpclient
+import securetrading.schema
+import securetrading.util
+
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "baseline.json")
+default_threshold = 0.1
+
+_clock = getattr(time, "perf_counter", time.time)
+
+benchmarks = collections.OrderedDict()
+
+_auth_fields = {"pan": "4111111111111111",
+                "expirydate": "12/2031",
+                "securitycode": "123",
+                "requesttypedescriptions": ["AUTH"],
+                "accounttypedescription": "ECOM",
+                "sitereference": "test_site12345",
+                "paymenttypedescription": "VISA",
+                "currencyiso3a": "GBP",
+                "baseamount": "1050",
+                "orderreference": "order-000123",
+                "billingfirstname": "Joe",
+                "billinglastname": "Bloggs",
+                "billingpremise": "789",
+                "billingstreet": "Example Street",
+                "billingtown": "Bangor",
+                "billingcounty": "Gwynedd",
+                "billingpostcode": "TE45 6ST",
+                "billingcountryiso2a": "GB",
+                "billingemail": "joe.bloggs@example.com",
+                "billingtelephone": "01234 567890",
+                "billingtelephonetype": "H",
+                "customerfirstname": "Joe",
+                "customerlastname": "Bloggs",
+                "customerpremise": "789",
+                "customerstreet": "Example Street",
+                "customertown": "Bangor",
+                "customerpostcode": "TE45 6ST",
+                "customercountryiso2a": "GB",
+                "customeremail": "joe.bloggs@example.com",
+                "customerip": "192.0.2.10",
+                }
+
+_response_fields = {"acquirerresponsecode": "00",
+                    "authcode": "TEST22",
+                    "baseamount": "1050",
+                    "currencyiso3a": "GBP",
+                    "dccenabled": "0",
+                    "errorcode": "0",
+                    "errormessage": "Ok",
+                    "issuer": "SecureTrading Test Issuer1",
+                    "issuercountryiso2a": "US",
+                    "livestatus": "0",
+                    "maskedpan": "411111######1111",
+                    "merchantcountryiso2a": "GB",
+                    "merchantname": "Test Merchant",
+                    "operatorname": "webservices@example.com",
+                    "paymenttypedescription": "VISA",
+                    "requesttypedescription": "AUTH",
+                    "securityresponseaddress": "2",
+                    "securityresponsepostcode": "2",
+                    "securityresponsesecuritycode": "2",
+                    "settleduedate": "2031-01-01",
+                    "settlestatus": "0",
+                    "splitfinalnumber": "1",
+                    "tid": "27882788",
+                    "transactionreference": "23-9-80001",
+                    "transactionstartedtimestamp": "2031-01-01 12:00:00",
+                    }
+
+
+def _get_response_body(request_reference, count=1):
+    responses = []
+    for i in range(count):
+        response = dict(_response_fields)
+        response["transactionreference"] = "23-9-{0}".format(80001 + i)
+        responses.append(response)
+    return json.dumps({"requestreference": request_reference,
+                       "version": "1.00",
+                       "secrand": "ZFz1kp9",
+                       "response": responses,
+                       })
+
+
+class _StubAdapter(httpclient.requests.adapters.BaseAdapter):
+    """A requests transport adapter that answers every request with a
+successful AUTH response, without any network access."""
+
+    def send(self, request, **kwargs):
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        request_reference = json.loads(body)["request"][0]["requestreference"]
+        response = httpclient.requests.Response()
+        response.status_code = 200
+        response._content = _get_response_body(
+            request_reference).encode("utf-8")
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class _StubConnectionPool(httpclient.HTTPConnectionPool):
+
+    def _build_session(self):
+        session = super(_StubConnectionPool, self)._build_session()
+        adapter = _StubAdapter()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+
+def _get_config():
+    config = securetrading.Config()
+    config.username = "webservices@example.com"
+    config.password = "Password1^"
+    return config
+
+
+def _get_request(fields=_auth_fields):
+    request = securetrading.Request()
+    request.update(fields)
+    return request
+
+
+def _benchmark(name):
+    def register(setup):
+        benchmarks[name] = setup
+        return setup
+    return register
+
+
+@_benchmark("request_init")
+def _request_init():
+    return securetrading.Request
+
+
+@_benchmark("get_random")
+def _get_random():
+    return lambda: securetrading.util._get_random(8)
+
+
+@_benchmark("version_info")
+def _version_info():
+    request = securetrading.Request()
+    return lambda: request.__setitem__("versioninfo",
+                                       securetrading.version_info)
+
+
+@_benchmark("update_10_fields")
+def _update_10_fields():
+    fields = dict(list(sorted(_auth_fields.items()))[:10])
+    request = securetrading.Request()
+    return lambda: request.update(fields)
+
+
+@_benchmark("update_30_fields")
+def _update_30_fields():
+    request = securetrading.Request()
+    return lambda: request.update(_auth_fields)
+
+
+@_benchmark("encode_single")
+def _encode_single():
+    converter = securetrading.Converter(_get_config())
+    request = _get_request()
+    return lambda: converter._encode(request)
+
+
+@_benchmark("encode_multi")
+def _encode_multi():
+    converter = securetrading.Converter(_get_config())
+    requests = securetrading.Requests()
+    requests.update({"requests": [_get_request() for i in range(5)]})
+    return lambda: converter._encode(requests)
+
+
+def _get_template():
+    fields = dict(_auth_fields)
+    for key in ["baseamount", "orderreference"]:
+        del fields[key]
+    return securetrading.RequestTemplate(fields)
+
+
+@_benchmark("template_new")
+def _template_new():
+    template = _get_template()
+    fields = {"baseamount": "1050", "orderreference": "order-000123"}
+    return lambda: template.new(fields)
+
+
+@_benchmark("encode_template")
+def _encode_template():
+    converter = securetrading.Converter(_get_config())
+    request = _get_template().new({"baseamount": "1050",
+                                   "orderreference": "order-000123"})
+    return lambda: converter._encode(request)
+
+
+@_benchmark("decode_small")
+def _decode_small():
+    converter = securetrading.Converter(_get_config())
+    body = _get_response_body("A1")
+    return lambda: converter._decode(body, {}, "A1")
+
+
+@_benchmark("decode_large")
+def _decode_large():
+    converter = securetrading.Converter(_get_config())
+    body = _get_response_body("A1", count=1000)
+    return lambda: converter._decode(body, {}, "A1")
+
+
+@_benchmark("phrasebook_lookup")
+def _phrasebook_lookup():
+    config = _get_config()
+    config.locale = "fr_fr"
+    phrase_book = securetrading.PhraseBook(config)
+    return lambda: phrase_book.lookup("Invalid field")
+
+
+@_benchmark("schema_check")
+def _schema_check():
+    request_schema = securetrading.schema.Schema()
+    request = _get_request()
+    return lambda: request_schema.check(request)
+
+
+@_benchmark("errormessage_lookup")
+def _errormessage_lookup():
+    config = _get_config()
+    config.locale = "fr_fr"
+    phrase_book = securetrading.PhraseBook(config)
+    return lambda: phrase_book.lookup_error("30000", "")
+
+
+@_benchmark("api_process")
+def _api_process():
+    config = _get_config()
+    api = securetrading.Api(config)
+    api.http_pool = _StubConnectionPool(config)
+    return lambda: api.process(dict(_auth_fields))
+
+
+def _get_gil():
+    # "disabled" on a free-threaded build running without the GIL.
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    if is_gil_enabled is None or is_gil_enabled():
+        return "enabled"
+    return "disabled"
+
+
+def _get_scaling_api(url, threads):
+    config = _get_config()
+    config.http_pool_maxsize = max(threads, 1)
+    api = securetrading.Api(config)
+    if url is None:
+        api.http_pool = _StubConnectionPool(config)
+    else:
+        config.datacenterurl = url
+    return api
+
+
+def _count_requests(api, threads, duration):
+    start_event = threading.Event()
+    stop_event = threading.Event()
+    counts = [0] * threads
+
+    def work(index):
+        start_event.wait()
+        count = 0
+        while not stop_event.is_set():
+            api.process(dict(_auth_fields))
+            count += 1
+        counts[index] = count
+
+    workers = [threading.Thread(target=work, args=(i,))
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    start = _clock()
+    start_event.set()
+    time.sleep(duration)
+    stop_event.set()
+    for worker in workers:
+        worker.join()
+    return sum(counts), _clock() - start
+
+
+def scaling(threads=(1, 2, 4, 8), duration=2, url=None):
+    """Measures the throughput of Api.process for each number of threads.
+
+    Every thread processes AUTH requests through one shared Api for the
+duration. By default the requests are answered from memory, so only the
+time spent in the library and the interpreter is measured. Throughput only
+scales with the number of threads on a free-threaded build of Python.
+
+    Args:
+       threads: (optional [list]) The numbers of threads to measure.
+       duration: (optional [int or float]) The number of seconds to measure
+each number of threads for.
+       url: (optional [string]) The datacenterurl of a local stub server to
+send the requests to instead, such as python -m securetrading.simulator
+serve.
+
+    Returns:
+       A dict of the environment the benchmark ran in, including whether the
+"gil" was "enabled" or "disabled", and of its "results", a list of dicts of
+the "threads", the "requests" processed, the "throughput" in requests per
+second and the "speedup" over the first number of threads.
+
+    Usage:
+       >>> results = securetrading.benchmark.scaling([1, 4], duration=5)
+    """
+    results = []
+    for count in threads:
+        api = _get_scaling_api(url, count)
+        try:
+            api.process(dict(_auth_fields))
+            requests, elapsed = _count_requests(api, count, duration)
+        finally:
+            api.close()
+        throughput = requests / elapsed
+        speedup = throughput / results[0]["throughput"] if results and\
+            results[0]["throughput"] else 1.0
+        results.append({"threads": count,
+                        "requests": requests,
+                        "throughput": throughput,
+                        "speedup": speedup,
+                        })
+    return {"python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "gil": _get_gil(),
+            "cpus": _get_cpu_count(),
+            "transport": "memory" if url is None else url,
+            "results": results,
+            }
+
+
+def _get_cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def format_scaling(results):
+    """Returns the results of scaling as a table of text lines."""
+    lines = ["Python {0} {1}, GIL {2}, {3} CPUs, {4} transport".format(
+        results["python"], results["implementation"], results["gil"],
+        results["cpus"], results["transport"]),
+        "{0:>8} {1:>10} {2:>12} {3:>8}".format(
+            "threads", "requests", "requests/s", "speedup")]
+    for result in results["results"]:
+        lines.append("{0:>8} {1:>10} {2:>12.1f} {3:>7.2f}x".format(
+            result["threads"], result["requests"], result["throughput"],
+            result["speedup"]))
+    return lines
+
+
+# The statements timed by import_time, each in a new interpreter that has
+# already imported the package's own dependencies
+import_statements = collections.OrderedDict([
+    ("import", "import securetrading"),
+    ("request", "import securetrading; securetrading.Request()"),
+    ("api", "import securetrading; "
+     "securetrading.Api(securetrading.Config())"),
+])
+
+_import_time_script = """
+import json, sys, time
+import logging, threading, weakref, zlib
+clock = getattr(time, "perf_counter", time.time)
+modules = len(sys.modules)
+start = clock()
+{0}
+print(json.dumps({{"seconds": clock() - start,
+                  "modules": len(sys.modules) - modules}}))
+"""
+
+
+def _time_import(statement):
+    output = subprocess.check_output(
+        [sys.executable, "-c", _import_time_script.format(statement)])
+    return json.loads(output.decode("utf-8"))
+
+
+def import_time(names=None, repeat=5):
+    """Measures how long it takes to import the package and start using it.
+
+    Each statement in import_statements is run repeat times, every time in
+a new interpreter, so nothing is already imported or cached. The modules
+that are imported by any Python program are imported before the timing
+starts, so only the cost of the package is measured.
+
+    Args:
+       names: (optional [list]) The names of the statements to time,
+defaults to all of them.
+       repeat: (optional [int]) The number of interpreters to time each
+statement in.
+
+    Raises:
+       AssertionError: If a name is not the name of a statement.
+
+    Returns:
+       A dict of the environment the statements ran in and of their
+"results", a list of dicts of the "name", the "statement", the fastest
+"seconds" it took and the number of "modules" it imported.
+
+    Usage:
+       >>> results = securetrading.benchmark.import_time(["import"])
+    """
+    if names is None:
+        names = list(import_statements)
+    for name in names:
+        msg = "Unknown statement {0}, available statements: {1}".format(
+            name, ", ".join(import_statements))
+        assert name in import_statements, msg
+    results = []
+    for name in names:
+        timings = [_time_import(import_statements[name])
+                   for i in range(repeat)]
+        results.append({"name": name,
+                        "statement": import_statements[name],
+                        "seconds": min(timing["seconds"]
+                                       for timing in timings),
+                        "modules": timings[0]["modules"],
+                        })
+    return {"python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "version": securetrading.__version__,
+            "results": results,
+            }
+
+
+def format_import_time(results):
+    """Returns the results of import_time as a table of text lines."""
+    lines = ["Python {0} {1}, securetrading {2}".format(
+        results["python"], results["implementation"], results["version"]),
+        "{0:<10} {1:>10} {2:>8}  {3}".format(
+            "name", "time", "modules", "statement")]
+    for result in results["results"]:
+        lines.append("{0:<10} {1:>10} {2:>8}  {3}".format(
+            result["name"], _format_seconds(result["seconds"]),
+            result["modules"], result["statement"]))
+    return lines
+
+
+def _time(function, number):
+    start = _clock()
+    for i in range(number):
+        function()
+    return _clock() - start
+
+
+def run(names=None, repeat=5, min_time=0.2):
+    """Runs the benchmarks and returns their results.
+
+    Each benchmark is timed repeat times, each time calling it enough times
+to take at least min_time seconds. The fastest of these times per call is
+its result.
+
+    Args:
+       names: (optional [list]) The names of the benchmarks to run,
+defaults to all of them.
+       repeat: (optional [int]) The number of times to time each benchmark.
+       min_time: (optional [int or float]) The minimum number of seconds
+that each timing takes.
+
+    Raises:
+       AssertionError: If a name is not the name of a benchmark.
+
+    Returns:
+       A dict of the environment the benchmarks ran in and of their
+"results", mapping each name to the "seconds" per call and the "number" of
+calls in each timing.
+
+    Usage:
+       >>> results = securetrading.benchmark.run(["encode_single"])
+    """
+    if names is None:
+        names = list(benchmarks)
+    for name in names:
+        msg = "Unknown benchmark {0}, available benchmarks: {1}".format(
+            name, ", ".join(benchmarks))
+        assert name in benchmarks, msg
+    results = collections.OrderedDict()
+    for name in names:
+        function = benchmarks[name]()
+        number = 1
+        while True:
+            elapsed = _time(function, number)
+            if elapsed >= min_time:
+                break
+            number = max(number * 2, int(number * min_time / elapsed)
+                         if elapsed > 0 else 0)
+        best = min([elapsed] + [_time(function, number)
+                                for i in range(repeat - 1)])
+        results[name] = {"seconds": best / number, "number": number}
+    return {"python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "gil": _get_gil(),
+            "platform": platform.platform(),
+            "json_backend": securetrading.util.get_json_backend(),
+            "version": securetrading.__version__,
+            "results": results,
+            }
+
+
+def compare(baseline, current, threshold=default_threshold):
+    """Compares benchmark results against a baseline.
+
+    Args:
+       baseline: A dict of results returned by run.
+       current: A dict of results returned by run.
+       threshold: (optional [float]) The fraction by which a benchmark may
+be slower than its baseline before it is a regression.
+
+    Returns:
+       A list of (name, baseline seconds, current seconds, status) tuples,
+where status is "regression", "improvement", "ok", "new" or "missing".
+
+    Usage:
+       >>> for name, before, after, status in compare(baseline, results):
+       ...     print(name, status)
+    """
+    baseline_results = baseline["results"]
+    current_results = current["results"]
+    names = list(baseline_results) + [name for name in current_results
+                                      if name not in baseline_results]
+    comparison = []
+    for name in names:
+        before = baseline_results.get(name, {}).get("seconds")
+        after = current_results.get(name, {}).get("seconds")
+        if before is None:
+            status = "new"
+        elif after is None:
+            status = "missing"
+        elif after > before * (1 + threshold):
+            status = "regression"
+        elif after < before * (1 - threshold):
+            status = "improvement"
+        else:
+            status = "ok"
+        comparison.append((name, before, after, status))
+    return comparison
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    for unit, scale in [("s", 1), ("ms", 1e3), ("us", 1e6)]:
+        if seconds * scale >= 1:
+            return "{0:.2f}{1}".format(seconds * scale, unit)
+    return "{0:.0f}ns".format(seconds * 1e9)
+
+
+def format_comparison(comparison):
+    """Returns a comparison from compare as a table of text lines."""
+    lines = ["{0:<20} {1:>10} {2:>10} {3:>8}  {4}".format(
+        "benchmark", "baseline", "current", "change", "status")]
+    for name, before, after, status in comparison:
+        change = "-"
+        if before and after is not None:
+            change = "{0:+.1f}%".format((after / before - 1) * 100)
+        lines.append("{0:<20} {1:>10} {2:>10} {3:>8}  {4}".format(
+            name, _format_seconds(before), _format_seconds(after), change,
+            status))
+    return lines
+
+
+def load(path):
+    """Returns the benchmark results saved in a JSON file."""
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def save(results, path):
+    """Saves benchmark results returned by run to a JSON file."""
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+        results_file.write("\n")
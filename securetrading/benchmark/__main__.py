@@ -0,0 +1,127 @@
+from __future__ import print_function
+from __future__ import unicode_literals
+import argparse
+import sys
+import securetrading.benchmark as benchmark
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m securetrading.benchmark",
+        description="Benchmarks the Trust Payments API hot path offline.")
+    commands = parser.add_subparsers(dest="command")
+
+    run = commands.add_parser(
+        "run", help="Run the benchmarks, optionally comparing them against "
+        "a baseline.")
+    run.add_argument("names", nargs="*",
+                     help="The benchmarks to run, defaults to all of them.")
+    run.add_argument("--output", help="Save the results to this JSON file.")
+    run.add_argument("--repeat", type=int, default=5,
+                     help="The number of times each benchmark is timed.")
+    run.add_argument("--min-time", type=float, default=0.2,
+                     help="The minimum number of seconds of each timing.")
+    run.add_argument("--compare", nargs="?", const=benchmark.baseline_path,
+                     metavar="BASELINE",
+                     help="Compare the results against this JSON file, "
+                     "defaults to the packaged baseline.")
+    run.add_argument("--threshold", type=float,
+                     default=benchmark.default_threshold,
+                     help="The fraction a benchmark may slow down by before "
+                     "it is a regression.")
+
+    compare = commands.add_parser(
+        "compare", help="Compare two saved results, exits with status 1 if "
+        "any benchmark regressed.")
+    compare.add_argument("baseline", help="The baseline JSON file.")
+    compare.add_argument("current", help="The JSON file to compare.")
+    compare.add_argument("--threshold", type=float,
+                         default=benchmark.default_threshold,
+                         help="The fraction a benchmark may slow down by "
+                         "before it is a regression.")
+
+    scaling = commands.add_parser(
+        "scaling", help="Measure how the throughput of Api.process scales "
+        "with the number of threads.")
+    scaling.add_argument("--threads", type=int, nargs="+",
+                         default=[1, 2, 4, 8],
+                         help="The numbers of threads to measure.")
+    scaling.add_argument("--duration", type=float, default=2,
+                         help="The number of seconds to measure each number "
+                         "of threads for.")
+    scaling.add_argument("--url",
+                         help="Send the requests to this local stub server "
+                         "instead of answering them from memory.")
+    scaling.add_argument("--output", help="Save the results to this JSON "
+                         "file.")
+
+    import_time = commands.add_parser(
+        "import-time", help="Measure how long it takes to import the "
+        "package in a new interpreter.")
+    import_time.add_argument("names", nargs="*",
+                             help="The statements to time, defaults to all "
+                             "of them.")
+    import_time.add_argument("--repeat", type=int, default=5,
+                             help="The number of interpreters to time each "
+                             "statement in.")
+    import_time.add_argument("--output", help="Save the results to this "
+                             "JSON file.")
+
+    commands.add_parser("list", help="List the benchmarks.")
+    return parser
+
+
+def _print_comparison(baseline, current, threshold):
+    comparison = benchmark.compare(baseline, current, threshold)
+    for line in benchmark.format_comparison(comparison):
+        print(line)
+    return any(status == "regression" for _, _, _, status in comparison)
+
+
+def main(argv=None):
+    parser = _get_parser()
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        for name in benchmark.benchmarks:
+            print(name)
+        return 0
+    if args.command == "compare":
+        regressed = _print_comparison(benchmark.load(args.baseline),
+                                      benchmark.load(args.current),
+                                      args.threshold)
+        return 1 if regressed else 0
+    if args.command == "scaling":
+        results = benchmark.scaling(args.threads, duration=args.duration,
+                                    url=args.url)
+        if args.output:
+            benchmark.save(results, args.output)
+        for line in benchmark.format_scaling(results):
+            print(line)
+        return 0
+    if args.command == "import-time":
+        results = benchmark.import_time(args.names or None,
+                                        repeat=args.repeat)
+        if args.output:
+            benchmark.save(results, args.output)
+        for line in benchmark.format_import_time(results):
+            print(line)
+        return 0
+    if args.command == "run":
+        results = benchmark.run(args.names or None, repeat=args.repeat,
+                                min_time=args.min_time)
+        if args.output:
+            benchmark.save(results, args.output)
+        if args.compare:
+            regressed = _print_comparison(benchmark.load(args.compare),
+                                          results, args.threshold)
+            return 1 if regressed else 0
+        for name, result in results["results"].items():
+            print("{0:<20} {1:>10}".format(
+                name, benchmark._format_seconds(result["seconds"])))
+        return 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
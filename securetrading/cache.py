@@ -0,0 +1,135 @@
+from __future__ import unicode_literals
+import collections
+import copy
+import json
+import threading
+import time
+
+# Only request types that never change state at Trust Payments may be
+# cached, AUTH, REFUND and the like must always reach the gateway.
+cacheable_requesttypes = ["CURRENCYRATE", "TRANSACTIONQUERY"]
+
+
+def _get_requesttypes(request):
+    # Returns every request type of the request, or None when one of its
+    # requests does not specify any request types.
+    requesttypes = []
+    for sub_request in request.get("requests", [request]):
+        if not sub_request.get("requesttypedescriptions"):
+            return None
+        requesttypes.extend(sub_request["requesttypedescriptions"])
+    return requesttypes
+
+
+def _copy_response(response, request_reference):
+    # Returns a copy of a response for the request with request_reference.
+    result = copy.deepcopy(response)
+    result["requestreference"] = request_reference
+    for sub_response in result.get("responses", []):
+        if "requestreference" in sub_response:
+            sub_response["requestreference"] = request_reference
+    return result
+
+
+class _CacheEntry(object):
+
+    def __init__(self, response, size, expires):
+        super(_CacheEntry, self).__init__()
+        self.response = response
+        self.size = size
+        self.expires = expires
+
+
+class ResponseCache(object):
+    """An LRU cache of the responses to read-only requests.
+
+    Requests are only cached when every one of their requesttypedescriptions
+has a time to live in config.response_cache_ttls. Two requests share a
+cache entry when they would be encoded identically apart from their
+requestreference. The least recently used entries are evicted once there
+are more than config.response_cache_max_entries entries, or their responses
+take up more than config.response_cache_max_bytes.
+"""
+
+    def __init__(self, config):
+        super(ResponseCache, self).__init__()
+        self.config = config
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _after_fork(self):
+        # The cached responses are kept, a child shares those cached by its
+        # parent copy-on-write.
+        self._lock = threading.Lock()
+
+    def _get_ttl(self, request):
+        ttls = self.config.response_cache_ttls
+        requesttypes = _get_requesttypes(request)
+        if not ttls or requesttypes is None or\
+                any(requesttype not in ttls for requesttype in requesttypes):
+            return None
+        return min(ttls[requesttype] for requesttype in requesttypes)
+
+    def _get_key(self, request, profile):
+        requests = request.get("requests", [request])
+        canonical = {"alias": self.config.username,
+                     "version": self.config.jsonversion,
+                     "acceptcustomeroutput": self.config.acceptcustomeroutput,
+                     "url": profile.url,
+                     "request": [dict((key, sub_request[key])
+                                      for key in sub_request
+                                      if key != "requestreference")
+                                 for sub_request in requests],
+                     }
+        return json.dumps(canonical, sort_keys=True, separators=(",", ":"),
+                          default=repr)
+
+    def _get(self, key, request_reference):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry.expires <= time.time():
+                self._bytes -= entry.size
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            # Re-inserting marks the entry as the most recently used
+            self._entries[key] = entry
+            self.hits += 1
+        return _copy_response(entry.response, request_reference)
+
+    def _put(self, key, ttl, response, size):
+        if any(sub_response.get("errorcode") != "0"
+               for sub_response in response.get("responses", [])):
+            return
+        max_bytes = self.config.response_cache_max_bytes
+        if max_bytes is not None and size > max_bytes:
+            return
+        entry = _CacheEntry(copy.deepcopy(response), size, time.time() + ttl)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += size
+            max_entries = self.config.response_cache_max_entries
+            while len(self._entries) > max_entries or\
+                    (max_bytes is not None and self._bytes > max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._bytes -= self._entries.pop(oldest_key).size
+
+    def _clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _get_stats(self):
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "entries": len(self._entries),
+                    "bytes": self._bytes,
+                    }
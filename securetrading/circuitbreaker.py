@@ -0,0 +1,125 @@
+from __future__ import unicode_literals
+import threading
+import time
+import securetrading
+
+
+class CircuitBreaker(object):
+    """A circuit breaker for the requests sent to one datacenter url.
+
+    The breaker starts closed. After config.http_circuit_failure_threshold
+consecutive connection failures it opens and requests fail straight away
+with error 11 instead of waiting for the connection attempts to time out.
+Once config.http_circuit_reset_timeout seconds have passed the breaker is
+half-open and lets config.http_circuit_half_open_probes requests through.
+A successful probe closes the breaker, a failed probe opens it again.
+The breaker is disabled until config.http_circuit_failure_threshold is set.
+"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, config, datacenterurl):
+        super(CircuitBreaker, self).__init__()
+        self.config = config
+        self.datacenterurl = datacenterurl
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._probes = 0
+
+    def _after_fork(self):
+        # Probes taken by threads of the parent process are never released
+        # in the child.
+        self._lock = threading.Lock()
+        self._probes = 0
+
+    @property
+    def state(self):
+        """The state of the breaker: "closed", "open" or "half-open"."""
+        with self._lock:
+            if self._state == self.OPEN and self._is_reset_due():
+                return self.HALF_OPEN
+            return self._state
+
+    @property
+    def failures(self):
+        """The number of consecutive connection failures."""
+        return self._failures
+
+    def _is_reset_due(self):
+        reset_timeout = self.config.http_circuit_reset_timeout
+        return time.time() - self._opened_at >= reset_timeout
+
+    def _before_request(self, request_reference):
+        if self.config.http_circuit_failure_threshold is None:
+            return
+        with self._lock:
+            if self._state == self.OPEN and self._is_reset_due():
+                self._state = self.HALF_OPEN
+                self._probes = 0
+            if self._state == self.HALF_OPEN and\
+                    self._probes < self.config.http_circuit_half_open_probes:
+                self._probes += 1
+                return
+            if self._state == self.CLOSED:
+                return
+            state = self._state
+        msg = "{0} Circuit breaker {1} for {2}".format(request_reference,
+                                                       state,
+                                                       self.datacenterurl)
+        raise securetrading.ConnectionError("11", data=[msg])
+
+    def _record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def _record_failure(self):
+        threshold = self.config.http_circuit_failure_threshold
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or\
+                    (threshold is not None and self._failures >= threshold):
+                self._state = self.OPEN
+                self._opened_at = time.time()
+                self._probes = 0
+
+    def _release_probe(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+
+class CircuitBreakers(object):
+    """The circuit breakers of an Api, keyed by datacenter url."""
+
+    def __init__(self, config):
+        super(CircuitBreakers, self).__init__()
+        self.config = config
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def _get(self, datacenterurl):
+        breaker = self._breakers.get(datacenterurl)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(datacenterurl)
+                if breaker is None:
+                    breaker = CircuitBreaker(self.config, datacenterurl)
+                    self._breakers[datacenterurl] = breaker
+        return breaker
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        for breaker in list(self._breakers.values()):
+            breaker._after_fork()
+
+    def _get_states(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return dict((breaker.datacenterurl, breaker.state)
+                    for breaker in breakers)
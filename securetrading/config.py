@@ -1,8 +1,17 @@
 from __future__ import unicode_literals
 import locale
+import threading
 from securetrading import util
+from securetrading import cache
+from securetrading import retry
+from securetrading import schema
 import securetrading
 
+# Settings can be changed by several threads at once, without the GIL on
+# free-threaded builds of Python too, so every change must get a revision
+# of its own for the profiles built from a config to notice it.
+_revision_lock = threading.Lock()
+
 
 class Config(object):
     """The Trust Payments configuration object.
@@ -12,7 +21,8 @@ API will use."""
 
     __slots__ = ["_username", "_jsonversion", "_http_receive_timeout",
                  "_http_max_retries", "_http_retry_sleep", "_username",
-                 "_password", "_datacenterurl", "_datacenterpath",
+                 "_password", "_datacenterurl", "_datacenterurls",
+                 "_datacenterpath",
                  "_http_max_allowed_connection_time",
                  "_http_connect_timeout",
                  "_http_response_headers",
@@ -20,6 +30,21 @@ API will use."""
                  "_libraryversion",
                  "_locale",
                  "_acceptcustomeroutput",
+                 "_http_pool_maxsize",
+                 "_http_pool_idle_timeout",
+                 "_http_retry_policy",
+                 "_http_retry_budget",
+                 "_http_circuit_failure_threshold",
+                 "_http_circuit_reset_timeout",
+                 "_http_circuit_half_open_probes",
+                 "_http_prefer_low_latency",
+                 "_response_cache_ttls",
+                 "_response_cache_max_entries",
+                 "_response_cache_max_bytes",
+                 "_singleflight_requesttypes",
+                 "_response_timings",
+                 "_request_schema",
+                 "_revision",
                  ]
 
     def __init__(self):
@@ -44,12 +69,36 @@ default values that can then be overridden.
         self._username = ""
         self._password = ""
         self._datacenterurl = "https://webservices.securetrading.net"
+        self._datacenterurls = None
         self._datacenterpath = "/json/"
         self._http_proxy = None
         self._ssl_certificate_file = None
         self._libraryversion = securetrading.__version__
         self._locale = "en_gb"
         self._acceptcustomeroutput = None
+        self._http_pool_maxsize = 10
+        self._http_pool_idle_timeout = 30
+        self._http_retry_policy = retry.RetryPolicy()
+        self._http_retry_budget = None
+        self._http_circuit_failure_threshold = None
+        self._http_circuit_reset_timeout = 30
+        self._http_circuit_half_open_probes = 1
+        self._http_prefer_low_latency = False
+        self._response_cache_ttls = {}
+        self._response_cache_max_entries = 1000
+        self._response_cache_max_bytes = None
+        self._singleflight_requesttypes = []
+        self._response_timings = False
+        self._request_schema = None
+
+    def __setattr__(self, name, value):
+        super(Config, self).__setattr__(name, value)
+        if name.startswith("_"):
+            # Lets objects derived from the config, such as the Api
+            # transport profile, detect that a setting has been changed.
+            with _revision_lock:
+                revision = getattr(self, "_revision", 0) + 1
+                super(Config, self).__setattr__("_revision", revision)
 
     @property
     def locale(self):
@@ -211,6 +260,48 @@ use to connect to Trust Payments.
     def datacenterurl(self, value):
         self._datacenterurl = value
 
+    @property
+    def datacenterurls(self):
+        """An ordered list of Trust Payments data center URLs.
+
+        This property holds the data center URLs that the API will use to
+connect to Trust Payments, in order of preference. When it is set it is
+used instead of datacenterurl, and a connection attempt that fails moves
+on to the next URL in the list. None uses datacenterurl only.
+
+        Args:
+           value: (optional [list or None]) A list of data center URLs.
+
+        Raises:
+           AssertionError: If the value is not None or a non-empty list of
+strings.
+
+        Returns:
+           The Trust Payments data center URLs.
+
+        Usage:
+          >>> config.datacenterurls = ["https://webservices.securetrading.net",
+          ...                          "https://webservices.securetrading.us"]
+          or
+          >>> datacenterurls = config.datacenterurls
+
+        """
+        return self._datacenterurls
+
+    @datacenterurls.setter
+    def datacenterurls(self, values):
+        msg = "A non-empty list of strings or None is required for the data \
+center URLs"
+        if values is not None:
+            assert isinstance(values, list) and values, msg
+            str_typ = str
+            if util._is_python_2():
+                str_typ = basestring
+            for value in values:
+                assert isinstance(value, str_typ), msg
+            values = list(values)
+        self._datacenterurls = values
+
     @property
     def datacenterpath(self):
         """The Trust Payments data center path.
@@ -377,6 +468,458 @@ will use to sleep between connection attempts to Trust Payments.
         assert isinstance(value, (float, int)), msg
         self._http_retry_sleep = value
 
+    @property
+    def http_retry_policy(self):
+        """The policy deciding how long to sleep between connection attempts.
+
+        This property holds the securetrading.RetryPolicy that the API will
+use to decide how long to sleep before each connection retry. The default
+policy always sleeps for http_retry_sleep, an
+securetrading.ExponentialBackoffRetryPolicy backs off exponentially with
+jitter.
+
+        Args:
+           value: (optional [securetrading.RetryPolicy]) The retry policy.
+
+        Raises:
+           AssertionError: If the value is not a securetrading.RetryPolicy.
+
+        Returns:
+           The HTTP retry policy.
+
+        Usage:
+           >>> config.http_retry_policy = \\
+           ...     securetrading.ExponentialBackoffRetryPolicy()
+           or
+           >>> http_retry_policy = config.http_retry_policy
+        """
+        return self._http_retry_policy
+
+    @http_retry_policy.setter
+    def http_retry_policy(self, value):
+        msg = "A securetrading.RetryPolicy is required for the retry policy"
+        assert isinstance(value, retry.RetryPolicy), msg
+        self._http_retry_policy = value
+
+    @property
+    def http_retry_budget(self):
+        """The maximum ratio of connection retries to requests.
+
+        This property holds the ratio of connection retries to requests
+allowed across all of the requests sent by one securetrading.Api object,
+so 0.1 allows one retry for every ten requests. Once the budget has been
+spent, failed connection attempts are no longer retried. None allows
+every retry.
+
+        Args:
+           value: (optional [int, float or None]) The ratio, greater than 0.
+
+        Raises:
+           AssertionError: If the value is not None or a positive int or float.
+
+        Returns:
+           The HTTP retry budget.
+
+        Usage:
+           >>> config.http_retry_budget = 0.1
+           or
+           >>> http_retry_budget = config.http_retry_budget
+        """
+        return self._http_retry_budget
+
+    @http_retry_budget.setter
+    def http_retry_budget(self, value):
+        msg = "An int or float greater than 0 or None is required for the \
+retry budget"
+        assert value is None or (isinstance(value, (float, int)) and
+                                 value > 0), msg
+        self._http_retry_budget = value
+
+    @property
+    def http_circuit_failure_threshold(self):
+        """The number of connection failures that opens the circuit breaker.
+
+        This property holds the number of consecutive failures connecting to
+a datacenter url after which the API stops sending requests to it. While
+the circuit breaker is open requests fail straight away with error 11.
+None, the default, disables the circuit breaker.
+
+        Args:
+           value: (optional [int or None]) The number of failures.
+
+        Raises:
+           AssertionError: If the value is not None or an int greater than 0.
+
+        Returns:
+           The circuit breaker failure threshold.
+
+        Usage:
+           >>> config.http_circuit_failure_threshold = 5
+           or
+           >>> threshold = config.http_circuit_failure_threshold
+        """
+        return self._http_circuit_failure_threshold
+
+    @http_circuit_failure_threshold.setter
+    def http_circuit_failure_threshold(self, value):
+        msg = "An int greater than 0 or None is required for the failure \
+threshold"
+        assert value is None or (isinstance(value, int) and value > 0), msg
+        self._http_circuit_failure_threshold = value
+
+    @property
+    def http_circuit_reset_timeout(self):
+        """The time an open circuit breaker waits before probing again.
+
+        This property holds the time in seconds after which an open circuit
+breaker becomes half-open and lets probe requests through to find out if
+the datacenter url has recovered.
+
+        Args:
+           value: (optional [int or float]) The numeric value in seconds.
+
+        Raises:
+           AssertionError: If the value is not either a float or an int.
+
+        Returns:
+           The circuit breaker reset timeout.
+
+        Usage:
+           >>> config.http_circuit_reset_timeout = 30
+           or
+           >>> reset_timeout = config.http_circuit_reset_timeout
+        """
+        return self._http_circuit_reset_timeout
+
+    @http_circuit_reset_timeout.setter
+    def http_circuit_reset_timeout(self, value):
+        msg = "An int or float is required for the reset timeout"
+        assert isinstance(value, (float, int)), msg
+        self._http_circuit_reset_timeout = value
+
+    @property
+    def http_circuit_half_open_probes(self):
+        """The number of probe requests allowed by a half-open breaker.
+
+        This property holds how many requests a half-open circuit breaker
+lets through at the same time, any other requests fail with error 11 until
+a probe succeeds.
+
+        Args:
+           value: (optional [int]) The number of probe requests.
+
+        Raises:
+           AssertionError: If the value is not an int greater than 0.
+
+        Returns:
+           The number of half-open probe requests.
+
+        Usage:
+           >>> config.http_circuit_half_open_probes = 1
+           or
+           >>> probes = config.http_circuit_half_open_probes
+        """
+        return self._http_circuit_half_open_probes
+
+    @http_circuit_half_open_probes.setter
+    def http_circuit_half_open_probes(self, value):
+        msg = "An int greater than 0 is required for the half-open probes"
+        assert isinstance(value, int) and value > 0, msg
+        self._http_circuit_half_open_probes = value
+
+    @property
+    def http_prefer_low_latency(self):
+        """Whether to prefer the data center URL with the lowest latency.
+
+        This property holds whether the API sends requests to the data
+center URL with the best recent latency first, instead of following the
+order of datacenterurls. It has no effect unless datacenterurls is set.
+
+        Args:
+           value: (optional [bool]) True to prefer the lowest latency.
+
+        Raises:
+           AssertionError: If the value is not a bool.
+
+        Returns:
+           Whether the lowest latency data center URL is preferred.
+
+        Usage:
+           >>> config.http_prefer_low_latency = True
+           or
+           >>> http_prefer_low_latency = config.http_prefer_low_latency
+        """
+        return self._http_prefer_low_latency
+
+    @http_prefer_low_latency.setter
+    def http_prefer_low_latency(self, value):
+        msg = "A bool is required to prefer the lowest latency"
+        assert isinstance(value, bool), msg
+        self._http_prefer_low_latency = value
+
+    @property
+    def http_pool_maxsize(self):
+        """The maximum number of pooled HTTP connections.
+
+        This property holds the maximum number of keep-alive connections
+to Trust Payments that the API will hold open for reuse. Connections are
+shared by all threads using the same securetrading.Api object.
+
+        Args:
+           value: (optional [int]) The maximum number of pooled connections.
+
+        Raises:
+           AssertionError: If the value is not an int greater than 0.
+
+        Returns:
+           The maximum number of pooled HTTP connections.
+
+        Usage:
+           >>> config.http_pool_maxsize = 10
+           or
+           >>> http_pool_maxsize = config.http_pool_maxsize
+        """
+        return self._http_pool_maxsize
+
+    @http_pool_maxsize.setter
+    def http_pool_maxsize(self, value):
+        msg = "An int greater than 0 is required for the pool size"
+        assert isinstance(value, int) and value > 0, msg
+        self._http_pool_maxsize = value
+
+    @property
+    def http_pool_idle_timeout(self):
+        """The idle time after which pooled HTTP connections are evicted.
+
+        This property holds the time in seconds that the pooled connections
+may remain unused before they are closed and new connections are opened
+on the next request. None keeps idle connections open indefinitely.
+
+        Args:
+           value: (optional [int, float or None]) The numeric value in
+seconds.
+
+        Raises:
+           AssertionError: If the value is not either a float, an int or None.
+
+        Returns:
+           The HTTP pool idle timeout.
+
+        Usage:
+           >>> config.http_pool_idle_timeout = 30
+           or
+           >>> http_pool_idle_timeout = config.http_pool_idle_timeout
+        """
+        return self._http_pool_idle_timeout
+
+    @http_pool_idle_timeout.setter
+    def http_pool_idle_timeout(self, value):
+        msg = "An int, float or None is required for the idle timeout"
+        assert value is None or isinstance(value, (float, int)), msg
+        self._http_pool_idle_timeout = value
+
+    @property
+    def response_cache_ttls(self):
+        """The time to live of the cached responses for each request type.
+
+        This property holds a dict mapping request types to the time in
+seconds that their responses are cached by the API. Only the read-only
+request types CURRENCYRATE and TRANSACTIONQUERY can be cached. A request is
+only answered from the cache when all of its request types are in this
+dict, an empty dict disables the cache.
+
+        Args:
+           value: (optional [dict]) The request types and their time to live.
+
+        Raises:
+           AssertionError: If the value is not a dict of cacheable request
+types to an int or float greater than 0.
+
+        Returns:
+           The response cache time to live of each request type.
+
+        Usage:
+           >>> config.response_cache_ttls = {"CURRENCYRATE": 300,
+           ...                               "TRANSACTIONQUERY": 30}
+           or
+           >>> response_cache_ttls = config.response_cache_ttls
+        """
+        return self._response_cache_ttls
+
+    @response_cache_ttls.setter
+    def response_cache_ttls(self, value):
+        msg = "A dict of cacheable request types ({0}) to an int or float \
+greater than 0 is required for the cache ttls".format(
+            ", ".join(cache.cacheable_requesttypes))
+        assert isinstance(value, dict), msg
+        for requesttype in value:
+            ttl = value[requesttype]
+            assert requesttype in cache.cacheable_requesttypes, msg
+            assert isinstance(ttl, (float, int)) and ttl > 0, msg
+        self._response_cache_ttls = dict(value)
+
+    @property
+    def response_cache_max_entries(self):
+        """The maximum number of cached responses.
+
+        This property holds the number of responses the API will cache,
+once it is reached the least recently used response is evicted.
+
+        Args:
+           value: (optional [int]) The maximum number of cached responses.
+
+        Raises:
+           AssertionError: If the value is not an int greater than 0.
+
+        Returns:
+           The maximum number of cached responses.
+
+        Usage:
+           >>> config.response_cache_max_entries = 1000
+           or
+           >>> response_cache_max_entries = config.response_cache_max_entries
+        """
+        return self._response_cache_max_entries
+
+    @response_cache_max_entries.setter
+    def response_cache_max_entries(self, value):
+        msg = "An int greater than 0 is required for the maximum entries"
+        assert isinstance(value, int) and value > 0, msg
+        self._response_cache_max_entries = value
+
+    @property
+    def response_cache_max_bytes(self):
+        """The maximum total size of the cached responses.
+
+        This property holds the total size in bytes of the response bodies
+the API will cache, once it is exceeded the least recently used responses
+are evicted. None only limits the number of entries.
+
+        Args:
+           value: (optional [int or None]) The maximum size in bytes.
+
+        Raises:
+           AssertionError: If the value is not None or an int greater than 0.
+
+        Returns:
+           The maximum total size of the cached responses.
+
+        Usage:
+           >>> config.response_cache_max_bytes = 1048576
+           or
+           >>> response_cache_max_bytes = config.response_cache_max_bytes
+        """
+        return self._response_cache_max_bytes
+
+    @response_cache_max_bytes.setter
+    def response_cache_max_bytes(self, value):
+        msg = "An int greater than 0 or None is required for the maximum \
+bytes"
+        assert value is None or (isinstance(value, int) and value > 0), msg
+        self._response_cache_max_bytes = value
+
+    @property
+    def singleflight_requesttypes(self):
+        """The request types whose identical concurrent requests are shared.
+
+        This property holds the read-only request types for which the API
+sends only one of several identical requests made at the same time, the
+other callers wait for it and receive a copy of its response with their
+own requestreference. With an AsyncApi, requests are shared between the
+coroutines of one event loop. Only CURRENCYRATE and TRANSACTIONQUERY can be
+shared, an empty list disables sharing.
+
+        Args:
+           value: (optional [list]) The request types to share.
+
+        Raises:
+           AssertionError: If the value is not a list of CURRENCYRATE and
+TRANSACTIONQUERY request types.
+
+        Returns:
+           The request types whose concurrent requests are shared.
+
+        Usage:
+           >>> config.singleflight_requesttypes = ["TRANSACTIONQUERY"]
+           or
+           >>> singleflight_requesttypes = config.singleflight_requesttypes
+        """
+        return self._singleflight_requesttypes
+
+    @singleflight_requesttypes.setter
+    def singleflight_requesttypes(self, values):
+        msg = "A list of cacheable request types ({0}) is required for the \
+single-flight request types".format(", ".join(cache.cacheable_requesttypes))
+        assert isinstance(values, list), msg
+        for value in values:
+            assert value in cache.cacheable_requesttypes, msg
+        self._singleflight_requesttypes = list(values)
+
+    @property
+    def response_timings(self):
+        """Whether the time taken by each phase is returned on the Response.
+
+        This property holds whether the API sets the timings of the
+request, as returned by securetrading.Timings.as_dict, on the key
+'timings' of the Response object.
+
+        Args:
+           value: (optional [bool]) True to return the timings.
+
+        Raises:
+           AssertionError: If the value is not a bool.
+
+        Returns:
+           Whether the timings are returned on the Response object.
+
+        Usage:
+           >>> config.response_timings = True
+           >>> response = api.process(request)
+           >>> total = response["timings"]["total"]
+        """
+        return self._response_timings
+
+    @response_timings.setter
+    def response_timings(self, value):
+        msg = "A bool is required to return the response timings"
+        assert isinstance(value, bool), msg
+        self._response_timings = value
+
+    @property
+    def request_schema(self):
+        """The schema that requests are checked against before being sent.
+
+        This property holds the securetrading.schema.Schema that the API
+checks each request against before encoding it. A request that is missing a
+required field or has a malformed field is answered with the gateway's
+"Invalid field" error, with the name of the field as the errordata, without
+being sent. None sends every request to Trust Payments unchecked.
+
+        Args:
+           value: (optional [securetrading.schema.Schema or None]) The
+schema.
+
+        Raises:
+           AssertionError: If the value is not None or a
+securetrading.schema.Schema.
+
+        Returns:
+           The request schema.
+
+        Usage:
+           >>> config.request_schema = securetrading.schema.Schema()
+           or
+           >>> request_schema = config.request_schema
+        """
+        return self._request_schema
+
+    @request_schema.setter
+    def request_schema(self, value):
+        msg = "A securetrading.schema.Schema or None is required for the \
+request schema"
+        assert value is None or isinstance(value, schema.Schema), msg
+        self._request_schema = value
+
     @property
     def http_response_headers(self):
         """A list of which HTTP response headers should be returned by the API.
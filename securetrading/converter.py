@@ -1,6 +1,8 @@
 from __future__ import unicode_literals
+import logging
 import securetrading
 import securetrading.phrasebook as phrasebook
+import securetrading.requestobject as requestobject
 
 
 class Converter(object):
@@ -9,24 +11,23 @@ class Converter(object):
         super(Converter, self).__init__()
         self.config = config
         self.phrasebook = phrasebook.PhraseBook(self.config)
+        self._envelope = None
 
     def _encode(self, request_object):
         request = []
-        debug = "{0} Begin encoding".format(
-            request_object["requestreference"])
-        securetrading.util.logger.debug(debug)
+        request_reference = request_object["requestreference"]
+        securetrading.util._log(logging.DEBUG, request_reference,
+                                "Begin encoding")
         libraryversion = "python_{0}".format(securetrading.__version__)
 
         if isinstance(request_object, securetrading.Requests):
-            debug = "{0} securetrading.Requests object detected".format(
-                request_object["requestreference"])
-            securetrading.util.logger.debug(debug)
+            securetrading.util._log(logging.DEBUG, request_reference,
+                                    "securetrading.Requests object detected")
             for request_obj in request_object["requests"]:
                 request.append(request_obj)
         elif isinstance(request_object, securetrading.Request):
-            debug = "{0} securetrading.Request object detected".format(
-                request_object["requestreference"])
-            securetrading.util.logger.debug(debug)
+            securetrading.util._log(logging.DEBUG, request_reference,
+                                    "securetrading.Request object detected")
             request.append(request_object)
         else:
             data = ["Unknown type of object ({0}), encoding failed".format(
@@ -44,23 +45,65 @@ class Converter(object):
             })
 
         try:
-            result = securetrading.util.json.dumps(st_structure)
+            for request_obj in request:
+                if isinstance(request_obj, securetrading.TemplateRequest) and\
+                        securetrading.util._json_backend not in\
+                        requestobject._encoded_in_full:
+                    result = self._encode_templates(st_structure)
+                    break
+            else:
+                result = securetrading.util._json_dumps(st_structure)
         except (UnicodeDecodeError, TypeError) as e:
             # This will raise if a latin-1 encoded string is passed in.
             data = ["All types should be specified in unicode"]
             raise securetrading.ApiError("10", data=data)
-        debug = "{0} Finished encoding".format(
-            request_object["requestreference"])
-        securetrading.util.logger.debug(debug)
+        securetrading.util._log(logging.DEBUG, request_reference,
+                                "Finished encoding")
         return result
 
+    def _get_envelope(self, st_structure, dumps, backend):
+        # The encoded request data around the requests, kept for as long as
+        # the config and JSON backend stay the same.
+        key = (backend, st_structure["alias"], st_structure["version"],
+               st_structure.get("acceptcustomeroutput"))
+        envelope = self._envelope
+        if envelope is None or envelope[0] != key:
+            st_structure = dict(st_structure)
+            del st_structure["request"]
+            encoded = dumps(st_structure)
+            if isinstance(encoded, type("")):
+                pieces = (", \"request\": [", ", ", "]}")
+            else:
+                pieces = (b", \"request\": [", b", ", b"]}")
+            envelope = (key, encoded[:-1] + pieces[0], pieces[1], pieces[2])
+            self._envelope = envelope
+        return envelope
+
+    def _encode_templates(self, st_structure):
+        # The constant fields of requests made from a template are already
+        # encoded, so the request data is put together from the pieces.
+        dumps = securetrading.util._json_dumps
+        backend = securetrading.util._json_backend
+        key, prefix, separator, suffix = self._get_envelope(st_structure,
+                                                            dumps, backend)
+        encoded_requests = []
+        for request_obj in st_structure["request"]:
+            encoded = None
+            if isinstance(request_obj, securetrading.TemplateRequest):
+                encoded = request_obj.template._encode(request_obj, dumps,
+                                                       backend)
+            if encoded is None:
+                encoded = dumps(request_obj)
+            encoded_requests.append(encoded)
+        return prefix + separator.join(encoded_requests) + suffix
+
     def _decode(self, response, response_headers, request_reference):
         try:
-            result = securetrading.util.json.loads(response)
+            result = securetrading.util._json_loads(response)
         except Exception as e:
             raise securetrading.SendReceiveError("5", data=e)
-        debug = "{0} Begin decoding".format(request_reference)
-        securetrading.util.logger.debug(debug)
+        securetrading.util._log(logging.DEBUG, request_reference,
+                                "Begin decoding")
         response_object = securetrading.Response()
         for k in ["requestreference", "version"]:
             response_object.update({k: result[k]})
@@ -68,6 +111,6 @@ class Converter(object):
         if self.config.http_response_headers and response_headers:
             response_object["headers"] = response_headers
         response_data = None
-        debug = "{0} Finished decoding".format(request_reference)
-        securetrading.util.logger.debug(debug)
+        securetrading.util._log(logging.DEBUG, request_reference,
+                                "Finished decoding")
         return response_object
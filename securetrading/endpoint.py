@@ -0,0 +1,49 @@
+from __future__ import unicode_literals
+import threading
+
+
+class Endpoint(object):
+    """A datacenter that requests can be sent to."""
+
+    def __init__(self, datacenterurl, url):
+        super(Endpoint, self).__init__()
+        self.datacenterurl = datacenterurl
+        self.url = url
+
+
+class EndpointLatencies(object):
+    """The recent latency of each datacenter url.
+
+    Every measurement is folded into an exponentially weighted moving
+average, so that recent requests count for more than older ones. A failed
+connection attempt counts as a measurement of its whole connect timeout.
+"""
+
+    alpha = 0.3
+
+    def __init__(self):
+        super(EndpointLatencies, self).__init__()
+        self._lock = threading.Lock()
+        self._latencies = {}
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _record(self, datacenterurl, latency):
+        with self._lock:
+            average = self._latencies.get(datacenterurl)
+            if average is not None:
+                latency = self.alpha * latency + (1 - self.alpha) * average
+            self._latencies[datacenterurl] = latency
+
+    def _get_latencies(self):
+        with self._lock:
+            return dict(self._latencies)
+
+    def _sort(self, endpoints):
+        latencies = self._get_latencies()
+        # Endpoints that have not been measured yet are tried first, the
+        # sort is stable so ties keep the configured order.
+        return sorted(endpoints,
+                      key=lambda endpoint: latencies.get(
+                          endpoint.datacenterurl, 0))
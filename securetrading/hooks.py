@@ -0,0 +1,55 @@
+from __future__ import unicode_literals
+import logging
+import threading
+import securetrading
+
+events = ["before_encode",
+          "after_encode",
+          "before_attempt",
+          "after_attempt",
+          "after_decode",
+          "on_error",
+          ]
+
+
+class Hooks(object):
+    """The hooks registered for each event of the request lifecycle.
+
+    Every hook of an event is called with the requestreference, the
+securetrading.Timings of the request so far and a dict of the details of
+the event. Registering a hook replaces the tuple of hooks for its event, so
+calling the hooks never takes a lock and an event without hooks only costs
+a dict lookup.
+"""
+
+    def __init__(self):
+        super(Hooks, self).__init__()
+        self._lock = threading.Lock()
+        self._hooks = {}
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _add(self, event, hook):
+        msg = "The hook event must be one of {0}".format(", ".join(events))
+        assert event in events, msg
+        with self._lock:
+            self._hooks[event] = self._hooks.get(event, ()) + (hook,)
+
+    def _remove(self, event, hook):
+        with self._lock:
+            hooks = list(self._hooks.get(event, ()))
+            hooks.remove(hook)
+            if hooks:
+                self._hooks[event] = tuple(hooks)
+            else:
+                del self._hooks[event]
+
+    def _call(self, event, request_reference, timings, data):
+        for hook in self._hooks.get(event, ()):
+            try:
+                hook(request_reference, timings, data)
+            except Exception:
+                securetrading.util._log(logging.ERROR, request_reference,
+                                        "The %s hook failed", event,
+                                        exc_info=True)
@@ -1,8 +1,11 @@
 from __future__ import unicode_literals
+import logging
 import securetrading
 import time
+import threading
 import securetrading.util
 import platform
+from securetrading.endpoint import Endpoint
 
 
 def _get_requests_lib():
@@ -26,42 +29,165 @@ def _get_requests_lib():
 requests = _get_requests_lib()
 
 
-def _get_client(request_reference, config):
+def _get_client(config, pool=None, retry_budget=None, circuit_breakers=None,
+                latencies=None, hooks=None):
     if requests:
-        debug = "{0} Using the 'requests' library".format(request_reference)
-        securetrading.util.logger.debug(debug)
-        client = HTTPRequestsClient(config)
+        client = HTTPRequestsClient(config, pool=pool,
+                                    retry_budget=retry_budget,
+                                    circuit_breakers=circuit_breakers,
+                                    latencies=latencies,
+                                    hooks=hooks)
     else:
         msg = "No request library found"
         raise securetrading.SecureTradingError("2", data=[msg])
     return client
 
 
-class GenericHTTPClient(object):
+class HTTPConnectionPool(object):
+    """A keep-alive connection pool shared by the HTTP clients of an Api.
+
+    The underlying requests.Session is built on first use and rebuilt
+once it has been idle for longer than config.http_pool_idle_timeout, so
+that connections the server has already dropped are never reused.
+"""
 
     def __init__(self, config):
+        super(HTTPConnectionPool, self).__init__()
+        self.config = config
+        self._lock = threading.Lock()
+        self._session = None
+        self._last_used = 0
+
+    def _after_fork(self):
+        # The session's connections are shared with the parent process, so
+        # they are dropped without being closed and the child opens its own.
+        self._lock = threading.Lock()
+        self._session = None
+        self._last_used = 0
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_maxsize=self.config.http_pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # Every request must be independent of the previous ones, as it
+        # was when each request used its own connection.
+        policy = requests.compat.cookielib.DefaultCookiePolicy(
+            allowed_domains=[])
+        session.cookies.set_policy(policy)
+        return session
+
+    def _get_session(self):
+        with self._lock:
+            now = time.time()
+            idle_timeout = self.config.http_pool_idle_timeout
+            if self._session is not None and idle_timeout is not None and\
+                    now - self._last_used > idle_timeout:
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = self._build_session()
+            self._last_used = now
+            return self._session
+
+    def _close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class _PrecomputedAuth(object):
+    """A requests auth callable that sets an Authorization header which
+has already been encoded."""
+
+    def __init__(self, authorization):
+        super(_PrecomputedAuth, self).__init__()
+        self.authorization = authorization
+
+    def __call__(self, request):
+        request.headers["Authorization"] = self.authorization
+        return request
+
+
+class _Call(object):
+    """The state of one request sent by a client.
+
+    Clients are shared by every thread of an Api, so everything that
+belongs to a single request is kept here and passed to the methods that
+need it, rather than stored on the client.
+"""
+
+    __slots__ = ("request_reference", "deadline", "profile", "timings",
+                 "endpoints", "endpoint", "endpoint_index", "endpoint_attempt",
+                 "acquired_endpoints")
+
+    def __init__(self, request_reference, deadline=None, profile=None,
+                 timings=None):
+        super(_Call, self).__init__()
+        self.request_reference = request_reference
+        self.deadline = deadline
+        self.profile = profile
+        self.timings = timings
+        self.endpoints = None
+        self.endpoint = None
+        self.endpoint_index = 0
+        self.endpoint_attempt = 0
+        self.acquired_endpoints = []
+
+
+class GenericHTTPClient(object):
+    """Sends requests to Trust Payments.
+
+    A client holds no state of its own for a request, so one client is
+shared by every thread of an Api. The connection pool, retry budget,
+circuit breakers and endpoint latencies it is given are the only state
+shared between requests, and each of them is synchronized.
+"""
+
+    # Whether _connect opens the connection, so that the time it takes is
+    # recorded as the "connect" phase of the timings.
+    _measures_connect = True
+
+    def __init__(self, config, pool=None, retry_budget=None,
+                 circuit_breakers=None, latencies=None, hooks=None):
         super(GenericHTTPClient, self).__init__()
         self.config = config
-        self.connect_time_out = self.config.http_connect_timeout
-        self.read_time_out = self.config.http_receive_timeout
-        self.proxies = self.config.http_proxy
+        self.pool = pool
+        self.retry_budget = retry_budget
+        self.circuit_breakers = circuit_breakers
+        self.latencies = latencies
+        self.hooks = hooks
 
     def _close(self):
         raise NotImplementedError
 
-    def _receive(self):
+    def _receive(self, response):
         raise NotImplementedError
 
-    def _send(self, url, request_data, request_reference):
+    def _send(self, call, url, request_data):
         raise NotImplementedError
 
     def _connect(self, url):
         raise NotImplementedError
 
-    def _get_response_headers(self):
+    def _get_response_headers(self, response):
         raise NotImplementedError
 
-    def _get_headers(self, request_reference):
+    def _get_status_code(self, response):
+        # None when the client cannot tell the status before _receive
+        return None
+
+    def _get_headers(self, request_reference, profile=None):
+        if profile is not None:
+            headers = profile._get_headers(self).copy()
+        else:
+            headers = self._get_static_headers()
+        headers["REQUESTREFERENCE"] = request_reference
+        return headers
+
+    def _get_static_headers(self):
         version_info = securetrading.version_info
         python_version = platform.python_version()
         user_agent = "Python-{0}".format(python_version)
@@ -70,9 +196,8 @@ class GenericHTTPClient(object):
                    "Accept": "application/json",
                    "Accept-Encoding": "gzip",
                    "User-Agent": user_agent,
-                   "REQUESTREFERENCE": request_reference,
                    "VERSIONINFO": version_info,
-                   "Connection": "close",
+                   "Connection": "keep-alive",
                    }
         return headers
 
@@ -84,53 +209,211 @@ class GenericHTTPClient(object):
                    }.get(code, "8")
         raise securetrading.ConnectionError(mapping, http_status_code=code)
 
-    def _get_connection_time_out(self, start_time):
+    def _get_connection_time_out(self, start_time, deadline=None):
         connection_time = self.config.http_max_allowed_connection_time
         time_remaining = connection_time - (time.time() - start_time)
-        connect_time_out = min([self.connect_time_out,
+        if deadline is not None:
+            time_remaining = min(time_remaining, deadline - time.time())
+        connect_time_out = min([self.config.http_connect_timeout,
                                 time_remaining,
                                 ])
         return (time_remaining <= 0, connect_time_out)
 
-    def _main(self, url, request_data, request_reference, request):
-        info = "{0} Begin transport".format(request_reference)
-        securetrading.util.logger.info(info)
+    def _get_read_time_out(self, deadline=None):
+        read_time_out = self.config.http_receive_timeout
+        if deadline is None:
+            return read_time_out
+        # A timeout must be positive, an expired deadline is reported by
+        # the next call to _get_connection_time_out.
+        return max(0.001, min(read_time_out, deadline - time.time()))
+
+    def _get_retry_sleep(self, start_time, attempt, previous_sleep,
+                         deadline=None):
+        policy = self.config.http_retry_policy
+        retry_sleep = policy.get_sleep(self.config, attempt, previous_sleep)
+        connection_time = self.config.http_max_allowed_connection_time
+        time_remaining = connection_time - (time.time() - start_time)
+        if deadline is not None:
+            time_remaining = min(time_remaining, deadline - time.time())
+        # Never sleep past the time allowed to connect.
+        return max(0, min(retry_sleep, time_remaining))
+
+    def _record_request(self):
+        if self.retry_budget is not None:
+            self.retry_budget._deposit()
+
+    def _verify_retry_budget(self, url, request_reference, attempt):
+        if attempt > self.config.http_max_retries or\
+                self.retry_budget is None or self.retry_budget._withdraw():
+            return
+        msg = "{0} Retry budget exhausted whilst trying to connect to \
+{1}".format(request_reference, url)
+        raise securetrading.ConnectionError("7", data=[msg])
+
+    def _get_endpoints(self, url, profile=None):
+        if profile is None:
+            return [Endpoint(self.config.datacenterurl, url)]
+        endpoints = list(profile.endpoints)
+        if self.latencies is not None and\
+                self.config.http_prefer_low_latency:
+            endpoints = self.latencies._sort(endpoints)
+        return endpoints
+
+    def _begin_endpoints(self, call, url):
+        call.endpoints = self._get_endpoints(url, call.profile)
+        call.endpoint_index = 0
+        call.endpoint_attempt = 0
+        call.acquired_endpoints = []
+        self._next_endpoint(call)
+
+    def _next_endpoint(self, call):
+        # Returns the first endpoint, from the current one onwards, that
+        # its circuit breaker lets requests through to.
+        error = None
+        for i in range(len(call.endpoints)):
+            index = (call.endpoint_index + i) % len(call.endpoints)
+            endpoint = call.endpoints[index]
+            if endpoint not in call.acquired_endpoints:
+                if self.circuit_breakers is not None:
+                    breaker = self.circuit_breakers._get(
+                        endpoint.datacenterurl)
+                    try:
+                        breaker._before_request(call.request_reference)
+                    except securetrading.ConnectionError as e:
+                        error = error or e
+                        continue
+                call.acquired_endpoints.append(endpoint)
+            call.endpoint_index = index
+            call.endpoint = endpoint
+            return endpoint
+        raise error
+
+    def _get_attempt_url(self, call, url, attempt):
+        if call.endpoints is None:
+            return url
+        if attempt != call.endpoint_attempt:
+            # The previous attempt failed to connect, fail over to the next
+            # endpoint.
+            call.endpoint_attempt = attempt
+            call.endpoint_index += 1
+            self._next_endpoint(call)
+        return call.endpoint.url
+
+    def _add_timing(self, call, phase, seconds):
+        if call.timings is not None:
+            call.timings._add(phase, seconds)
+
+    def _call_hooks(self, call, event, data):
+        if self.hooks is not None and self.hooks._hooks:
+            self.hooks._call(event, call.request_reference, call.timings,
+                             data)
+
+    def _begin_attempt(self, call, url, attempt):
+        self._call_hooks(call, "before_attempt",
+                         {"url": url, "attempt": attempt})
+        return time.time()
+
+    def _end_attempt(self, call, url, attempt, attempt_start,
+                     exception=None):
+        seconds = time.time() - attempt_start
+        if call.timings is not None:
+            error = None
+            if exception is not None:
+                error = repr(exception)
+            call.timings._add_attempt(url, seconds, error)
+        self._call_hooks(call, "after_attempt",
+                         {"url": url, "attempt": attempt, "seconds": seconds,
+                          "exception": exception})
+
+    def _set_status_timing(self, call, status_code):
+        if call.timings is not None:
+            call.timings._set_status(status_code)
+
+    def _record_latency(self, call, latency):
+        if self.latencies is not None and call.endpoint is not None:
+            self.latencies._record(call.endpoint.datacenterurl, latency)
+
+    def _end_endpoints(self, call, error=None):
+        if self.circuit_breakers is not None:
+            for endpoint in call.acquired_endpoints:
+                breaker = self.circuit_breakers._get(endpoint.datacenterurl)
+                if endpoint is call.endpoint:
+                    self._record_circuit_result(breaker, error)
+                else:
+                    # Endpoints are only left after failing to connect.
+                    breaker._record_failure()
+        call.endpoints = None
+
+    def _record_circuit_result(self, breaker, error):
+        if error is None:
+            breaker._record_success()
+        elif isinstance(error, securetrading.HttpError) and error.code != "6":
+            breaker._record_failure()
+        elif isinstance(error, securetrading.SecureTradingError):
+            # Trust Payments was reached, e.g. the credentials were invalid.
+            breaker._record_success()
+        else:
+            breaker._release_probe()
+
+    def _main(self, url, request_data, request_reference, request,
+              deadline=None, profile=None, timings=None):
+        call = _Call(request_reference, deadline=deadline, profile=profile,
+                     timings=timings)
+        self._begin_endpoints(call, url)
+        try:
+            result = self._transport(call, url, request_data)
+        except BaseException as e:
+            self._end_endpoints(call, e)
+            raise
+        self._end_endpoints(call)
+        return result
+
+    def _transport(self, call, url, request_data):
+        request_reference = call.request_reference
+        securetrading.util._log(logging.INFO, request_reference,
+                                "Begin transport")
         connect_start = time.time()
         try:
             self._connect(url)
         except Exception as e:
-            debug = "{0} Connect error: {1}".format(request_reference, e)
-            securetrading.util.logger.debug(debug, exc_info=True)
+            securetrading.util._log(logging.DEBUG, request_reference,
+                                    "Connect error: %s", e, exc_info=True)
             raise securetrading.ConnectionError("7", data=e)
         conn_time_taken = time.time() - connect_start
-        info = "{0} Connect time {1:.2f}".format(request_reference,
-                                                 conn_time_taken)
-        securetrading.util.logger.info(info)
+        if self._measures_connect:
+            self._add_timing(call, "connect", conn_time_taken)
+        securetrading.util._log(logging.INFO, request_reference,
+                                "Connect time %.2f", conn_time_taken)
         try:
             recv_start = time.time()
             try:
-                self._send(url, request_data, request_reference)
-                (status_code, response) = self._receive()
-                response_headers = self._get_response_headers()
+                http_response = self._send(call, url, request_data)
+                # Recorded first as _receive raises for a non-200 status
+                self._set_status_timing(call,
+                                        self._get_status_code(http_response))
+                (status_code, response) = self._receive(http_response)
+                self._set_status_timing(call, status_code)
+                response_headers = self._get_response_headers(http_response)
             except (securetrading.SecureTradingError) as e:
-                securetrading.util.logger.debug(e, exc_info=True)
+                securetrading.util._log(logging.DEBUG, request_reference,
+                                        "%s", e, exc_info=True)
                 raise
             except Exception as e:
-                debug = "{0} Receiving error".format(request_reference)
-                securetrading.util.logger.debug(debug, exc_info=True)
+                securetrading.util._log(logging.DEBUG, request_reference,
+                                        "Receiving error", exc_info=True)
                 raise securetrading.SendReceiveError("4", data=e)
             finally:
                 recv_time_taken = time.time() - recv_start
-                info = "{0} Receive time: {1:.2f}".format(request_reference,
-                                                          recv_time_taken)
-                securetrading.util.logger.info(info)
+                self._add_timing(call, "send_receive", recv_time_taken)
+                securetrading.util._log(logging.INFO, request_reference,
+                                        "Receive time: %.2f", recv_time_taken)
             try:
                 self._verify_response(status_code, response, response_headers)
             finally:
                 recv_time_taken = time.time() - recv_start
-                info = "{0} Finished transport: {1:.2f}".format(
-                    request_reference, recv_time_taken)
-                securetrading.util.logger.info(info)
+                securetrading.util._log(logging.INFO, request_reference,
+                                        "Finished transport: %.2f",
+                                        recv_time_taken)
         finally:
             self._close()
         return response, response_headers
@@ -138,33 +421,44 @@ class GenericHTTPClient(object):
 
 class HTTPRequestsClient(GenericHTTPClient):
 
+    # requests connects while it sends the request, so the connection time
+    # is part of the "send_receive" phase.
+    _measures_connect = False
+
     def _close(self):
         pass
 
     def _connect(self, url):
         pass
 
-    def _get_headers(self, *args, **kwargs):
-        headers = super(HTTPRequestsClient, self)._get_headers(*args, **kwargs)
+    def _get_static_headers(self):
+        headers = super(HTTPRequestsClient, self)._get_static_headers()
         requests_user_agent = requests.utils.default_user_agent()
         user_agent = "{0}:{1}".format(headers["User-Agent"],
                                       requests_user_agent)
         headers["User-Agent"] = user_agent
         return headers
 
-    def _send(self, url, request_data, request_reference):
-        auth = requests.auth.HTTPBasicAuth(
-            self.config.username, self.config.password)
+    def _get_auth(self, profile=None):
+        if profile is not None:
+            return _PrecomputedAuth(profile.authorization)
+        return requests.auth.HTTPBasicAuth(self.config.username,
+                                           self.config.password)
+
+    def _send(self, call, url, request_data):
+        request_reference = call.request_reference
+        auth = self._get_auth(call.profile)
         method = "POST"
-        headers = self._get_headers(request_reference)
-        final = False
+        headers = self._get_headers(request_reference, call.profile)
         start_time = time.time()
+        self._record_request()
 
         current_retry_count = 0
-        while not final:
+        retry_sleep = None
+        while True:
             msg = None
             (timed_out, connect_time_out) = self._get_connection_time_out(
-                start_time)
+                start_time, call.deadline)
             if timed_out:
                 msg = "{0} Maximum time reached whilst trying to connect to \
 {1}".format(request_reference, url)
@@ -173,10 +467,12 @@ class HTTPRequestsClient(GenericHTTPClient):
 to connect to {1}".format(request_reference, url)
             if msg is not None:
                 raise securetrading.ConnectionError("7", data=[msg])
+            url = self._get_attempt_url(call, url, current_retry_count)
+            attempt_start = self._begin_attempt(call, url,
+                                                current_retry_count)
             try:
-                msg = "{0} Connect to {1}".format(request_reference, url)
-                securetrading.util.logger.debug(msg, exc_info=True)
-
+                securetrading.util._log(logging.DEBUG, request_reference,
+                                        "Connect to %s", url)
                 # Future - we should be implementing the Retry logic using a
                 # HTTPAdapter:
                 # http://docs.python-requests.org/en/latest/user/advanced/#t
@@ -204,27 +500,40 @@ to connect to {1}".format(request_reference, url)
                           "auth": auth,
                           "headers": headers,
                           "verify": True,
-                          "proxies": self.proxies,
+                          "proxies": self.config.http_proxy,
                           "timeout": (connect_time_out,
-                                      self.read_time_out),
+                                      self._get_read_time_out(call.deadline)),
                           }
                 if self.config.ssl_certificate_file is not None:
                     kwargs["verify"] = self.config.ssl_certificate_file
-                self.response = requests.request(**kwargs)
-                final = True
+                if self.pool is not None:
+                    session = self.pool._get_session()
+                    response = session.request(**kwargs)
+                else:
+                    response = requests.request(**kwargs)
+                self._record_latency(call, time.time() - attempt_start)
+                self._end_attempt(call, url, current_retry_count,
+                                  attempt_start)
+                return response
             except (requests.exceptions.ConnectTimeout,
                     requests.exceptions.ConnectionError) as e:
-                msg = "{0} Connection attempt {1} failed due to {2}, \
-maximum allowed {3}".format(request_reference,
-                            current_retry_count,
-                            e,
-                            self.config.http_max_retries)
-                securetrading.util.logger.info(msg)
+                securetrading.util._log(
+                    logging.INFO, request_reference,
+                    "Connection attempt %s failed due to %s, maximum \
+allowed %s", current_retry_count, e, self.config.http_max_retries)
+                self._record_latency(call, connect_time_out)
+                self._end_attempt(call, url, current_retry_count,
+                                  attempt_start, e)
                 current_retry_count += 1
-                time.sleep(self.config.http_retry_sleep)
+                self._verify_retry_budget(url, request_reference,
+                                          current_retry_count)
+                retry_sleep = self._get_retry_sleep(
+                    start_time, current_retry_count, retry_sleep,
+                    call.deadline)
+                time.sleep(retry_sleep)
             except Exception as e:
-                final = True
-                self.response = None
+                self._end_attempt(call, url, current_retry_count,
+                                  attempt_start, e)
                 self._handle_exception(e)
 
     def _handle_exception(self, e):
@@ -235,16 +544,19 @@ maximum allowed {3}".format(request_reference,
         else:
             raise securetrading.ConnectionError("8", data=e)
 
-    def _receive(self):
-        text = self.response.text
-        status_code = self.response.status_code
+    def _get_status_code(self, response):
+        return getattr(response, "status_code", None)
+
+    def _receive(self, response):
+        text = response.text
+        status_code = response.status_code
         if status_code != requests.codes.ok:
             self._handle_invalid_response(status_code, text)
         return status_code, text
 
-    def _get_response_headers(self):
+    def _get_response_headers(self, response):
         result = {}
-        for header in self.response.headers:
+        for header in response.headers:
             if header.lower() in self.config.http_response_headers:
-                result[header] = self.response.headers[header]
+                result[header] = response.headers[header]
         return result
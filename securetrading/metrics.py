@@ -0,0 +1,246 @@
+from __future__ import unicode_literals
+import bisect
+import threading
+import weakref
+import securetrading.cache as cache
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+
+# The type and help text of every metric, in the order they are rendered.
+_definitions = [
+    ("securetrading_responses_total", "counter",
+     "Responses by request type and error code."),
+    ("securetrading_request_duration_seconds", "histogram",
+     "Time taken to process each request."),
+    ("securetrading_http_attempts_total", "counter",
+     "Attempts to send a request by endpoint and HTTP status, the status is \
+error when no response was received."),
+    ("securetrading_http_retries_total", "counter",
+     "Attempts to send a request after its first attempt failed."),
+    ("securetrading_http_attempt_duration_seconds", "histogram",
+     "Time taken by each attempt to send a request."),
+]
+
+
+def _get_requesttype(request):
+    requesttypes = None
+    if isinstance(request, dict):
+        requesttypes = cache._get_requesttypes(request)
+    return ",".join(requesttypes or [])
+
+
+def _escape(value):
+    return "{0}".format(value).replace("\\", "\\\\").replace(
+        "\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    return ",".join('{0}="{1}"'.format(name, _escape(value))
+                    for name, value in labels)
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else "{0}".format(value)
+
+
+class _Shard(object):
+
+    def __init__(self):
+        super(_Shard, self).__init__()
+        # Only the owning thread writes to a shard, so its lock is only
+        # contended while a snapshot is being taken.
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def _add(self, shard):
+        for key, value in shard.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, histogram in shard.histograms.items():
+            total = self.histograms.get(key)
+            if total is None:
+                self.histograms[key] = list(histogram)
+            else:
+                self.histograms[key] = [a + b for a, b in
+                                        zip(total, histogram)]
+
+
+class _Owner(object):
+    # Held by the thread-local storage of the thread a shard belongs to, so
+    # that it is released when the thread exits.
+
+    def __init__(self, shard):
+        super(_Owner, self).__init__()
+        self.shard = shard
+
+
+class Metrics(object):
+    """Counters and latency histograms of the requests sent by an Api.
+
+    Each thread records into its own shard, the shards are only combined
+when a snapshot is taken. The shard of a thread that has exited is added to
+a shared shard, so there are never many more shards than running threads.
+Histograms count observations into fixed buckets of upper bounds in seconds.
+"""
+
+    def __init__(self, buckets=default_buckets):
+        super(Metrics, self).__init__()
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # The shard of the threads that have exited, always the first shard
+        self._exited = _Shard()
+        self._shards = [self._exited]
+        # The shard of each running thread, by a weak reference to its owner
+        self._owners = {}
+        # The shards of the threads that exited since they were last added
+        # to the shared shard
+        self._exited_shards = []
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        for shard in self._shards:
+            shard.lock = threading.Lock()
+        # Releases the owner of the forking thread, so its shard is added to
+        # the shared shard like those of the threads that did not survive
+        self._local = threading.local()
+
+    def _on_exit(self, reference):
+        # Called when the thread of a shard has exited, possibly while
+        # another thread holds a lock or in a child process before
+        # _after_fork, so the shard is only added to the shared shard later.
+        shard = self._owners.pop(reference, None)
+        if shard is not None:
+            self._exited_shards.append(shard)
+
+    def _add_exited(self):
+        # Called with self._lock held
+        while self._exited_shards:
+            shard = self._exited_shards.pop()
+            self._shards.remove(shard)
+            with shard.lock:
+                with self._exited.lock:
+                    self._exited._add(shard)
+
+    def _get_shard(self):
+        owner = getattr(self._local, "owner", None)
+        if owner is None:
+            owner = _Owner(_Shard())
+            self._local.owner = owner
+            with self._lock:
+                self._add_exited()
+                self._owners[weakref.ref(owner, self._on_exit)] = owner.shard
+                self._shards.append(owner.shard)
+        return owner.shard
+
+    def _inc(self, name, labels, value=1):
+        key = (name, labels)
+        shard = self._get_shard()
+        with shard.lock:
+            shard.counters[key] = shard.counters.get(key, 0) + value
+
+    def _observe(self, name, labels, seconds):
+        key = (name, labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        shard = self._get_shard()
+        with shard.lock:
+            histogram = shard.histograms.get(key)
+            if histogram is None:
+                # A count for each bucket and for +Inf, followed by the sum
+                histogram = [0] * (len(self.buckets) + 1) + [0]
+                shard.histograms[key] = histogram
+            histogram[index] += 1
+            histogram[-1] += seconds
+
+    def _record(self, request, result, timings):
+        requesttype = _get_requesttype(request)
+        errorcode = "0"
+        for response in result.get("responses", []):
+            response_errorcode = "{0}".format(response.get("errorcode"))
+            if errorcode == "0":
+                errorcode = response_errorcode
+            response_type = response.get("requesttypedescription")
+            if not response_type or response_type == "ERROR":
+                response_type = requesttype
+            self._inc("securetrading_responses_total",
+                      (("requesttype", response_type),
+                       ("errorcode", response_errorcode)))
+        if timings.total is not None:
+            self._observe("securetrading_request_duration_seconds",
+                          (("requesttype", requesttype),
+                           ("errorcode", errorcode)), timings.total)
+        for index, attempt in enumerate(timings.attempts):
+            endpoint = (("endpoint", attempt["url"]),)
+            status = "error"
+            if attempt["status"] is not None:
+                status = "{0}".format(attempt["status"])
+            self._inc("securetrading_http_attempts_total",
+                      endpoint + (("status", status),))
+            if index:
+                self._inc("securetrading_http_retries_total", endpoint)
+            self._observe("securetrading_http_attempt_duration_seconds",
+                          endpoint, attempt["seconds"])
+
+    def _get_totals(self):
+        totals = _Shard()
+        # The lock is held throughout, so that no shard is added to the
+        # shared shard while the totals are counted.
+        with self._lock:
+            self._add_exited()
+            for shard in self._shards:
+                with shard.lock:
+                    totals._add(shard)
+        return totals.counters, totals.histograms
+
+    def _get_snapshot(self):
+        counters, histograms = self._get_totals()
+        snapshot = {}
+        for key in sorted(counters):
+            name, labels = key
+            snapshot.setdefault(name, []).append(
+                {"labels": dict(labels), "value": counters[key]})
+        for key in sorted(histograms):
+            name, labels = key
+            histogram = histograms[key]
+            cumulative = 0
+            buckets = []
+            for bound, count in zip(self.buckets + (float("inf"),),
+                                    histogram[:-1]):
+                cumulative += count
+                buckets.append((bound, cumulative))
+            snapshot.setdefault(name, []).append(
+                {"labels": dict(labels),
+                 "buckets": buckets,
+                 "count": cumulative,
+                 "sum": histogram[-1],
+                 })
+        return snapshot
+
+    def _render_prometheus(self):
+        snapshot = self._get_snapshot()
+        lines = []
+        for name, metric_type, help_text in _definitions:
+            if name not in snapshot:
+                continue
+            lines.append("# HELP {0} {1}".format(name, help_text))
+            lines.append("# TYPE {0} {1}".format(name, metric_type))
+            for sample in snapshot[name]:
+                labels = sorted(sample["labels"].items())
+                if metric_type == "counter":
+                    lines.append("{0}{{{1}}} {2}".format(
+                        name, _format_labels(labels),
+                        _format_number(sample["value"])))
+                    continue
+                for bound, count in sample["buckets"]:
+                    bucket_labels = labels + [("le", _format_number(bound))]
+                    lines.append("{0}_bucket{{{1}}} {2}".format(
+                        name, _format_labels(bucket_labels), count))
+                lines.append("{0}_sum{{{1}}} {2}".format(
+                    name, _format_labels(labels),
+                    _format_number(sample["sum"])))
+                lines.append("{0}_count{{{1}}} {2}".format(
+                    name, _format_labels(labels), sample["count"]))
+        return "\n".join(lines) + "\n" if lines else ""
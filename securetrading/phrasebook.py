@@ -1,6 +1,48 @@
 from __future__ import unicode_literals
 import securetrading
 
+# The compiled table of each locale, shared by every PhraseBook
+_tables = {}
+
+
+class _Table(object):
+    """The translations of one locale, compiled from the phrase book.
+
+    messages maps each English message that has a translation to the
+translation and codes maps each error code straight to its translated error
+message. A table is compiled again if securetrading.phrase_book or
+securetrading.error_messages is reassigned, but not if they are changed in
+place.
+"""
+
+    __slots__ = ("locale", "phrase_book", "error_messages", "messages",
+                 "codes")
+
+    def __init__(self, locale, phrase_book, error_messages):
+        super(_Table, self).__init__()
+        self.locale = locale
+        self.phrase_book = phrase_book
+        self.error_messages = error_messages
+        self.messages = dict((english, mapping[locale]) for english, mapping
+                             in phrase_book.items() if locale in mapping)
+        self.codes = dict((code, self.messages.get(english, english))
+                          for code, english in error_messages.items())
+
+    def _is_current(self):
+        return self.phrase_book is securetrading.phrase_book and\
+            self.error_messages is securetrading.error_messages
+
+
+def _get_table(locale):
+    # Threads racing to compile a table build identical tables, so
+    # whichever is stored last is as good as any other.
+    table = _tables.get(locale)
+    if table is None or not table._is_current():
+        table = _Table(locale, securetrading.phrase_book,
+                       securetrading.error_messages)
+        _tables[locale] = table
+    return table
+
 
 class PhraseBook(object):
 
@@ -25,8 +67,18 @@ the locale information.
            >>> phrase_book = securetrading.PhraseBook(st_config)
         """
         self.config = config
+        self._table = None
         super(PhraseBook, self).__init__()
 
+    def _get_table(self, locale):
+        table = self._table
+        if table is None or table.locale != locale or\
+                table.phrase_book is not securetrading.phrase_book or\
+                table.error_messages is not securetrading.error_messages:
+            table = _get_table(locale)
+            self._table = table
+        return table
+
     def lookup(self, english, locale=None):
         """Retrieves the locale translation for an English message.
 
@@ -49,5 +101,58 @@ into. See the config.py documentation for more details.
         """
         if locale is None:
             locale = self.config.locale
-        mapping = securetrading.phrase_book.get(english, {"en_gb": english})
-        return mapping.get(locale, english)
+        return self._get_table(locale).messages.get(english, english)
+
+    def lookup_error(self, error_code, error_message, locale=None):
+        """Retrieves the locale translation of the message for an error code.
+
+        The English message of a known error code is translated, otherwise
+the error message passed in is translated.
+
+        Args:
+           error_code: [string] The error code to retrieve the message for.
+           error_message: [string] The English message to translate if the
+error code is not known.
+           locale: (optional[string]) The locale to translate the messsage
+into. See the config.py documentation for more details.
+
+        Returns:
+           A string representing the translated message.
+
+        Usage:
+           >>> translated = phrase_book.lookup_error("6", "")
+        """
+        if locale is None:
+            locale = self.config.locale
+        table = self._get_table(locale)
+        translated = table.codes.get(error_code)
+        if translated is None:
+            translated = table.messages.get(error_message, error_message)
+        return translated
+
+    def get_missing(self, locale=None):
+        """Retrieves the English messages without a translation.
+
+        Messages that are not translated into a locale are returned in
+English. English locales, such as en_gb, have nothing missing.
+
+        Args:
+           locale: (optional[string]) The locale to check, defaults to the
+locale in the config.
+
+        Returns:
+           A sorted list of the English messages and error messages that
+have no translation into the locale.
+
+        Usage:
+           >>> for english in phrase_book.get_missing("de_de"):
+           ...     print(english)
+        """
+        if locale is None:
+            locale = self.config.locale
+        if locale.split("_")[0] == "en":
+            return []
+        table = _get_table(locale)
+        english = set(table.phrase_book) | set(table.error_messages.values())
+        return sorted(message for message in english
+                      if message and message not in table.messages)
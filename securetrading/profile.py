@@ -0,0 +1,45 @@
+from __future__ import unicode_literals
+import base64
+import securetrading
+from securetrading.endpoint import Endpoint
+
+try:
+    from urllib.parse import urljoin
+except ImportError:
+    from urlparse import urljoin
+
+
+class TransportProfile(object):
+    """The per-config state used to send every request.
+
+    The joined URLs, the Authorization header, the static HTTP headers and
+the converter only depend on the config, so they are built once and reused
+until one of the config settings is changed.
+"""
+
+    def __init__(self, config):
+        super(TransportProfile, self).__init__()
+        self.config = config
+        self.revision = config._revision
+        datacenterurls = config.datacenterurls or [config.datacenterurl]
+        self.endpoints = [Endpoint(datacenterurl,
+                                   urljoin(datacenterurl,
+                                           config.datacenterpath))
+                          for datacenterurl in datacenterurls]
+        self.url = self.endpoints[0].url
+        credentials = "{0}:{1}".format(config.username, config.password)
+        self.authorization = "Basic {0}".format(
+            base64.b64encode(credentials.encode("latin-1")).decode("ascii"))
+        self.converter = securetrading.Converter(config)
+        self._headers = {}
+
+    def _is_current(self):
+        return self.revision == self.config._revision
+
+    def _get_headers(self, client):
+        client_type = type(client)
+        headers = self._headers.get(client_type)
+        if headers is None:
+            headers = client._get_static_headers()
+            self._headers[client_type] = headers
+        return headers
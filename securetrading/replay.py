@@ -0,0 +1,319 @@
+"""A record and replay transport for deterministic performance runs.
+
+A RecordingConnectionPool sends requests to Trust Payments as usual and
+saves every request and response pair to a file, with the card details
+redacted. A ReplayConnectionPool answers requests from such a file without
+any network access, at the recorded timing, faster or with no delay at all:
+
+    >>> api.http_pool = RecordingConnectionPool(config, "traffic.jsonl.gz")
+    >>> api.http_pool = ReplayConnectionPool(config, "traffic.jsonl.gz")
+    >>> for request in get_requests("traffic.jsonl.gz"):
+    ...     api.process(request)
+"""
+from __future__ import unicode_literals
+import collections
+import gzip
+import io
+import json
+import re
+import threading
+import time
+import securetrading.httpclient as httpclient
+
+requests = httpclient.requests
+
+redacted_fields = ["pan", "securitycode"]
+
+# The requestreference of the request, sent in its REQUESTREFERENCE header,
+# is replaced by _request_reference_marker in a recorded response and the
+# requestreference of each of its requests by the marker followed by the
+# index of the request, such as "$requestreference.1".
+_request_reference_marker = "$requestreference"
+_request_reference_pattern = re.compile(r"\$requestreference(?:\.([0-9]+))?")
+
+_clock = getattr(time, "perf_counter", time.time)
+
+# The response headers that describe the encoding of the body on the wire,
+# the body is saved decoded so these no longer apply to it
+_transfer_headers = ["content-encoding", "content-length", "transfer-encoding",
+                     "connection", "set-cookie"]
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, mode + "b"),
+                                encoding="utf-8")
+    return io.open(path, mode, encoding="utf-8")
+
+
+def _redact(value, fields):
+    if isinstance(value, dict):
+        return dict((key, "*" * len(item) if key in fields and
+                     isinstance(item, type("")) else _redact(item, fields))
+                    for key, item in value.items())
+    if isinstance(value, list):
+        return [_redact(item, fields) for item in value]
+    return value
+
+
+def _get_body(request):
+    body = request.body
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    return json.loads(body)
+
+
+def _get_key(envelope):
+    # The request types of a request, the replayed response of a request is
+    # always a recorded response to the same request types
+    return "|".join(",".join(request.get("requesttypedescriptions") or [])
+                    for request in envelope["request"])
+
+
+def _get_request_references(request, envelope):
+    # The requestreference of the request followed by those of each of the
+    # requests it contains. They are the same for a single request.
+    return [request.headers.get("REQUESTREFERENCE") or ""] +\
+        [request_.get("requestreference") or ""
+         for request_ in envelope["request"]]
+
+
+def _add_markers(text, request_references):
+    markers = [_request_reference_marker] +\
+        ["{0}.{1}".format(_request_reference_marker, index)
+         for index in range(len(request_references) - 1)]
+    replaced = set()
+    for request_reference, marker in zip(request_references, markers):
+        if request_reference and request_reference not in replaced:
+            replaced.add(request_reference)
+            text = text.replace(request_reference, marker)
+    return text
+
+
+def _replace_markers(text, request_references):
+    def replace(match):
+        index = match.group(1)
+        if index is None:
+            return request_references[0]
+        index = int(index) + 1
+        if index < len(request_references):
+            return request_references[index]
+        return ""
+    return _request_reference_pattern.sub(replace, text)
+
+
+def load(path):
+    """Returns the list of recordings saved in a file."""
+    with _open(path, "r") as recording_file:
+        return [json.loads(line) for line in recording_file if line.strip()]
+
+
+def get_requests(path):
+    """Returns the recorded requests, ready to process again.
+
+    The recorded traffic mix can be replayed through securetrading.Api
+with a ReplayConnectionPool to compare library versions and JSON backends.
+The requestreference of every request is removed, so that a new one is
+generated each time it is processed.
+
+    Args:
+       path: [string] The path of a file written by a
+RecordingConnectionPool.
+
+    Returns:
+       A list of dicts, the fields of each request that was recorded.
+
+    Usage:
+       >>> for request in get_requests("traffic.jsonl.gz"):
+       ...     api.process(request)
+    """
+    result = []
+    for recording in load(path):
+        requests_ = []
+        for request in recording["request"]["request"]:
+            request = dict(request)
+            request.pop("requestreference", None)
+            requests_.append(request)
+        if len(requests_) == 1:
+            result.append(requests_[0])
+        else:
+            result.append({"requests": requests_})
+    return result
+
+
+class RecordingAdapter(requests.adapters.BaseAdapter):
+    """A requests transport adapter that saves every request and response.
+
+    Requests are sent by the adapter wrapped, the request and response are
+then appended to the file as a line of JSON, gzipped if the path ends with
+.gz. The values of the redacted fields are replaced with asterisks before
+anything is written.
+
+    Args:
+       path: [string] The path of the file to append to.
+       adapter: The requests adapter that sends the requests.
+       redacted: (optional [list]) The request fields to redact, defaults
+to redacted_fields.
+    """
+
+    def __init__(self, path, adapter, redacted=None):
+        super(RecordingAdapter, self).__init__()
+        self.path = path
+        self.adapter = adapter
+        self.redacted = redacted_fields if redacted is None else redacted
+        self._lock = threading.Lock()
+        self._file = None
+
+    def send(self, request, **kwargs):
+        start = _clock()
+        response = self.adapter.send(request, **kwargs)
+        text = response.text
+        elapsed = _clock() - start
+        envelope = _get_body(request)
+        text = _add_markers(text, _get_request_references(request, envelope))
+        headers = dict((name, value) for name, value in
+                       response.headers.items()
+                       if name.lower() not in _transfer_headers)
+        recording = {"elapsed": round(elapsed, 6),
+                     "status": response.status_code,
+                     "headers": headers,
+                     "request": _redact(envelope, self.redacted),
+                     "response": text,
+                     }
+        line = json.dumps(recording, sort_keys=True, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                self._file = _open(self.path, "a")
+            self._file.write(line + "\n")
+            self._file.flush()
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.adapter.close()
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """A requests transport adapter that answers from recorded responses.
+
+    Each request is answered by the next recorded response to a request
+with the same request types, going back to the first once they have all
+been used, with the requestreferences of the request and of each request
+it contains in place of the recorded ones. Request types that were never
+recorded are answered by the next recording in the file.
+
+    Args:
+       path: [string] The path of a file written by a RecordingAdapter.
+       speed: (optional [int or float]) How many times faster than recorded
+to respond, or None to respond without any delay.
+
+    Raises:
+       AssertionError: If the speed is invalid or there are no recordings.
+    """
+
+    def __init__(self, path, speed=1):
+        super(ReplayAdapter, self).__init__()
+        msg = "A speed greater than 0 or None is required"
+        assert speed is None or speed > 0, msg
+        self.speed = speed
+        self.recordings = load(path)
+        msg = "No recordings were found in {0}".format(path)
+        assert self.recordings, msg
+        self._lock = threading.Lock()
+        self._by_key = collections.defaultdict(list)
+        for recording in self.recordings:
+            self._by_key[_get_key(recording["request"])].append(recording)
+        self._next = collections.defaultdict(int)
+
+    def _get_recording(self, key):
+        recordings = self._by_key.get(key) or self.recordings
+        with self._lock:
+            index = self._next[key]
+            self._next[key] = index + 1
+        return recordings[index % len(recordings)]
+
+    def send(self, request, **kwargs):
+        start = _clock()
+        envelope = _get_body(request)
+        recording = self._get_recording(_get_key(envelope))
+        text = _replace_markers(recording["response"],
+                                _get_request_references(request, envelope))
+        if self.speed is not None:
+            delay = recording["elapsed"] / self.speed - (_clock() - start)
+            if delay > 0:
+                time.sleep(delay)
+        response = requests.Response()
+        response.status_code = recording["status"]
+        response.headers.update(recording["headers"])
+        response._content = text.encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class RecordingConnectionPool(httpclient.HTTPConnectionPool):
+    """A connection pool that records the requests of an Api to a file.
+
+    Args:
+       config: The securetrading.Config in use.
+       path: [string] The path of the file to append to, gzipped if it ends
+with .gz.
+       redacted: (optional [list]) The request fields to redact, defaults
+to redacted_fields.
+
+    Usage:
+       >>> api.http_pool = RecordingConnectionPool(config, "traffic.jsonl")
+    """
+
+    def __init__(self, config, path, redacted=None):
+        super(RecordingConnectionPool, self).__init__(config)
+        self.path = path
+        self.redacted = redacted
+
+    def _build_session(self):
+        session = super(RecordingConnectionPool, self)._build_session()
+        adapter = RecordingAdapter(self.path, session.get_adapter("https://"),
+                                   redacted=self.redacted)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+
+class ReplayConnectionPool(httpclient.HTTPConnectionPool):
+    """A connection pool that answers the requests of an Api from a file.
+
+    Args:
+       config: The securetrading.Config in use.
+       path: [string] The path of a file written by a
+RecordingConnectionPool.
+       speed: (optional [int or float]) How many times faster than recorded
+to respond, or None to respond without any delay.
+
+    Raises:
+       AssertionError: If the speed is invalid or there are no recordings.
+
+    Usage:
+       >>> api.http_pool = ReplayConnectionPool(config, "traffic.jsonl",
+       ...                                      speed=None)
+    """
+
+    def __init__(self, config, path, speed=1):
+        super(ReplayConnectionPool, self).__init__(config)
+        self.adapter = ReplayAdapter(path, speed=speed)
+
+    def _after_fork(self):
+        super(ReplayConnectionPool, self)._after_fork()
+        self.adapter._lock = threading.Lock()
+
+    def _build_session(self):
+        session = super(ReplayConnectionPool, self)._build_session()
+        session.mount("https://", self.adapter)
+        session.mount("http://", self.adapter)
+        return session
@@ -2,6 +2,8 @@ from __future__ import unicode_literals
 from securetrading.abstractstobject import AbstractStObject
 import securetrading.util
 import binascii
+import copy
+import logging
 import base64
 
 
@@ -36,16 +38,15 @@ the fields to send.
             if met is None:
                 met = base64.decodestring
             json_cachetoken = met(cachetoken.encode("ascii"))
-            data = securetrading.util.json.loads(
+            data = securetrading.util._json_loads(
                 json_cachetoken.decode("utf-8")
                 )
             cachetoken = data["cachetoken"]
         except (ValueError, binascii.Error, KeyError):
             # Using original cachetoken value
             pass
-        debug = "{0} cachetoken being set as {1}".format(
-            self.get("requestreference"), cachetoken)
-        securetrading.util.logger.debug(debug)
+        securetrading.util._log(logging.DEBUG, self.get("requestreference"),
+                                "cachetoken being set as %s", cachetoken)
         self.__setitem__("cachetoken", cachetoken, use_set_method=False)
 
 
@@ -78,3 +79,192 @@ the incorrect location within the object.
         for request in requests:
             msg = "Invalid requests specified"
             assert isinstance(request, Request), msg
+
+
+# orjson encodes a whole request faster than the fields that were set can be
+# picked out of it, so requests made from a template are encoded in full
+_encoded_in_full = ["orjson"]
+
+
+def _copy_list(value):
+    return list(value)
+
+
+class RequestTemplate(object):
+    """The constant fields of many requests of the same shape.
+
+    The fields are validated once, when the template is created, and the
+fields whose values are strings, numbers or None are encoded once for each
+JSON backend. Each request made from the template starts with a copy of the
+fields, and sending it only encodes the fields that were added or set since,
+the constant fields are spliced into the request data already encoded. The
+fields of a template must not be changed once it is created.
+
+    Args:
+       fields: [dict] The fields that are the same in every request, such as
+the sitereference, accounttypedescription, currencyiso3a and
+requesttypedescriptions.
+
+    Raises:
+       AssertionError: If the fields include a requestreference or requests.
+       This method will raise a securetrading.ApiError during the
+automatic validation, if a value is invalid.
+
+    Usage:
+       >>> template = securetrading.RequestTemplate({
+       ...     "sitereference": "test_site12345",
+       ...     "accounttypedescription": "RECUR",
+       ...     "currencyiso3a": "GBP",
+       ...     "requesttypedescriptions": ["AUTH"]})
+       >>> request = template.new({"parenttransactionreference": "1-2-3",
+       ...                         "baseamount": "1050"})
+       >>> response = api.process(request)
+    """
+
+    def __init__(self, fields):
+        super(RequestTemplate, self).__init__()
+        for key in ["requestreference", "requests"]:
+            msg = "The {0} can not be part of a request template".format(key)
+            assert key not in fields, msg
+        request = Request()
+        del request["requestreference"]
+        request.update(fields)
+        self.fields = dict(request)
+        # Lists and dicts are copied into each request and encoded with it,
+        # so that changing them in place does not change the template.
+        self._copies = [(key, _copy_list if isinstance(value, list) and
+                         not any(isinstance(item, (list, dict))
+                                 for item in value) else copy.deepcopy)
+                        for key, value in self.fields.items()
+                        if isinstance(value, (list, dict))]
+        self._constant = dict((key, value) for key, value in
+                              self.fields.items()
+                              if not isinstance(value, (list, dict)))
+        self._constant_keys = frozenset(self._constant)
+        self._fragments = {}
+
+    def new(self, fields=None):
+        """Returns a new request made from the template.
+
+        Args:
+           fields: (optional [dict]) The fields of this request, added to or
+replacing the fields of the template.
+
+        Returns:
+           A securetrading.TemplateRequest, with a new requestreference.
+
+        Usage:
+           >>> request = template.new({"baseamount": "1050"})
+        """
+        return TemplateRequest(self, fields)
+
+    def _get_fragment(self, dumps, backend):
+        # The encoded constant fields, without the enclosing braces. They
+        # are encoded again if the JSON backend is changed.
+        fragment = self._fragments.get(backend)
+        if fragment is None:
+            fragment = dumps(self._constant)[1:-1]
+            self._fragments[backend] = fragment
+        return fragment
+
+    def _encode(self, request, dumps, backend):
+        # None if a constant field may have been set or removed, the
+        # request then has to be encoded in full.
+        changed = request._changed
+        if changed is None or not self._constant_keys.isdisjoint(changed):
+            return None
+        overlay = {key: request[key] for key in changed}
+        for key, copy_value in self._copies:
+            if key in request:
+                overlay[key] = request[key]
+        fragment = self._get_fragment(dumps, backend)
+        encoded = dumps(overlay)
+        if not fragment:
+            return encoded
+        if len(encoded) == 2:
+            # No fields were added or set
+            return encoded[:1] + fragment + encoded[1:]
+        comma = "," if isinstance(encoded, type("")) else b","
+        return encoded[:1] + fragment + comma + encoded[1:]
+
+
+class TemplateRequest(Request):
+    """A request made by securetrading.RequestTemplate.new.
+
+    It is a securetrading.Request that starts with the fields of its
+template and may be changed in the same way. The fields set since it was
+made are tracked, so that only they are encoded when it is sent.
+"""
+
+    __slots__ = ["template", "_changed"]
+
+    # update tracks the changed keys itself
+    _update_bypasses_setitem = True
+
+    def __init__(self, template, fields=None):
+        # Request.__init__ is skipped, the versioninfo is already one of
+        # the fields of the template.
+        super(Request, self).__init__()
+        self.template = template
+        self._changed = set(["requestreference"])
+        dict.update(self, template.fields)
+        for key, copy_value in template._copies:
+            dict.__setitem__(self, key, copy_value(template.fields[key]))
+        requestreference = securetrading.util._get_random(8)
+        dict.__setitem__(self, "requestreference",
+                         "A{0}".format(requestreference))
+        if fields:
+            self.update(fields)
+
+    def __reduce__(self):
+        # The default of a dict subclass sets the items before the slots,
+        # with __setitem__ tracking them in a _changed that is not yet set.
+        changed = self._changed
+        if changed is not None:
+            changed = set(changed)
+        return (_restore_template_request,
+                (type(self), self.template, dict(self), changed),
+                self.__dict__ or None)
+
+    def _mark_changed(self, keys):
+        if self._changed is not None:
+            self._changed.update(keys)
+
+    def _mark_all_changed(self, *args, **kwargs):
+        self._changed = None
+
+    def __setitem__(self, key, value, use_set_method=True):
+        super(TemplateRequest, self).__setitem__(key, value, use_set_method)
+        self._mark_changed([key])
+
+    def update(self, data):
+        super(TemplateRequest, self).update(data)
+        self._mark_changed(data)
+
+    def setdefault(self, key, default=None):
+        self._mark_changed([key])
+        return super(TemplateRequest, self).setdefault(key, default)
+
+    def __delitem__(self, key):
+        self._mark_all_changed()
+        super(TemplateRequest, self).__delitem__(key)
+
+    def pop(self, *args):
+        self._mark_all_changed()
+        return super(TemplateRequest, self).pop(*args)
+
+    def popitem(self):
+        self._mark_all_changed()
+        return super(TemplateRequest, self).popitem()
+
+    def clear(self):
+        self._mark_all_changed()
+        super(TemplateRequest, self).clear()
+
+
+def _restore_template_request(cls, template, fields, changed):
+    request = cls.__new__(cls)
+    request.template = template
+    request._changed = changed
+    dict.update(request, fields)
+    return request
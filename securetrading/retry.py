@@ -0,0 +1,112 @@
+from __future__ import unicode_literals
+import random
+import threading
+
+
+class RetryPolicy(object):
+    """The default connection retry policy.
+
+    This policy sleeps for config.http_retry_sleep between every attempt
+to connect to Trust Payments.
+
+    Usage:
+       >>> config.http_retry_policy = securetrading.RetryPolicy()
+"""
+
+    def get_sleep(self, config, attempt, previous_sleep):
+        """Returns the time in seconds to sleep before the next attempt.
+
+        Args:
+           config: The securetrading.Config in use.
+           attempt: [int] The number of failed attempts so far, from 1.
+           previous_sleep: [int or float] The previous sleep, or None before
+the first retry.
+
+        Returns:
+           The numeric sleep time in seconds.
+        """
+        return config.http_retry_sleep
+
+
+class ExponentialBackoffRetryPolicy(RetryPolicy):
+    """A retry policy with exponential backoff and optional jitter.
+
+    The sleep doubles after every failed attempt, from base up to cap
+seconds. Jitter spreads out the retries of many clients that failed at the
+same time, instead of them all retrying in lockstep.
+
+    Args:
+       base: (optional [int or float]) The first sleep in seconds.
+       cap: (optional [int or float]) The maximum sleep in seconds.
+       jitter: (optional [string]) None for no jitter, "full" for a random
+sleep between 0 and the backoff or "decorrelated" for a random sleep
+between base and three times the previous sleep.
+
+    Raises:
+       AssertionError: If the arguments are invalid.
+
+    Usage:
+       >>> config.http_retry_policy = \\
+       ...     securetrading.ExponentialBackoffRetryPolicy(0.1, 5, "full")
+"""
+
+    jitters = [None, "full", "decorrelated"]
+
+    def __init__(self, base=0.1, cap=5, jitter="full", random=random):
+        super(ExponentialBackoffRetryPolicy, self).__init__()
+        msg = "An int or float greater than 0 is required for the base and cap"
+        assert isinstance(base, (float, int)) and base > 0, msg
+        assert isinstance(cap, (float, int)) and cap >= base, msg
+        msg = "Invalid jitter. Available options: None, full, decorrelated"
+        assert jitter in self.jitters, msg
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+        self.random = random
+
+    def get_sleep(self, config, attempt, previous_sleep):
+        if self.jitter == "decorrelated":
+            previous_sleep = previous_sleep or self.base
+            return min(self.cap,
+                       self.random.uniform(self.base, previous_sleep * 3))
+        backoff = min(self.cap, self.base * 2 ** (attempt - 1))
+        if self.jitter == "full":
+            return self.random.uniform(0, backoff)
+        return backoff
+
+
+class RetryBudget(object):
+    """Limits the ratio of connection retries to requests.
+
+    Every request adds config.http_retry_budget tokens to the budget, up to
+burst tokens, and every retry spends one token. When the budget is empty
+further retries fail straight away, so that an outage does not multiply
+the load on Trust Payments. The budget starts full, allowing burst retries
+before any requests have been made.
+"""
+
+    burst = 10
+
+    def __init__(self, config):
+        super(RetryBudget, self).__init__()
+        self.config = config
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _deposit(self):
+        ratio = self.config.http_retry_budget
+        if ratio is not None:
+            with self._lock:
+                self._tokens = min(self.burst, self._tokens + ratio)
+
+    def _withdraw(self):
+        if self.config.http_retry_budget is None:
+            return True
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
@@ -0,0 +1,229 @@
+"""Local validation of requests before they are sent.
+
+A Schema checks that the fields of a request are present and well formed
+before Api.process sends it, so that a malformed request is answered with the
+same "Invalid field" error the gateway would return, without a round trip:
+
+    >>> config.request_schema = securetrading.schema.Schema()
+    >>> response = api.process({"requesttypedescriptions": ["AUTH"],
+    ...                         "sitereference": "test_site12345",
+    ...                         "baseamount": "10.50",
+    ...                         "currencyiso3a": "GBP"})
+    >>> response["responses"][0]["errordata"]
+    ['baseamount']
+"""
+from __future__ import unicode_literals
+import itertools
+import re
+import securetrading
+
+# The fields required by each request type. A tuple requires any one of its
+# fields, such as either an amount or the transaction the amount is taken
+# from. The fields of a request type that is not listed are not required.
+default_requesttypes = {
+    "ACCOUNTCHECK": ["sitereference"],
+    "AUTH": ["sitereference",
+             ("baseamount", "mainamount", "parenttransactionreference"),
+             ("currencyiso3a", "parenttransactionreference")],
+    "CACHETOKENISE": ["sitereference"],
+    "CURRENCYRATE": ["sitereference"],
+    "IDENTITYCHECK": ["sitereference"],
+    "JSINIT": ["sitereference"],
+    "ORDER": ["sitereference"],
+    "ORDERDETAILS": ["sitereference"],
+    "REFUND": ["sitereference", "parenttransactionreference"],
+    "RISKDEC": ["sitereference"],
+    "STORE": ["sitereference"],
+    "SUBSCRIPTION": ["sitereference"],
+    "THREEDLOOKUP": ["sitereference"],
+    "THREEDQUERY": ["sitereference",
+                    ("baseamount", "mainamount",
+                     "parenttransactionreference")],
+    "TRANSACTIONQUERY": ["filter"],
+    "TRANSACTIONUPDATE": ["filter", "updates"],
+    "WALLETVERIFY": ["sitereference"],
+}
+
+# The request types that may be combined in one request, in the order they
+# must be given: any two or more of them, such as ["THREEDQUERY", "AUTH"] or
+# ["ACCOUNTCHECK", "AUTH", "SUBSCRIPTION"].
+_combined_requesttypes = ["RISKDEC", "IDENTITYCHECK", "CURRENCYRATE",
+                          "ACCOUNTCHECK", "THREEDQUERY", "AUTH",
+                          "SUBSCRIPTION"]
+
+# The combinations of request types allowed in one request. A single request
+# type is always allowed.
+default_combinations = frozenset(
+    combination
+    for length in range(2, len(_combined_requesttypes) + 1)
+    for combination in itertools.combinations(_combined_requesttypes, length))
+
+# The format of each field, checked whenever the field is in a request
+default_fields = {
+    "baseamount": r"[0-9]+",
+    "mainamount": r"[0-9]+(\.[0-9]+)?",
+    "currencyiso3a": r"[A-Za-z]{3}",
+    "expirydate": r"(0[1-9]|1[0-2])/[0-9]{4}",
+    "pan": r"[0-9]{12,19}",
+    "securitycode": r"[0-9]{3,4}",
+    "sitereference": r"[A-Za-z0-9_-]+",
+    "billingcountryiso2a": r"[A-Za-z]{2}",
+    "customercountryiso2a": r"[A-Za-z]{2}",
+    "billingemail": r"[^@\s]+@[^@\s]+",
+    "customeremail": r"[^@\s]+@[^@\s]+",
+    "settleduedate": r"[0-9]{4}-[0-9]{2}-[0-9]{2}",
+}
+
+_text_type = type("")
+# A byte string is also a str on Python 2
+_string_types = (_text_type, str)
+
+
+def _compile_field(name, check):
+    if callable(check):
+        def check_field(request):
+            value = request.get(name)
+            return value is None or check(value)
+        return check_field
+    match = re.compile(r"(?:{0})\Z".format(check)).match
+
+    def check_field(request):
+        value = request.get(name)
+        if value is None:
+            return True
+        if not isinstance(value, _text_type):
+            value = "{0}".format(value)
+        return match(value) is not None
+    return check_field
+
+
+def _compile_required(required):
+    if not isinstance(required, tuple):
+        return required, lambda request: required in request
+    return required[0], lambda request: any(name in request
+                                            for name in required)
+
+
+class Schema(object):
+    """The fields required by each request type and the format of each field.
+
+    The rules are compiled into check functions once, and the checks of
+each combination of requesttypedescriptions are compiled the first time a
+request with that combination is checked.
+
+    Args:
+       requesttypes: (optional [dict]) Maps a request type to a list of the
+fields it requires, where a tuple of fields requires any one of them. The
+fields of other request types are not required. Defaults to
+default_requesttypes.
+       fields: (optional [dict]) Maps a field to the regular expression its
+whole value must match, or to a function returning whether the value is
+valid. Defaults to default_fields.
+       combinations: (optional [set]) The tuples of two or more request
+types that may be sent in one request, in order. Defaults to
+default_combinations, None allows any combination.
+
+    Usage:
+       >>> config.request_schema = securetrading.schema.Schema()
+       or
+       >>> requesttypes = dict(securetrading.schema.default_requesttypes,
+       ...                     AUTH=["sitereference", "orderreference"])
+       >>> config.request_schema = securetrading.schema.Schema(requesttypes)
+    """
+
+    def __init__(self, requesttypes=None, fields=None,
+                 combinations=default_combinations):
+        super(Schema, self).__init__()
+        if requesttypes is None:
+            requesttypes = default_requesttypes
+        if fields is None:
+            fields = default_fields
+        if combinations is not None:
+            combinations = frozenset(tuple(combination)
+                                     for combination in combinations)
+        self._combinations = combinations
+        self._required = dict((requesttype, [_compile_required(required)
+                                             for required in requireds])
+                              for requesttype, requireds in
+                              requesttypes.items())
+        self._fields = [(name, _compile_field(name, check))
+                        for name, check in sorted(fields.items())]
+        self._checks = {}
+
+    def _compile(self, requesttypes):
+        # None if the combination of request types is invalid
+        if not requesttypes or len(set(requesttypes)) != len(requesttypes) or\
+                not all(isinstance(requesttype, _string_types)
+                        for requesttype in requesttypes):
+            return None
+        if len(requesttypes) > 1 and self._combinations is not None and\
+                requesttypes not in self._combinations:
+            return None
+        checks = []
+        names = set()
+        for requesttype in requesttypes:
+            for name, check in self._required.get(requesttype, []):
+                if name not in names:
+                    names.add(name)
+                    checks.append((name, check))
+        return checks + self._fields
+
+    def _get_checks(self, requesttypes):
+        key = tuple(requesttypes)
+        try:
+            checks = self._checks.get(key)
+        except TypeError:
+            # The request types are not all strings
+            return None
+        if checks is None:
+            checks = self._compile(key)
+            if checks is not None:
+                # Invalid combinations are not stored
+                self._checks[key] = checks
+        return checks
+
+    def _check_request(self, request):
+        name = "requesttypedescriptions"
+        requesttypes = request.get(name)
+        if requesttypes is None and "requesttypedescription" in request:
+            # The legacy form of a request of a single type
+            name = "requesttypedescription"
+            requesttypes = request[name]
+            if isinstance(requesttypes, _string_types):
+                requesttypes = [requesttypes]
+            else:
+                requesttypes = None
+        checks = None
+        if isinstance(requesttypes, list):
+            checks = self._get_checks(requesttypes)
+        if checks is None:
+            return name
+        for name, check in checks:
+            if not check(request):
+                return name
+        return None
+
+    def check(self, request):
+        """Checks a request against the schema.
+
+        Each request of a securetrading.Requests object is checked in turn.
+
+        Args:
+           request: The securetrading.Request or securetrading.Requests to
+check.
+
+        Raises:
+           ApiError: With the gateway's "Invalid field" error code 30000 and
+the name of the first invalid field as its data, if the request is invalid.
+
+        Usage:
+           >>> schema.check(request)
+        """
+        if isinstance(request, securetrading.Requests):
+            requests = request.get("requests", [])
+        else:
+            requests = [request]
+        for request_ in requests:
+            name = self._check_request(request_)
+            if name is not None:
+                raise securetrading.ApiError("30000", data=[name])
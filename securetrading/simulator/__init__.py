@@ -0,0 +1,406 @@
+"""A local stand-in for the Trust Payments JSON interface.
+
+The simulator answers the requests sent by securetrading.Api with realistic
+responses, so integrations and the library itself can be load tested
+offline. Run it, or drive an Api against it, with:
+
+    python -m securetrading.simulator serve --port 8443
+    python -m securetrading.simulator load --rps 200 --duration 10
+"""
+from __future__ import unicode_literals
+import base64
+import json
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+
+_text_type = type("")
+
+try:
+    # The client went away, such as after its read timeout
+    _disconnect_errors = (BrokenPipeError, ConnectionResetError)
+except NameError:
+    # Python 2
+    _disconnect_errors = (socket.error,)
+
+# The fields returned for each request type, on top of the fields common to
+# every response. Values that start with "$" are copied from the request.
+_common_fields = {"errorcode": "0",
+                  "errormessage": "Ok",
+                  "livestatus": "0",
+                  "operatorname": "$alias",
+                  "transactionstartedtimestamp": "$timestamp",
+                  }
+
+_payment_fields = {"accounttypedescription": "$accounttypedescription",
+                   "acquirerresponsecode": "00",
+                   "authcode": "TEST22",
+                   "baseamount": "$baseamount",
+                   "currencyiso3a": "$currencyiso3a",
+                   "dccenabled": "0",
+                   "issuer": "SecureTrading Test Issuer1",
+                   "issuercountryiso2a": "US",
+                   "maskedpan": "$maskedpan",
+                   "merchantcountryiso2a": "GB",
+                   "merchantname": "Test Merchant",
+                   "paymenttypedescription": "$paymenttypedescription",
+                   "securityresponseaddress": "2",
+                   "securityresponsepostcode": "2",
+                   "securityresponsesecuritycode": "2",
+                   "settleduedate": "$settleduedate",
+                   "settlestatus": "0",
+                   "splitfinalnumber": "1",
+                   "tid": "27882788",
+                   }
+
+response_fields = {
+    "AUTH": _payment_fields,
+    "ACCOUNTCHECK": dict(_payment_fields, authcode="", baseamount="0"),
+    "REFUND": dict(_payment_fields,
+                   parenttransactionreference="$parenttransactionreference"),
+    "CURRENCYRATE": {"baseamount": "$baseamount",
+                     "currencyiso3a": "$currencyiso3a",
+                     "dccbaseamount": "$baseamount",
+                     "dcccurrencyiso3a": "$dcccurrencyiso3a",
+                     "dccconversionrate": "1.2345",
+                     "dccconversionratesource": "Test Bank",
+                     "dccmainamount": "$dccmainamount",
+                     "dccmarginratepercentage": "3.00",
+                     "dccoffered": "1",
+                     "dcctype": "DCC",
+                     },
+    "TRANSACTIONQUERY": {"found": "1",
+                         "records": [{"baseamount": "1050",
+                                      "currencyiso3a": "GBP",
+                                      "errorcode": "0",
+                                      "requesttypedescription": "AUTH",
+                                      "settlestatus": "0",
+                                      "transactionreference": "23-9-1",
+                                      }],
+                         },
+    "THREEDQUERY": {"acsurl": "https://acs.example.com/acs",
+                    "enrolled": "Y",
+                    "md": "$md",
+                    "pareq": "eJxVUmtvgjAU/SuE7zAqmznTZbhEt",
+                    "paymenttypedescription": "$paymenttypedescription",
+                    "status": "C",
+                    "threedversion": "2.2.0",
+                    },
+    "RISKDEC": {"fraudcontrolreference": "$md",
+                "fraudcontrolresponsecode": "0100",
+                "fraudcontrolshieldstatuscode": "ACCEPT",
+                },
+    "CACHETOKENISE": {"cachetoken": "$md"},
+    "SUBSCRIPTION": {"subscriptionnumber": "1",
+                     "subscriptiontype": "$subscriptiontype",
+                     },
+    "ACCOUNTUPDATE": {},
+    "TRANSACTIONUPDATE": {},
+}
+
+
+def _fixed(seconds):
+    return lambda random_: seconds
+
+
+def _get_latency(spec):
+    # Returns a function of a random.Random returning a latency in seconds
+    # from a specification such as "fixed:0.05", "uniform:0.01,0.1",
+    # "normal:0.05,0.01", "lognormal:-3,0.5" or "exponential:0.05".
+    if spec is None:
+        return _fixed(0)
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return _fixed(spec)
+    name, _, arguments = "{0}".format(spec).partition(":")
+    distributions = {"fixed": (1, lambda r, a: a[0]),
+                     "uniform": (2, lambda r, a: r.uniform(a[0], a[1])),
+                     "normal": (2, lambda r, a: r.gauss(a[0], a[1])),
+                     "lognormal": (2, lambda r, a: r.lognormvariate(a[0],
+                                                                    a[1])),
+                     "exponential": (1, lambda r, a: r.expovariate(
+                         1.0 / a[0])),
+                     }
+    msg = "A latency of fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV, \
+lognormal:MU,SIGMA or exponential:MEAN is required, not {0}".format(spec)
+    assert name in distributions, msg
+    try:
+        values = [float(value) for value in arguments.split(",")]
+    except ValueError:
+        raise AssertionError(msg)
+    count, distribution = distributions[name]
+    assert len(values) == count, msg
+    return lambda random_: max(0.0, distribution(random_, values))
+
+
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # The headers and body are written separately, so without disabling
+        # Nagle's algorithm every response waits on a delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        simulator = self.server.simulator
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        action = simulator._get_action(self.headers.get("Authorization"))
+        if action == "reset":
+            # Closing with a zero linger time sends a TCP reset
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                                       struct.pack(b"ii", 1, 0))
+            self.close_connection = True
+            self.connection.close()
+            return
+        if action == "unauthorised":
+            self._respond(401, b"Unauthorized", "text/plain")
+            return
+        try:
+            response = simulator._get_response(
+                body, self.headers.get("REQUESTREFERENCE"))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._respond(400, b"Bad Request", "text/plain")
+            return
+        time.sleep(simulator._get_delay())
+        self._respond(200, json.dumps(response).encode("utf-8"),
+                      "application/json")
+
+    def _respond(self, status_code, data, content_type):
+        accept_encoding = self.headers.get("Accept-Encoding") or ""
+        gzipped = self.server.simulator.gzip and\
+            "gzip" in accept_encoding.lower()
+        if gzipped:
+            data = _gzip(data)
+        try:
+            self.send_response(status_code)
+            self.send_header("Content-Type",
+                             "{0};charset=utf-8".format(content_type))
+            self.send_header("Content-Length", "{0}".format(len(data)))
+            if gzipped:
+                self.send_header("Content-Encoding", "gzip")
+            self.end_headers()
+            self.wfile.write(data)
+        except _disconnect_errors:
+            self.close_connection = True
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class GatewaySimulator(object):
+    """A local HTTP server that answers requests like the JSON interface.
+
+    It accepts the envelope encoded by the Api, replies to each request type
+of each request with a successful response that echoes its requestreference
+and returns a 401 status (error code 6 from the Api) when the Basic auth
+credentials are wrong. A fraction of the requests can be declined or have
+their connection reset, and the time taken to respond follows a latency
+distribution.
+
+    Args:
+       username: (optional [string]) The username required by Basic auth,
+any credentials are accepted when None.
+       password: (optional [string]) The password required by Basic auth.
+       latency: (optional) The time taken to respond as a number of seconds,
+a function of a random.Random or a specification such as "fixed:0.05",
+"uniform:0.01,0.1", "normal:0.05,0.01", "lognormal:-3,0.5" or
+"exponential:0.05".
+       reset_rate: (optional [float]) The fraction of requests whose
+connection is reset instead of answered.
+       decline_rate: (optional [float]) The fraction of payments declined
+with error code 70000.
+       gzip: (optional [bool]) Whether responses are gzipped for clients
+that accept it.
+       host: (optional [string]) The address to listen on.
+       port: (optional [int]) The port to listen on, 0 picks a free port.
+       seed: (optional) The seed of the random choices.
+
+    Usage:
+       >>> with GatewaySimulator(latency="uniform:0.01,0.05") as simulator:
+       ...     config.datacenterurl = simulator.url
+       ...     response = securetrading.Api(config).process(request)
+    """
+
+    def __init__(self, username=None, password=None, latency=None,
+                 reset_rate=0, decline_rate=0, gzip=True, host="127.0.0.1",
+                 port=0, seed=None):
+        super(GatewaySimulator, self).__init__()
+        self.username = username
+        self.password = password
+        self.latency = _get_latency(latency)
+        self.reset_rate = reset_rate
+        self.decline_rate = decline_rate
+        self.gzip = gzip
+        self.host = host
+        self.port = port
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._transaction = 0
+        self.requests = 0
+        self.resets = 0
+        self.unauthorised = 0
+
+    @property
+    def url(self):
+        """The datacenterurl of the running simulator."""
+        return "http://{0}:{1}".format(self.host, self.port)
+
+    def start(self):
+        """Starts answering requests on a background thread.
+
+        Returns:
+           The datacenterurl of the simulator.
+        """
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.simulator = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        """Stops the simulator and closes its listening socket."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def _get_action(self, authorization):
+        with self._lock:
+            self.requests += 1
+            if self.reset_rate and self._random.random() < self.reset_rate:
+                self.resets += 1
+                return "reset"
+            if not self._is_authorised(authorization):
+                self.unauthorised += 1
+                return "unauthorised"
+        return "respond"
+
+    def _is_authorised(self, authorization):
+        if self.username is None:
+            return True
+        credentials = "{0}:{1}".format(self.username, self.password or "")
+        expected = "Basic {0}".format(base64.b64encode(
+            credentials.encode("utf-8")).decode("ascii"))
+        return authorization == expected
+
+    def _get_delay(self):
+        with self._lock:
+            return self.latency(self._random)
+
+    def _next_transaction(self):
+        with self._lock:
+            self._transaction += 1
+            declined = bool(self.decline_rate) and\
+                self._random.random() < self.decline_rate
+            return self._transaction, declined
+
+    def _get_response(self, body, request_reference=None):
+        # The requestreference of the response is the one sent in the
+        # REQUESTREFERENCE header, which is the reference of the
+        # securetrading.Requests when several requests are sent together.
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        envelope = json.loads(body)
+        requests = envelope["request"]
+        if request_reference is None:
+            request_reference = requests[0].get("requestreference", "")
+        responses = []
+        for request in requests:
+            requesttypes = request.get("requesttypedescriptions") or ["AUTH"]
+            for requesttype in requesttypes:
+                responses.append(self._get_sub_response(envelope, request,
+                                                        requesttype))
+        return {"requestreference": request_reference,
+                "version": envelope["version"],
+                "secrand": "ZFz1kp9",
+                "response": responses,
+                }
+
+    def _get_sub_response(self, envelope, request, requesttype):
+        transaction, declined = self._next_transaction()
+        response = {"requestreference": request.get("requestreference", ""),
+                    "requesttypedescription": requesttype,
+                    "transactionreference": "23-9-{0}".format(transaction),
+                    }
+        if requesttype not in response_fields:
+            response.update({"errorcode": "30000",
+                             "errormessage": "Invalid field",
+                             "errordata": ["requesttypedescriptions"],
+                             })
+            return response
+        values = self._get_values(envelope, request, transaction)
+        for fields in [_common_fields, response_fields[requesttype]]:
+            for key, value in fields.items():
+                if isinstance(value, _text_type) and value.startswith("$"):
+                    value = values.get(value[1:])
+                    if value is None:
+                        continue
+                response[key] = value
+        if declined and "acquirerresponsecode" in response:
+            response.update({"errorcode": "70000",
+                             "errormessage": "Decline",
+                             "acquirerresponsecode": "05",
+                             "authcode": "",
+                             "settlestatus": "3",
+                             })
+        return response
+
+    def _get_values(self, envelope, request, transaction):
+        values = dict((key, value) for key, value in request.items()
+                      if isinstance(value, _text_type))
+        pan = request.get("pan", "4111111111111111")
+        values.update({
+            "alias": envelope.get("alias") or "",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+            "settleduedate": time.strftime("%Y-%m-%d", time.gmtime()),
+            "maskedpan": pan[:6] + "#" * (len(pan) - 10) + pan[-4:],
+            "md": "md{0:08d}".format(transaction),
+            "dcccurrencyiso3a": request.get("dcccurrencyiso3a", "USD"),
+        })
+        if "baseamount" in request:
+            try:
+                values["dccmainamount"] = "{0:.2f}".format(
+                    int(request["baseamount"]) * 1.2345 / 100)
+            except ValueError:
+                pass
+        return values
@@ -0,0 +1,117 @@
+from __future__ import print_function
+from __future__ import unicode_literals
+import argparse
+import sys
+import time
+import securetrading
+import securetrading.simulator as simulator
+import securetrading.simulator.loadgen as loadgen
+
+
+def _add_simulator_arguments(parser):
+    parser.add_argument("--username",
+                        help="The Basic auth username the simulator requires.")
+    parser.add_argument("--password",
+                        help="The Basic auth password the simulator requires.")
+    parser.add_argument("--latency",
+                        help="The response latency, e.g. fixed:0.05, "
+                        "uniform:0.01,0.1, normal:0.05,0.01, "
+                        "lognormal:-3,0.5 or exponential:0.05.")
+    parser.add_argument("--reset-rate", type=float, default=0,
+                        help="The fraction of connections to reset.")
+    parser.add_argument("--decline-rate", type=float, default=0,
+                        help="The fraction of payments to decline.")
+    parser.add_argument("--no-gzip", action="store_true",
+                        help="Never gzip the responses.")
+
+
+def _get_simulator(args, port=0):
+    return simulator.GatewaySimulator(
+        username=args.username, password=args.password,
+        latency=args.latency, reset_rate=args.reset_rate,
+        decline_rate=args.decline_rate, gzip=not args.no_gzip, port=port)
+
+
+def _get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m securetrading.simulator",
+        description="A local stand-in for the Trust Payments JSON interface.")
+    commands = parser.add_subparsers(dest="command")
+
+    serve = commands.add_parser("serve", help="Run the simulator.")
+    _add_simulator_arguments(serve)
+    serve.add_argument("--port", type=int, default=8443,
+                       help="The port to listen on.")
+
+    load = commands.add_parser(
+        "load", help="Drive an Api at a target rate and report its "
+        "throughput and latency percentiles.")
+    _add_simulator_arguments(load)
+    load.add_argument("--url",
+                      help="The datacenterurl to load, defaults to a "
+                      "simulator started for the run.")
+    load.add_argument("--rps", type=float, default=100,
+                      help="The target number of requests per second.")
+    load.add_argument("--duration", type=float, default=10,
+                      help="The number of seconds to send requests for.")
+    load.add_argument("--workers", type=int, default=64,
+                      help="The maximum number of requests in flight.")
+    load.add_argument("--requesttype", default="AUTH",
+                      help="The requesttypedescription to send.")
+    return parser
+
+
+def _load(args):
+    config = securetrading.Config()
+    config.username = args.username or "webservices@example.com"
+    config.password = args.password or "Password1^"
+    config.http_pool_maxsize = args.workers
+    running = None
+    if args.url is None:
+        running = _get_simulator(args)
+        config.datacenterurl = running.start()
+    else:
+        config.datacenterurl = args.url
+    api = securetrading.Api(config)
+    fields = {"requesttypedescriptions": [args.requesttype],
+              "accounttypedescription": "ECOM",
+              "sitereference": "test_site12345",
+              "pan": "4111111111111111",
+              "expirydate": "12/2031",
+              "securitycode": "123",
+              "paymenttypedescription": "VISA",
+              "currencyiso3a": "GBP",
+              "baseamount": "1050",
+              }
+    try:
+        report = loadgen.run_load(api, lambda: dict(fields), args.rps,
+                                  args.duration, max_workers=args.workers)
+    finally:
+        api.close()
+        if running is not None:
+            running.stop()
+    for line in loadgen.format_report(report):
+        print(line)
+    return 0
+
+
+def main(argv=None):
+    parser = _get_parser()
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        running = _get_simulator(args, port=args.port)
+        print("Simulating the gateway at {0}".format(running.start()))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            running.stop()
+        return 0
+    if args.command == "load":
+        return _load(args)
+    parser.print_help()
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+from __future__ import unicode_literals
+import math
+import threading
+import time
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+def _get_percentile(sorted_values, percentile):
+    # The nearest-rank percentile of already sorted values
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(percentile / 100.0 * len(sorted_values)))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def _summarise(values):
+    values = sorted(values)
+    summary = {"p50": _get_percentile(values, 50),
+               "p95": _get_percentile(values, 95),
+               "p99": _get_percentile(values, 99),
+               "max": values[-1] if values else None,
+               "mean": sum(values) / len(values) if values else None,
+               }
+    return summary
+
+
+def run_load(api, request_factory, rps, duration, max_workers=64):
+    """Drives an Api at a target rate and reports its throughput and latency.
+
+    Requests are started on a fixed schedule of rps requests per second
+whether or not earlier requests have completed, so a slow gateway shows up
+as higher latency rather than as a lower request rate. The latency of each
+request is measured from when it was scheduled to start, the service time
+from when a worker actually started it.
+
+    Args:
+       api: The securetrading.Api to drive.
+       request_factory: A function returning the next request to process.
+       rps: [int or float] The target number of requests per second.
+       duration: [int or float] The number of seconds to send requests for.
+       max_workers: (optional [int]) The maximum number of requests in
+flight at the same time.
+
+    Returns:
+       A dict of the number of "requests", the "elapsed" seconds, the
+"throughput" in requests per second, the "target_rps", the count of each
+non-zero errorcode in "errors" and the "p50", "p95", "p99", "max" and "mean"
+seconds of the "latency" and the "service_time".
+
+    Usage:
+       >>> report = run_load(api, lambda: {"requesttypedescriptions":
+       ...                                 ["AUTH"]}, rps=200, duration=10)
+    """
+    from concurrent import futures
+    msg = "A target rate and duration greater than 0 are required"
+    assert rps > 0 and duration > 0, msg
+    total = max(1, int(rps * duration))
+    lock = threading.Lock()
+    latencies = []
+    service_times = []
+    errors = {}
+
+    def send(scheduled):
+        started = _clock()
+        try:
+            response = api.process(request_factory())
+            errorcodes = [sub_response.get("errorcode") for sub_response in
+                          response.get("responses", [])]
+        except Exception as e:
+            errorcodes = [type(e).__name__]
+        finished = _clock()
+        with lock:
+            latencies.append(finished - scheduled)
+            service_times.append(finished - started)
+            for errorcode in errorcodes:
+                if errorcode != "0":
+                    errors[errorcode] = errors.get(errorcode, 0) + 1
+
+    executor = futures.ThreadPoolExecutor(max_workers)
+    start = _clock()
+    try:
+        for i in range(total):
+            scheduled = start + i / float(rps)
+            delay = scheduled - _clock()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, scheduled)
+    finally:
+        executor.shutdown(wait=True)
+    elapsed = _clock() - start
+    return {"requests": total,
+            "elapsed": elapsed,
+            "throughput": total / elapsed,
+            "target_rps": rps,
+            "errors": errors,
+            "latency": _summarise(latencies),
+            "service_time": _summarise(service_times),
+            }
+
+
+def format_report(report):
+    """Returns a report from run_load as a list of text lines."""
+    lines = ["requests    {0}".format(report["requests"]),
+             "elapsed     {0:.2f}s".format(report["elapsed"]),
+             "throughput  {0:.1f}/s (target {1}/s)".format(
+                 report["throughput"], report["target_rps"]),
+             ]
+    errors = report["errors"]
+    lines.append("errors      {0}".format(
+        ", ".join("{0}: {1}".format(code, errors[code])
+                  for code in sorted(errors)) or "none"))
+    for name in ["latency", "service_time"]:
+        summary = report[name]
+        lines.append("{0:<11} {1}".format(name, "  ".join(
+            "{0} {1:.1f}ms".format(key, summary[key] * 1000)
+            for key in ["p50", "p95", "p99", "max"]
+            if summary[key] is not None)))
+    return lines
@@ -0,0 +1,75 @@
+from __future__ import unicode_literals
+import threading
+import securetrading.cache as cache
+
+
+class _Call(object):
+
+    def __init__(self):
+        super(_Call, self).__init__()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight(object):
+    """Shares one in-flight call between identical concurrent requests.
+
+    The first thread to send a request whose request types are all in
+config.singleflight_requesttypes makes the call, any thread sending an
+identical request before that call completes waits for it and receives a
+copy of its response carrying its own requestreference.
+"""
+
+    def __init__(self, config):
+        super(SingleFlight, self).__init__()
+        self.config = config
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def _after_fork(self):
+        # The calls in flight belong to threads of the parent process, they
+        # never complete in the child.
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def _is_enabled(self, request):
+        enabled_types = self.config.singleflight_requesttypes
+        requesttypes = cache._get_requesttypes(request)
+        return bool(enabled_types) and requesttypes is not None and\
+            all(requesttype in enabled_types for requesttype in requesttypes)
+
+    def _do(self, key, function, request_reference, timings=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.followers += 1
+                self.shared += 1
+        if leader:
+            try:
+                call.result = function()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            if not call.followers:
+                return call.result
+            # The followers copy call.result, so the leader must not be
+            # handed the same object to modify.
+        elif timings is not None:
+            with timings._measure("single_flight"):
+                call.done.wait()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return cache._copy_response(call.result, request_reference)
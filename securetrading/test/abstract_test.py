@@ -110,3 +110,17 @@ class TestCase(unittest.TestCase):
                     six.assertRegex(self, act, exp)
             self.assertEqual(error_obj._english, expected_english)
             self.assertEqual(error_obj.code, expected_code)
+
+
+class JSONBackendTestCase(object):
+    """Mixin that runs a TestCase with a specific JSON backend."""
+
+    json_backend = None
+
+    def setUp(self):
+        super(JSONBackendTestCase, self).setUp()
+        if self.json_backend not in util.get_json_backends():
+            self.skipTest("{0} is not installed".format(self.json_backend))
+        self.original_json_backend = util.get_json_backend()
+        util.set_json_backend(self.json_backend)
+        self.addCleanup(util.set_json_backend, self.original_json_backend)
@@ -1,5 +1,8 @@
 from __future__ import unicode_literals
 from securetrading.test import abstract_test
+import logging
+import securetrading
+import securetrading.abstractstobject as abstractstobject
 import six
 
 
@@ -36,3 +39,116 @@ class Abstract_Test_StObjects(abstract_test.TestCase):
                     }
         generic_stobject.update(set_data)
         self.assertEqual(set_keys, list(set_data.keys()))
+
+    def get_hooked_class(self):
+        calls = []
+
+        class Hooked(self.class_):
+
+            def _validate_testing(self, value):
+                calls.append(("validate", value))
+                assert value != "bad", "Invalid testing"
+
+            def _set_test(self, value):
+                calls.append(("set", value))
+                self.__setitem__("test", value.upper(), use_set_method=False)
+
+        return Hooked, calls
+
+    def test___setitem___dispatch(self):
+        Hooked, calls = self.get_hooked_class()
+        tests = [("testing", "good", "good", [("validate", "good")]),
+                 ("test", "value", "VALUE", [("set", "value")]),
+                 ("other", "value", "value", []),
+                 ]
+
+        for key, value, expected, exp_calls in tests:
+            del calls[:]
+            stobject = Hooked()
+            stobject[key] = value
+            self.assertEqual(stobject[key], expected)
+            self.assertEqual(calls, exp_calls)
+        six.assertRaisesRegex(self, AssertionError, "Invalid testing",
+                              stobject.__setitem__, "testing", "bad")
+        methods, keys, fast_update = abstractstobject._get_dispatch_table(
+            Hooked)
+        self.assertEqual(keys, frozenset(methods))
+        self.assertTrue("testing" in keys and "test" in keys)
+
+    def test_update_dispatch(self):
+        Hooked, calls = self.get_hooked_class()
+        tests = [({"a": "1", "b": "2"}, {"a": "1", "b": "2"}, []),
+                 ({"a": "1", "test": "x"}, {"a": "1", "test": "X"},
+                  [("set", "x")]),
+                 ({"testing": "y"}, {"testing": "y"}, [("validate", "y")]),
+                 ]
+
+        for data, expected, exp_calls in tests:
+            del calls[:]
+            stobject = Hooked()
+            stobject.update(data)
+            for key in expected:
+                self.assertEqual(stobject[key], expected[key])
+            self.assertEqual(calls, exp_calls)
+
+    def test_update_setitem_override(self):
+        class Upper(self.class_):
+
+            def __setitem__(self, key, value, use_set_method=True):
+                if key == "currencyiso3a":
+                    value = value.upper()
+                super(Upper, self).__setitem__(key, value, use_set_method)
+
+        stobject = Upper()
+        stobject.update({"currencyiso3a": "gbp", "other": "value"})
+        self.assertEqual(stobject["currencyiso3a"], "GBP")
+        self.assertEqual(stobject["other"], "value")
+        self.assertFalse(abstractstobject._get_dispatch_table(Upper)[2])
+
+        class Bypassed(Upper):
+            _update_bypasses_setitem = True
+
+            def __setitem__(self, key, value, use_set_method=True):
+                super(Bypassed, self).__setitem__(key, value, use_set_method)
+
+        class Subclass(Bypassed):
+            pass
+
+        class Overridden(Bypassed):
+
+            def __setitem__(self, key, value, use_set_method=True):
+                super(Overridden, self).__setitem__(key, value,
+                                                    use_set_method)
+
+        tests = [(Bypassed, True),
+                 (Subclass, True),
+                 (Overridden, False),
+                 ]
+
+        for class_, exp_fast_update in tests:
+            self.assertEqual(abstractstobject._get_dispatch_table(class_)[2],
+                             exp_fast_update)
+
+    def test_update_debug(self):
+        logger = securetrading.util.logger
+        original_level = logger.level
+        records = []
+
+        class Handler(logging.Handler):
+
+            def emit(self, record):
+                records.append(record.getMessage())
+
+        handler = Handler()
+        logger.addHandler(handler)
+        try:
+            logger.setLevel(logging.DEBUG)
+            stobject = self.class_()
+            del records[:]
+            stobject.update({"key1": "value1"})
+        finally:
+            logger.setLevel(original_level)
+            logger.removeHandler(handler)
+        self.assertEqual(len(records), 1)
+        self.assertTrue(records[0].endswith("Setting key1"))
+        self.assertEqual(stobject["key1"], "value1")
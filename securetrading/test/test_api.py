@@ -3,8 +3,12 @@ from __future__ import unicode_literals
 import unittest
 from securetrading.test import abstract_test
 import securetrading
+import securetrading.schema
 import securetrading.httpclient as st_httpclient
 import json
+import os
+import threading
+import time
 
 
 class Test_Api(abstract_test.TestCase):
@@ -334,6 +338,480 @@ connect to https://somewhere.com'.format(request2["requestreference"])]
         finally:
             securetrading.httpclient.GenericHTTPClient._main = http_main
 
+    def mock_echo_main(self, delays):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.deadlines = []
+        self.clients = set()
+        lock = threading.Lock()
+
+        def _main(client, url, request_data, request_reference, request,
+                  deadline=None, profile=None, timings=None):
+            with lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                self.deadlines.append(deadline)
+                self.clients.add(client)
+            try:
+                time.sleep(delays.get(request_reference, 0))
+            finally:
+                with lock:
+                    self.in_flight -= 1
+            response = '{{"requestreference": "{0}", "version": "1.00", \
+"response": [{{"errorcode": "0"}}]}}'.format(request_reference)
+            return response, {}
+        return _main
+
+    def test_process_many(self):
+        tests = [(True, 3, {"r0": 0.1, "r1": 0.05}),
+                 (False, 3, {"r0": 0.1, "r1": 0.05}),
+                 (True, 1, {}),
+                 (False, 10, {}),
+                 ]
+
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            for ordered, max_workers, delays in tests:
+                st_httpclient.GenericHTTPClient._main = self.mock_echo_main(
+                    delays)
+                api = securetrading.Api(self.get_config())
+                references = ["r{0}".format(i) for i in range(12)]
+                requests = [{"requestreference": reference}
+                            for reference in references]
+                try:
+                    actual = list(api.process_many(requests,
+                                                   max_workers=max_workers,
+                                                   ordered=ordered))
+                finally:
+                    api.close()
+                actual_references = [response["requestreference"]
+                                     for response in actual]
+                if ordered:
+                    self.assertEqual(actual_references, references)
+                else:
+                    self.assertEqual(sorted(actual_references),
+                                     sorted(references))
+                    if delays:
+                        self.assertNotEqual(actual_references[0], "r0")
+                for response in actual:
+                    self.assertEqual(response["responses"],
+                                     [{"errorcode": "0",
+                                       "errormessage": "Ok"}])
+                self.assertTrue(self.max_in_flight <= max_workers)
+                self.assertEqual(self.deadlines, [None] * 12)
+                # Every thread shares the one HTTP client of the Api
+                self.assertEqual(self.clients, set([api.http_client]))
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+
+    def test_http_pool(self):
+        api = securetrading.Api(self.get_config())
+        self.assertTrue(isinstance(api.http_client,
+                                   st_httpclient.HTTPRequestsClient))
+        self.assertTrue(api.http_pool is api.http_client.pool)
+        pool = st_httpclient.HTTPConnectionPool(api.config)
+        api.http_pool = pool
+        self.assertTrue(api.http_client.pool is pool)
+        api.close()
+
+    def test__after_fork(self):
+        config = self.get_config()
+        config.response_cache_ttls = {"CURRENCYRATE": 60}
+        api = securetrading.Api(config)
+        session = api.http_pool._get_session()
+        api._submit(1, lambda: None).result()
+        api.response_cache._put("key", 60, {"responses": []}, 10)
+        locks = [api.http_pool._lock, api._executor_lock,
+                 api.response_cache._lock, api.single_flight._lock]
+        for lock in locks:
+            lock.acquire()
+        executor = api._executor
+        try:
+            api._after_fork()
+            self.assertEqual(api.http_pool._session, None)
+            self.assertEqual(api._executor, None)
+            self.assertTrue(api.http_pool._get_session() is not session)
+            self.assertEqual(api.response_cache._get("key", "ref"),
+                             {"requestreference": "ref", "responses": []})
+            for lock in [api.http_pool._lock, api._executor_lock,
+                         api.response_cache._lock, api.single_flight._lock]:
+                self.assertTrue(lock.acquire(False))
+                lock.release()
+        finally:
+            for lock in locks:
+                lock.release()
+            executor.shutdown()
+            session.close()
+            api.close()
+
+    @unittest.skipIf(not hasattr(os, "fork"), "os.fork is not available")
+    def test_fork(self):
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            st_httpclient.GenericHTTPClient._main = self.mock_echo_main({})
+            api = securetrading.Api(self.get_config())
+            api.process({"requestreference": "parent"})
+            session = api.http_pool._get_session()
+            reader, writer = os.pipe()
+            # As if another thread was setting a Config attribute
+            revision_lock = securetrading.config._revision_lock
+            revision_lock.acquire()
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    if api.http_pool._session is None and\
+                            not securetrading.config._revision_lock.locked():
+                        api.config.locale = "en_gb"
+                        response = api.process({"requestreference": "child"})
+                        if api.http_pool._get_session() is not session and\
+                                response["requestreference"] == "child":
+                            status = 0
+                finally:
+                    os.write(writer, "{0}".format(status).encode("ascii"))
+                    os._exit(status)
+            revision_lock.release()
+            os.close(writer)
+            result = os.read(reader, 1)
+            os.close(reader)
+            os.waitpid(pid, 0)
+            self.assertEqual(result, b"0")
+            self.assertTrue(api.http_pool._get_session() is session)
+            api.close()
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+
+    def test_process_many_timeout(self):
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            st_httpclient.GenericHTTPClient._main = self.mock_echo_main({})
+            api = securetrading.Api(self.get_config())
+            start = time.time()
+            try:
+                actual = list(api.process_many([{}, {}], timeout=5))
+            finally:
+                api.close()
+            self.assertEqual(len(actual), 2)
+            for deadline in self.deadlines:
+                self.assertTrue(start + 5 <= deadline <= time.time() + 5)
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+
+    def test_process_many_errors(self):
+        api = securetrading.Api(self.get_config())
+        try:
+            actual = list(api.process_many([[], "invalid"]))
+        finally:
+            api.close()
+        self.assertEqual([response["responses"][0]["errorcode"]
+                          for response in actual], ["10", "10"])
+        self.assertRaises(AssertionError, list,
+                          api.process_many([{}], max_workers=0))
+
+    def test__submit(self):
+        api = securetrading.Api(self.get_config())
+        try:
+            self.assertEqual(api._submit(2, sum, [1, 2]).result(), 3)
+            executor = api._executor
+            self.assertEqual(api._executor_workers, 2)
+            api._submit(1, sum, [])
+            self.assertTrue(api._executor is executor)
+            api._submit(4, sum, [])
+            self.assertTrue(api._executor is not executor)
+            self.assertEqual(api._executor_workers, 4)
+        finally:
+            api.close()
+        self.assertEqual(api._executor, None)
+
+    def test_process_circuit_breaker(self):
+        tests = [("en_gb", "Requests to Trust Payments are paused after \
+repeated connection failures"),
+                 ("fr_fr", "Les requ\xeates vers Trust Payments sont \
+suspendues apr\xe8s des \xe9checs de connexion r\xe9p\xe9t\xe9s"),
+                 ("de_de", "Anfragen an Trust Payments sind nach wiederholten \
+Verbindungsfehlern ausgesetzt"),
+                 ]
+
+        transport = st_httpclient.GenericHTTPClient._transport
+        try:
+            for locale, exp_message in tests:
+                st_httpclient.GenericHTTPClient._transport = \
+                    self.mock_method(exception=securetrading.ConnectionError(
+                        "7", data=["Failed"]))
+                config = self.get_config({"locale": locale,
+                                          "http_circuit_failure_threshold": 2,
+                                          })
+                api = securetrading.Api(config)
+                self.assertEqual(api.get_circuit_states(), {})
+                actual = [api.process({}) for i in range(3)]
+                self.assertEqual(len(self.mock_receive), 2)
+                self.assertEqual([response["responses"][0]["errorcode"]
+                                  for response in actual], ["7", "7", "11"])
+                response = actual[2]["responses"][0]
+                self.assertEqual(response["errormessage"], exp_message)
+                self.assertEqual(response["errordata"], [
+                    "{0} Circuit breaker open for \
+https://webservices.securetrading.net".format(
+                        actual[2]["requestreference"])])
+                self.assertEqual(api.get_circuit_states(), {
+                    "https://webservices.securetrading.net": "open"})
+                config.datacenterurl = "https://test.com"
+                api.process({})
+                self.assertEqual(len(self.mock_receive), 3)
+                self.assertEqual(api.get_circuit_states(), {
+                    "https://webservices.securetrading.net": "open",
+                    "https://test.com": "closed"})
+        finally:
+            st_httpclient.GenericHTTPClient._transport = transport
+
+    def test_process_cache(self):
+        tests = [(["CURRENCYRATE"], {"CURRENCYRATE": 60}, 1,
+                  {"hits": 2, "misses": 1, "entries": 1}),
+                 (["TRANSACTIONQUERY"], {"CURRENCYRATE": 60}, 3,
+                  {"hits": 0, "misses": 0, "entries": 0}),
+                 (["AUTH"], {"CURRENCYRATE": 60, "TRANSACTIONQUERY": 60}, 3,
+                  {"hits": 0, "misses": 0, "entries": 0}),
+                 (["CURRENCYRATE"], {}, 3,
+                  {"hits": 0, "misses": 0, "entries": 0}),
+                 ]
+
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            for requesttypes, ttls, exp_calls, exp_stats in tests:
+                st_httpclient.GenericHTTPClient._main = self.mock_echo_main(
+                    {})
+                config = self.get_config({"response_cache_ttls": ttls})
+                api = securetrading.Api(config)
+                references = ["r1", "r2", "r3"]
+                for reference in references:
+                    response = api.process({
+                        "requestreference": reference,
+                        "requesttypedescriptions": requesttypes,
+                        "baseamount": "100"})
+                    self.assertEqual(response["requestreference"], reference)
+                    self.assertEqual(response["responses"],
+                                     [{"errorcode": "0",
+                                       "errormessage": "Ok"}])
+                self.assertEqual(len(self.deadlines), exp_calls)
+                actual_stats = api.get_cache_stats()
+                self.assertEqual(actual_stats.pop("bytes") > 0,
+                                 exp_stats["entries"] > 0)
+                self.assertEqual(actual_stats, exp_stats)
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+
+    def test_process_single_flight(self):
+        tests = [(["TRANSACTIONQUERY"], ["TRANSACTIONQUERY"], 1),
+                 (["TRANSACTIONQUERY"], [], 4),
+                 (["AUTH"], ["TRANSACTIONQUERY"], 4),
+                 ]
+
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            for requesttypes, singleflight_types, exp_calls in tests:
+                references = ["r{0}".format(i) for i in range(4)]
+                st_httpclient.GenericHTTPClient._main = self.mock_echo_main(
+                    dict((reference, 0.2) for reference in references))
+                config = self.get_config({
+                    "singleflight_requesttypes": singleflight_types})
+                api = securetrading.Api(config)
+                requests = [{"requestreference": reference,
+                             "requesttypedescriptions": requesttypes,
+                             "transactionreference": "1-2-3"}
+                            for reference in references]
+                try:
+                    actual = list(api.process_many(requests, max_workers=4))
+                finally:
+                    api.close()
+                self.assertEqual(len(self.deadlines), exp_calls)
+                self.assertEqual([response["requestreference"]
+                                  for response in actual], references)
+                for response in actual:
+                    self.assertEqual(response["responses"],
+                                     [{"errorcode": "0",
+                                       "errormessage": "Ok"}])
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+
+    def test_process_timings(self):
+        tests = [({}, ["CURRENCYRATE"], False,
+                  ["verify", "encode", "decode", "errormessage"]),
+                 ({"response_timings": True}, ["CURRENCYRATE"], True,
+                  ["verify", "encode", "decode", "errormessage"]),
+                 ({"response_timings": True,
+                   "response_cache_ttls": {"CURRENCYRATE": 60}},
+                  ["CURRENCYRATE"], True,
+                  ["verify", "cache", "errormessage"]),
+                 ({"response_timings": True,
+                   "singleflight_requesttypes": ["CURRENCYRATE"]},
+                  ["CURRENCYRATE"], True,
+                  ["verify", "encode", "decode", "errormessage"]),
+                 ]
+
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            for config_data, requesttypes, exp_on_response, exp_phases in\
+                    tests:
+                st_httpclient.GenericHTTPClient._main = self.mock_echo_main(
+                    {})
+                api = securetrading.Api(self.get_config(config_data))
+                received = []
+
+                def failing_callback(timings):
+                    raise Exception("Callback failed")
+                api.add_timing_callback(failing_callback)
+                api.add_timing_callback(received.append)
+                request = {"requestreference": "r1",
+                           "requesttypedescriptions": requesttypes}
+                api.process(request)
+                response = api.process(request)
+                self.assertEqual(response["responses"],
+                                 [{"errorcode": "0", "errormessage": "Ok"}])
+                self.assertEqual(len(received), 2)
+                timings = received[1]
+                self.assertEqual(timings.request_reference, "r1")
+                self.assertEqual(sorted(timings.phases), sorted(exp_phases))
+                self.assertTrue(timings.total >= sum(timings.phases.values()))
+                self.assertEqual("timings" in response, exp_on_response)
+                if exp_on_response:
+                    self.assertEqual(response["timings"], timings.as_dict())
+                api.remove_timing_callback(received.append)
+                api.process(request)
+                self.assertEqual(len(received), 2)
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+
+    def test_process_metrics(self):
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            st_httpclient.GenericHTTPClient._main = self.mock_echo_main({})
+            api = securetrading.Api(self.get_config())
+            self.assertEqual(api.get_metrics(), {})
+            self.assertEqual(api.get_prometheus_metrics(), "")
+            for i in range(3):
+                api.process({"requesttypedescriptions": ["AUTH"]})
+            api.process("invalid")
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+        snapshot = api.get_metrics()
+        self.assertEqual(snapshot["securetrading_responses_total"],
+                         [{"labels": {"requesttype": "", "errorcode": "10"},
+                           "value": 1},
+                          {"labels": {"requesttype": "AUTH", "errorcode": "0"},
+                           "value": 3},
+                          ])
+        durations = snapshot["securetrading_request_duration_seconds"]
+        self.assertEqual([(sample["labels"], sample["count"])
+                          for sample in durations],
+                         [({"requesttype": "", "errorcode": "10"}, 1),
+                          ({"requesttype": "AUTH", "errorcode": "0"}, 3)])
+        self.assertTrue('securetrading_responses_total{errorcode="0",\
+requesttype="AUTH"} 3\n' in api.get_prometheus_metrics())
+
+    def test_process_hooks(self):
+        tests = [({"requesttypedescriptions": ["AUTH"]}, None,
+                  ["before_encode", "after_encode", "after_decode"]),
+                 ("invalid", None, ["on_error"]),
+                 ({"requesttypedescriptions": ["AUTH"]},
+                  securetrading.ConnectionError("7", data=["Failed"]),
+                  ["before_encode", "after_encode", "on_error"]),
+                 ({"requesttypedescriptions": ["AUTH"]},
+                  Exception("Unexpected"),
+                  ["before_encode", "after_encode", "on_error"]),
+                 ]
+
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            for request, exception, exp_events in tests:
+                if exception is None:
+                    st_httpclient.GenericHTTPClient._main = \
+                        self.mock_echo_main({})
+                else:
+                    st_httpclient.GenericHTTPClient._main = \
+                        self.mock_method(exception=exception)
+                api = securetrading.Api(self.get_config())
+                events = []
+                for event in securetrading.hooks.events:
+                    api.add_hook(event, lambda reference, timings, data,
+                                 event=event: events.append(
+                                     (event, reference, timings, data)))
+                response = api.process(request)
+                reference = response["requestreference"]
+                self.assertEqual([event[0] for event in events], exp_events)
+                for event, actual_reference, timings, data in events:
+                    self.assertEqual(actual_reference, reference)
+                    self.assertEqual(timings.request_reference, reference)
+                    if event == "after_encode":
+                        self.assertTrue(data["size"] > 0)
+                    elif event == "after_decode":
+                        self.assertTrue(data["response"] is response)
+                    elif event == "on_error":
+                        self.assertTrue(isinstance(data["exception"],
+                                                   Exception))
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+
+    def test_process_request_schema(self):
+        valid = {"requesttypedescriptions": ["AUTH"],
+                 "sitereference": "test_site12345",
+                 "baseamount": "1050",
+                 "currencyiso3a": "GBP",
+                 }
+        tests = [(None, dict(valid, baseamount="10.50"), "0", None),
+                 (securetrading.schema.Schema(), valid, "0", None),
+                 (securetrading.schema.Schema(),
+                  dict(valid, baseamount="10.50"), "30000", ["baseamount"]),
+                 (securetrading.schema.Schema(),
+                  dict(valid, requesttypedescriptions=["REFUND", "AUTH"]),
+                  "30000", ["requesttypedescriptions"]),
+                 (securetrading.schema.Schema(),
+                  {"requesttypedescription": "AUTH",
+                   "sitereference": "test_site12345", "baseamount": "1050",
+                   "currencyiso3a": "GBP"}, "0", None),
+                 ]
+
+        http_main = st_httpclient.GenericHTTPClient._main
+        try:
+            st_httpclient.GenericHTTPClient._main = self.mock_echo_main({})
+            for request_schema, request, exp_code, exp_data in tests:
+                config = self.get_config({"request_schema": request_schema})
+                api = securetrading.Api(config)
+                del self.deadlines[:]
+                response = api.process(request)
+                sub_response = response["responses"][0]
+                self.assertEqual(sub_response["errorcode"], exp_code)
+                if exp_data is None:
+                    self.assertEqual(len(self.deadlines), 1)
+                else:
+                    self.assertEqual(self.deadlines, [])
+                    self.assertEqual(sub_response["errordata"], exp_data)
+                    self.assertEqual(sub_response["errormessage"],
+                                     "Invalid field")
+                    self.assertEqual(sub_response["requesttypedescription"],
+                                     "ERROR")
+        finally:
+            st_httpclient.GenericHTTPClient._main = http_main
+
+    def test_process_timings_error(self):
+        api = securetrading.Api(self.get_config({"response_timings": True}))
+        response = api.process("invalid")
+        self.assertEqual(response["responses"][0]["errorcode"], "10")
+        self.assertEqual(sorted(response["timings"]),
+                         ["attempts", "errormessage", "total", "verify"])
+        self.assertEqual(response["timings"]["attempts"], [])
+
+    def test__get_profile(self):
+        config = self.get_config({"datacenterurl": "https://test.com"})
+        api = securetrading.Api(config)
+        profile = api._get_profile()
+        self.assertEqual(profile.url, "https://test.com/json/")
+        self.assertTrue(api._get_profile() is profile)
+        config.datacenterpath = "/other/"
+        new_profile = api._get_profile()
+        self.assertTrue(new_profile is not profile)
+        self.assertEqual(new_profile.url, "https://test.com/other/")
+        self.assertTrue(api._get_profile() is new_profile)
+
     def test__verify_request(self):
         request = securetrading.Request()
         tests = [({}, securetrading.SecureTradingError,
@@ -504,5 +982,22 @@ received (Arckthaau)",
 
             self.assertEqual(actual, exp_response)
 
+
+class Test_Api_json(abstract_test.JSONBackendTestCase, Test_Api):
+    json_backend = "json"
+
+
+class Test_Api_orjson(abstract_test.JSONBackendTestCase, Test_Api):
+    json_backend = "orjson"
+
+
+class Test_Api_rapidjson(abstract_test.JSONBackendTestCase, Test_Api):
+    json_backend = "rapidjson"
+
+
+class Test_Api_ujson(abstract_test.JSONBackendTestCase, Test_Api):
+    json_backend = "ujson"
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import asyncio
+import json
+import unittest
+import securetrading
+from securetrading.test import abstract_test
+from securetrading.test.test_asynchttpclient import MockServer
+from securetrading.test.test_asynchttpclient import http_response
+
+
+class EchoServer(MockServer):
+    """Replies to every request with a successful response that echoes the
+requestreference, after an optional delay."""
+
+    def __init__(self, delay=0):
+        super(EchoServer, self).__init__([])
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def respond(self, body):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        request = json.loads(body.decode("utf-8"))
+        reference = request["request"][0]["requestreference"]
+        return http_response(json.dumps({
+            "requestreference": reference,
+            "version": "1.00",
+            "response": [{"errorcode": "0",
+                          "requestreference": reference}]}))
+
+
+class Test_AsyncApi(abstract_test.TestCase):
+
+    def get_api(self, url, config_data=None):
+        config = securetrading.Config()
+        config.datacenterurl = url
+        config.http_retry_sleep = 0
+        for key in (config_data or {}):
+            setattr(config, key, config_data[key])
+        return securetrading.AsyncApi(config)
+
+    def test_process(self):
+        async def main():
+            server = EchoServer()
+            url = await server.start()
+            api = self.get_api(url)
+            try:
+                request = securetrading.Request()
+                request["requesttypedescriptions"] = ["AUTH"]
+                first = await api.process(request)
+                second = await api.process({"requestreference": "myref"})
+            finally:
+                await api.close()
+                await server.stop()
+            return request, first, second, server
+
+        request, first, second, server = asyncio.run(main())
+        self.assertTrue(isinstance(first, securetrading.Response))
+        self.assertEqual(first, {
+            "requestreference": request["requestreference"],
+            "version": "1.00",
+            "responses": [{"errorcode": "0", "errormessage": "Ok",
+                           "requestreference": request["requestreference"],
+                           }]})
+        self.assertEqual(second["requestreference"], "myref")
+        self.assertEqual(server.connections, 1)
+        sent = json.loads(server.requests[0][2].decode("utf-8"))
+        self.assertEqual(sent["request"][0]["requesttypedescriptions"],
+                         ["AUTH"])
+        self.assertEqual(sent["libraryversion"], self.lib_version)
+
+    def test_process_bounded_concurrency(self):
+        async def main():
+            server = EchoServer(delay=0.05)
+            url = await server.start()
+            api = self.get_api(url, {"http_pool_maxsize": 3})
+            try:
+                requests = [securetrading.Request() for i in range(12)]
+                results = await asyncio.gather(
+                    *[api.process(request) for request in requests])
+            finally:
+                await api.close()
+                await server.stop()
+            return requests, results, server
+
+        requests, results, server = asyncio.run(main())
+        for request, result in zip(requests, results):
+            self.assertEqual(result["requestreference"],
+                             request["requestreference"])
+            self.assertEqual(result["responses"][0]["errorcode"], "0")
+        self.assertEqual(server.max_in_flight, 3)
+        self.assertEqual(server.connections, 3)
+
+    def test_process_event_loops(self):
+        # One AsyncApi used by a second asyncio.run, leaving a keep-alive
+        # connection of the first event loop idle in its pool.
+        api = self.get_api("http://127.0.0.1:1/json/",
+                           {"http_pool_maxsize": 2})
+
+        async def main():
+            server = EchoServer()
+            api.config.datacenterurl = await server.start()
+            try:
+                results = await asyncio.gather(
+                    *[api.process({}) for i in range(3)])
+            finally:
+                await server.stop()
+            return results, server
+
+        for i in range(2):
+            results, server = asyncio.run(main())
+            self.assertEqual([result["responses"][0]["errorcode"]
+                              for result in results], ["0", "0", "0"])
+            self.assertEqual(server.connections, 2)
+        asyncio.run(api.close())
+
+    def test_process_many(self):
+        tests = [(None, True, 4),
+                 (2, True, 2),
+                 (2, False, 2),
+                 (10, True, 4),
+                 ]
+
+        for max_workers, ordered, exp_in_flight in tests:
+            async def main():
+                server = EchoServer(delay=0.02)
+                url = await server.start()
+                api = self.get_api(url, {"http_pool_maxsize": 4})
+                try:
+                    requests = [securetrading.Request() for i in range(8)]
+                    results = await api.process_many(
+                        requests, max_workers=max_workers, ordered=ordered,
+                        timeout=5)
+                finally:
+                    await api.close()
+                    await server.stop()
+                return requests, results, server
+
+            requests, results, server = asyncio.run(main())
+            exp_references = [request["requestreference"]
+                              for request in requests]
+            references = [result["requestreference"] for result in results]
+            if not ordered:
+                references.sort()
+                exp_references.sort()
+            self.assertEqual(references, exp_references)
+            for result in results:
+                self.assertEqual(result["responses"][0]["errorcode"], "0")
+            self.assertEqual(server.max_in_flight, exp_in_flight)
+
+    def test_process_many_errors(self):
+        api = self.get_api("https://localhost:1")
+        actual = asyncio.run(api.process_many([[], "invalid"]))
+        self.assertEqual([result["responses"][0]["errorcode"]
+                          for result in actual], ["10", "10"])
+        self.assertRaises(AssertionError, asyncio.run,
+                          api.process_many([{}], max_workers=0))
+
+    def test_process_single_flight(self):
+        tests = [(["TRANSACTIONQUERY"], ["TRANSACTIONQUERY"], 1, 3),
+                 (["TRANSACTIONQUERY"], [], 4, 0),
+                 (["AUTH"], ["TRANSACTIONQUERY"], 4, 0),
+                 ]
+
+        for requesttypes, singleflight_types, exp_sent, exp_shared in tests:
+            async def main():
+                server = EchoServer(delay=0.05)
+                url = await server.start()
+                api = self.get_api(url, {
+                    "singleflight_requesttypes": singleflight_types})
+                try:
+                    requests = [{"requestreference": "r{0}".format(i),
+                                 "requesttypedescriptions": requesttypes,
+                                 "transactionreference": "1-2-3"}
+                                for i in range(4)]
+                    results = await api.process_many(requests)
+                finally:
+                    await api.close()
+                    await server.stop()
+                return results, server, api
+
+            results, server, api = asyncio.run(main())
+            self.assertEqual(len(server.requests), exp_sent)
+            self.assertEqual(api.single_flight.shared, exp_shared)
+            self.assertEqual([result["requestreference"]
+                              for result in results],
+                             ["r0", "r1", "r2", "r3"])
+            for result in results:
+                self.assertEqual(result["responses"][0]["errorcode"], "0")
+                self.assertEqual(result["responses"][0]["requestreference"],
+                                 result["requestreference"])
+            self.assertEqual(len(set(id(result) for result in results)), 4)
+            self.assertEqual(api.single_flight._calls, {})
+
+    def test_single_flight_errors(self):
+        error = securetrading.ConnectionError("7", data=["Failed"])
+
+        async def function():
+            await asyncio.sleep(0.02)
+            raise error
+
+        async def main():
+            single_flight = securetrading.asyncapi.AsyncSingleFlight(
+                securetrading.Config())
+            calls = [asyncio.ensure_future(single_flight._do(
+                "key", function, "r{0}".format(i))) for i in range(3)]
+            await asyncio.sleep(0)
+            # A cancelled follower does not cancel the shared call
+            calls[1].cancel()
+            results = await asyncio.gather(*calls, return_exceptions=True)
+            return single_flight, results
+
+        single_flight, results = asyncio.run(main())
+        self.assertEqual(results[0], error)
+        self.assertTrue(isinstance(results[1], asyncio.CancelledError))
+        self.assertEqual(results[2], error)
+        self.assertEqual(single_flight.shared, 2)
+        self.assertEqual(single_flight._calls, {})
+
+    def test_process_timings(self):
+        async def main():
+            server = EchoServer()
+            url = await server.start()
+            api = self.get_api(url, {"response_timings": True})
+            received = []
+            api.add_timing_callback(received.append)
+            try:
+                result = await api.process({"requestreference": "myref"})
+            finally:
+                await api.close()
+                await server.stop()
+            return url, result, received
+
+        url, result, received = asyncio.run(main())
+        self.assertEqual(len(received), 1)
+        self.assertEqual(result["timings"], received[0].as_dict())
+        self.assertEqual(sorted(received[0].phases),
+                         ["connect", "decode", "encode", "errormessage",
+                          "send_receive", "verify"])
+        self.assertEqual([(attempt["url"], attempt["error"], attempt["status"])
+                          for attempt in received[0].attempts],
+                         [(url, None, 200)])
+
+    def test_process_errors(self):
+        request = securetrading.Request()
+        reference = request["requestreference"]
+        tests = [([], [], "10", ["Incorrect type of request specified"],
+                  "Incorrect usage of the Trust Payments API"),
+                 (request, [http_response("{Invalid")], "5", [".+"],
+                  "Receive error"),
+                 (request, [http_response(
+                     '{"requestreference": "other", "version": "1.00", \
+"response": []}')], "9", ["Different request reference: sent \\({0}\\) \
+received \\(other\\)".format(reference)],
+                  "Unknown error. If this persists please contact Trust \
+Payments"),
+                 (request, [http_response("", status="401 Unauthorized")],
+                  "6", ["HTTP code 401"], "Invalid credentials provided"),
+                 ]
+
+        for request, responses, exp_code, exp_data, exp_message in tests:
+            async def main():
+                server = MockServer(responses)
+                url = await server.start()
+                api = self.get_api(url)
+                try:
+                    return await api.process(request)
+                finally:
+                    await api.close()
+                    await server.stop()
+
+            actual = asyncio.run(main())["responses"][0]
+            self.assertEqual(actual["errorcode"], exp_code)
+            self.assertEqual(actual["errormessage"], exp_message)
+            self.assertEqual(actual["requesttypedescription"], "ERROR")
+            self.assertEqual(len(actual["errordata"]), len(exp_data))
+            for act, exp in zip(actual["errordata"], exp_data):
+                self.assertRegex(act, exp)
+
+    def test_process_connect_error(self):
+        api = self.get_api("http://127.0.0.1:1", {"http_max_retries": 1})
+        actual = asyncio.run(api.process(securetrading.Request()))
+        self.assertEqual(actual["responses"][0]["errorcode"], "7")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import asyncio
+import gzip
+import unittest
+import securetrading
+import securetrading.asynchttpclient as asynchttpclient
+from securetrading import ConnectionError
+from securetrading import SendReceiveError
+from securetrading.test import abstract_test
+
+
+class MockServer(object):
+    """A local HTTP/1.1 server that replies with canned responses."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.connections = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return "http://127.0.0.1:{0}/json/".format(port)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, value = line.decode("latin-1").split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(
+                    int(headers["content-length"]))
+                self.requests.append((request_line, headers, body))
+                response = await self.respond(body)
+                if response is None:
+                    break
+                writer.write(response)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def respond(self, body):
+        return self.responses.pop(0)
+
+
+def http_response(body, status="200 OK", headers=None):
+    if not isinstance(body, bytes):
+        body = body.encode("utf-8")
+    lines = ["HTTP/1.1 {0}".format(status),
+             "Content-Type: application/json;charset=utf-8",
+             ]
+    for name, value in (headers or {"Content-Length": len(body)}).items():
+        lines.append("{0}: {1}".format(name, value))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class Test_AsyncHTTPClient(abstract_test.TestCase):
+
+    def get_client(self, config_data=None):
+        config = securetrading.Config()
+        config.username = "user"
+        config.password = "pass"
+        config.http_retry_sleep = 0
+        config.http_response_headers = ["content-type"]
+        for key in (config_data or {}):
+            setattr(config, key, config_data[key])
+        pool = asynchttpclient.AsyncHTTPConnectionPool(config)
+        return asynchttpclient.AsyncHTTPClient(config, pool=pool)
+
+    def test__main(self):
+        chunked = b"4\r\n{\"a\"\r\n4\r\n: 1}\r\n0\r\n\r\n"
+        gzipped = gzip.compress(b'{"a": 2}')
+        tests = [(http_response('{"a": 0}'), '{"a": 0}',
+                  {"Content-Type": "application/json;charset=utf-8"}),
+                 (http_response(chunked, headers={
+                     "Transfer-Encoding": "chunked"}), '{"a": 1}',
+                  {"Content-Type": "application/json;charset=utf-8"}),
+                 (http_response(gzipped, headers={
+                     "Content-Encoding": "gzip",
+                     "Content-Length": len(gzipped)}), '{"a": 2}',
+                  {"Content-Type": "application/json;charset=utf-8"}),
+                 ]
+
+        for response, exp_response, exp_headers in tests:
+            async def main():
+                server = MockServer([response])
+                url = await server.start()
+                client = self.get_client()
+                try:
+                    result = await client._main(url, '{"request": 1}',
+                                                "request_reference", None)
+                finally:
+                    await client.pool._close()
+                    await server.stop()
+                return result, server.requests
+
+            (actual, actual_headers), requests = run(main())
+            self.assertEqual(actual, exp_response)
+            self.assertEqual(actual_headers, exp_headers)
+            request_line, headers, body = requests[0]
+            self.assertEqual(request_line, b"POST /json/ HTTP/1.1\r\n")
+            self.assertEqual(body, b'{"request": 1}')
+            self.assertEqual(headers["authorization"], "Basic dXNlcjpwYXNz")
+            self.assertEqual(headers["requestreference"], "request_reference")
+            self.assertEqual(headers["connection"], "keep-alive")
+
+    def test__main_invalid_header(self):
+        tests = [("A1\r\nX-Evil: 1", "requestreference"),
+                 ("A1\nX-Evil: 1", "requestreference"),
+                 ("A1\x00", "requestreference"),
+                 (" A1", "requestreference"),
+                 ("A1\u20ac", "requestreference"),
+                 ]
+
+        for request_reference, exp_header in tests:
+            async def main():
+                server = MockServer([http_response("{}")])
+                url = await server.start()
+                client = self.get_client()
+                try:
+                    return await client._main(url, "{}", request_reference,
+                                              None)
+                finally:
+                    await client.pool._close()
+                    await server.stop()
+
+            with self.assertRaises(ConnectionError) as cm:
+                run(main())
+            self.assertEqual(cm.exception.code, "7")
+            self.assertTrue(cm.exception.data[0].lower().endswith(exp_header))
+
+    def test__main_reuses_connections(self):
+        async def main():
+            server = MockServer([http_response("1"), http_response("2"),
+                                 http_response("3")])
+            url = await server.start()
+            client = self.get_client()
+            try:
+                results = []
+                for i in range(3):
+                    response, headers = await client._main(
+                        url, "{}", "request_reference", None)
+                    results.append(response)
+            finally:
+                await client.pool._close()
+                await server.stop()
+            return results, server.connections
+
+        results, connections = run(main())
+        self.assertEqual(results, ["1", "2", "3"])
+        self.assertEqual(connections, 1)
+
+    def test__main_stale_connection(self):
+        async def main():
+            # The server drops the connection instead of the second reply
+            server = MockServer([http_response("1"), None,
+                                 http_response("2")])
+            url = await server.start()
+            client = self.get_client()
+            try:
+                first, headers = await client._main(
+                    url, "{}", "request_reference", None)
+                second, headers = await client._main(
+                    url, "{}", "request_reference", None)
+            finally:
+                await client.pool._close()
+                await server.stop()
+            return first, second, server.connections
+
+        self.assertEqual(run(main()), ("1", "2", 2))
+
+    def test__main_errors(self):
+        tests = [(http_response("Unauthorized", status="401 Unauthorized"),
+                  ConnectionError, ["HTTP code 401"], "6 HTTP code 401", "6"),
+                 (http_response("Error", status="500 Server Error"),
+                  ConnectionError, ["HTTP code 500"], "8 HTTP code 500", "8"),
+                 (b"Not HTTP\r\n\r\n", SendReceiveError, [".+"], None, "4"),
+                 ]
+
+        for response, exp_exception, exp_data, exp_english, exp_code in tests:
+            async def main():
+                server = MockServer([response])
+                url = await server.start()
+                client = self.get_client()
+                try:
+                    await client._main(url, "{}", "request_reference", None)
+                finally:
+                    await client.pool._close()
+                    await server.stop()
+
+            with self.assertRaises(exp_exception) as cm:
+                run(main())
+            self.assertEqual(cm.exception.code, exp_code)
+            if exp_english is not None:
+                self.check_error(cm.exception, exp_data, exp_code,
+                                 exp_english)
+
+    def test__main_connect_retries(self):
+        tests = [({"http_max_retries": 2}, "7 request_reference Maximum \
+number of attempts reached whilst trying to connect to \
+http://127.0.0.1:1/json/"),
+                 ({"http_max_allowed_connection_time": 0}, "7 \
+request_reference Maximum time reached whilst trying to connect to \
+http://127.0.0.1:1/json/"),
+                 ]
+
+        for config_data, exp_english in tests:
+            client = self.get_client(config_data)
+            with self.assertRaises(ConnectionError) as cm:
+                run(client._main("http://127.0.0.1:1/json/", "{}",
+                                 "request_reference", None))
+            self.assertEqual(cm.exception.code, "7")
+            self.assertEqual(cm.exception.__str__(), exp_english)
+
+    def test__main_proxy(self):
+        client = self.get_client({"http_proxy": {"https": "https://1.1.1.1"}})
+        self.check_st_exception(securetrading.ApiError,
+                                ["http_proxy is not supported by the \
+asynchronous transport"],
+                                "10 http_proxy is not supported by the \
+asynchronous transport", "10", run,
+                                func_args=(client._main(
+                                    "http://127.0.0.1:1/json/", "{}",
+                                    "request_reference", None),))
+
+    def test__main_circuit_breaker(self):
+        client = self.get_client({"http_max_retries": 0,
+                                  "http_circuit_failure_threshold": 1,
+                                  "datacenterurl": "http://127.0.0.1:1"})
+        client.circuit_breakers = \
+            securetrading.circuitbreaker.CircuitBreakers(client.config)
+        for exp_code in ["7", "11"]:
+            with self.assertRaises(ConnectionError) as cm:
+                run(client._main("http://127.0.0.1:1/json/", "{}",
+                                 "request_reference", None))
+            self.assertEqual(cm.exception.code, exp_code)
+        self.assertEqual(client.circuit_breakers._get_states(),
+                         {"http://127.0.0.1:1": "open"})
+
+    def test__main_failover(self):
+        async def main():
+            server = MockServer([http_response("1")])
+            url = await server.start()
+            client = self.get_client({"datacenterurls": [
+                "http://127.0.0.1:1", url.replace("/json/", "")]})
+            profile = securetrading.profile.TransportProfile(client.config)
+            client.latencies = securetrading.endpoint.EndpointLatencies()
+            try:
+                result = await client._main(profile.url, "{}",
+                                            "request_reference", None,
+                                            profile=profile)
+            finally:
+                await client.pool._close()
+                await server.stop()
+            return result, server.requests, url, client.latencies
+
+        (response, headers), requests, url, latencies = run(main())
+        self.assertEqual(response, "1")
+        self.assertEqual(requests[0][1]["host"], url.split("/")[2])
+        self.assertEqual(sorted(latencies._get_latencies()),
+                         ["http://127.0.0.1:1", url.replace("/json/", "")])
+
+    def test__main_retry_budget(self):
+        client = self.get_client({"http_retry_budget": 0.1})
+        client.retry_budget = securetrading.retry.RetryBudget(client.config)
+        client.retry_budget._tokens = 1
+        with self.assertRaises(ConnectionError) as cm:
+            run(client._main("http://127.0.0.1:1/json/", "{}",
+                             "request_reference", None))
+        self.assertEqual(cm.exception.__str__(), "7 request_reference Retry \
+budget exhausted whilst trying to connect to http://127.0.0.1:1/json/")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import six
+import securetrading
+import securetrading.benchmark as benchmark
+import securetrading.simulator as simulator
+from securetrading.benchmark import __main__ as benchmark_main
+from securetrading.test import abstract_test
+
+
+class Test_benchmark(abstract_test.TestCase):
+
+    def get_results(self, seconds):
+        return {"results": dict((name, {"seconds": value, "number": 1})
+                                for name, value in seconds.items())}
+
+    def test_benchmarks(self):
+        for name in benchmark.benchmarks:
+            function = benchmark.benchmarks[name]()
+            function()
+
+    def test_api_process(self):
+        response = benchmark.benchmarks["api_process"]()()
+        self.assertEqual(response["responses"][0]["errorcode"], "0")
+        self.assertEqual(response["responses"][0]["requesttypedescription"],
+                         "AUTH")
+
+    def test_run(self):
+        results = benchmark.run(["get_random", "phrasebook_lookup"],
+                                repeat=2, min_time=0.001)
+        self.assertEqual(list(results["results"]),
+                         ["get_random", "phrasebook_lookup"])
+        for result in results["results"].values():
+            self.assertTrue(result["seconds"] > 0)
+            self.assertTrue(result["number"] >= 1)
+        self.assertEqual(results["version"], securetrading.__version__)
+        exp_message = "Unknown benchmark missing, available benchmarks: \
+request_init, get_random"
+        six.assertRaisesRegex(self, AssertionError, exp_message,
+                              benchmark.run, ["missing"])
+
+    def test_compare(self):
+        tests = [(1.0, 1.05, 0.1, "ok"),
+                 (1.0, 1.2, 0.1, "regression"),
+                 (1.0, 1.2, 0.25, "ok"),
+                 (1.0, 0.8, 0.1, "improvement"),
+                 (1.0, None, 0.1, "missing"),
+                 (None, 1.0, 0.1, "new"),
+                 ]
+
+        for before, after, threshold, expected in tests:
+            baseline = self.get_results({} if before is None else
+                                        {"a": before})
+            current = self.get_results({} if after is None else
+                                       {"a": after})
+            self.assertEqual(benchmark.compare(baseline, current, threshold),
+                             [("a", before, after, expected)])
+
+    def test_format_comparison(self):
+        comparison = [("a", 0.002, 0.001, "improvement"),
+                      ("b", None, 2e-07, "new")]
+        self.assertEqual(benchmark.format_comparison(comparison), [
+            "benchmark              baseline    current   change  status",
+            "a                        2.00ms     1.00ms   -50.0%  \
+improvement",
+            "b                             -      200ns        -  new",
+        ])
+
+    def test_main_compare(self):
+        directory = tempfile.mkdtemp()
+        try:
+            baseline_path = os.path.join(directory, "baseline.json")
+            current_path = os.path.join(directory, "current.json")
+            benchmark.save(self.get_results({"a": 1.0}), baseline_path)
+            tests = [(1.05, [], 0),
+                     (1.5, [], 1),
+                     (1.5, ["--threshold", "0.6"], 0),
+                     ]
+
+            for seconds, extra_args, exp_status in tests:
+                benchmark.save(self.get_results({"a": seconds}),
+                               current_path)
+                self.assertEqual(benchmark.load(current_path),
+                                 self.get_results({"a": seconds}))
+                stdout = six.StringIO()
+                original_stdout = sys.stdout
+                try:
+                    sys.stdout = stdout
+                    status = benchmark_main.main(
+                        ["compare", baseline_path, current_path] +
+                        extra_args)
+                finally:
+                    sys.stdout = original_stdout
+                self.assertEqual(status, exp_status)
+                self.assertTrue(stdout.getvalue().startswith("benchmark"))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_scaling(self):
+        with simulator.GatewaySimulator() as running:
+            tests = [(None, "memory"),
+                     (running.url, running.url),
+                     ]
+
+            for url, exp_transport in tests:
+                results = benchmark.scaling([1, 2], duration=0.05, url=url)
+                self.assertEqual(results["transport"], exp_transport)
+                self.assertTrue(results["gil"] in ["enabled", "disabled"])
+                self.assertEqual([result["threads"] for result in
+                                  results["results"]], [1, 2])
+                self.assertEqual(results["results"][0]["speedup"], 1.0)
+                for result in results["results"]:
+                    self.assertTrue(result["requests"] > 0)
+                    self.assertTrue(result["throughput"] > 0)
+        self.assertTrue(running.requests > 0)
+
+    def test_format_scaling(self):
+        results = {"python": "3.13.1", "implementation": "CPython",
+                   "gil": "disabled", "cpus": 8, "transport": "memory",
+                   "results": [{"threads": 1, "requests": 1000,
+                                "throughput": 500.0, "speedup": 1.0},
+                               {"threads": 4, "requests": 3800,
+                                "throughput": 1900.0, "speedup": 3.8}]}
+        self.assertEqual(benchmark.format_scaling(results), [
+            "Python 3.13.1 CPython, GIL disabled, 8 CPUs, memory transport",
+            " threads   requests   requests/s  speedup",
+            "       1       1000        500.0    1.00x",
+            "       4       3800       1900.0    3.80x",
+        ])
+
+    def test_main_scaling(self):
+        stdout = six.StringIO()
+        original_stdout = sys.stdout
+        try:
+            sys.stdout = stdout
+            status = benchmark_main.main(["scaling", "--threads", "1",
+                                          "--duration", "0.05"])
+        finally:
+            sys.stdout = original_stdout
+        self.assertEqual(status, 0)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 3)
+
+    def test_import_time(self):
+        results = benchmark.import_time(repeat=1)
+        self.assertEqual([result["name"] for result in results["results"]],
+                         ["import", "request", "api"])
+        for result in results["results"]:
+            self.assertTrue(result["seconds"] > 0)
+        modules = dict((result["name"], result["modules"])
+                       for result in results["results"])
+        self.assertTrue(modules["import"] < modules["api"])
+
+        exp_message = "Unknown statement unknown, available statements: \
+import, request, api"
+        six.assertRaisesRegex(self, AssertionError, exp_message,
+                              benchmark.import_time, ["unknown"])
+
+    def test_format_import_time(self):
+        results = {"python": "3.12.1", "implementation": "CPython",
+                   "version": "1.0.25",
+                   "results": [{"name": "import",
+                                "statement": "import securetrading",
+                                "seconds": 0.0125, "modules": 40}]}
+        self.assertEqual(benchmark.format_import_time(results), [
+            "Python 3.12.1 CPython, securetrading 1.0.25",
+            "name             time  modules  statement",
+            "import        12.50ms       40  import securetrading",
+        ])
+
+    def test_main_import_time(self):
+        stdout = six.StringIO()
+        original_stdout = sys.stdout
+        try:
+            sys.stdout = stdout
+            status = benchmark_main.main(["import-time", "import",
+                                          "--repeat", "1"])
+        finally:
+            sys.stdout = original_stdout
+        self.assertEqual(status, 0)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 3)
+
+    def test_baseline(self):
+        baseline = benchmark.load(benchmark.baseline_path)
+        self.assertEqual(sorted(baseline["results"]),
+                         sorted(benchmark.benchmarks))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import unittest
+import securetrading
+from securetrading.cache import ResponseCache
+from securetrading.profile import TransportProfile
+from securetrading.test import abstract_test
+
+
+class Test_ResponseCache(abstract_test.TestCase):
+
+    def get_cache(self, config_data=None):
+        config = securetrading.Config()
+        config.response_cache_ttls = {"CURRENCYRATE": 60,
+                                      "TRANSACTIONQUERY": 10}
+        for key in (config_data or {}):
+            setattr(config, key, config_data[key])
+        return ResponseCache(config)
+
+    def get_response(self, requestreference="A1", errorcode="0"):
+        response = securetrading.Response()
+        response.update({"requestreference": requestreference,
+                         "version": "1.00",
+                         "responses": [{"requestreference": requestreference,
+                                        "errorcode": errorcode,
+                                        }],
+                         })
+        return response
+
+    def test__get_ttl(self):
+        currencyrate = {"requesttypedescriptions": ["CURRENCYRATE"]}
+        query = {"requesttypedescriptions": ["TRANSACTIONQUERY"]}
+        auth = {"requesttypedescriptions": ["AUTH"]}
+        tests = [(currencyrate, {}, 60),
+                 (query, {}, 10),
+                 ({"requesttypedescriptions": ["CURRENCYRATE",
+                                               "TRANSACTIONQUERY"]}, {}, 10),
+                 (auth, {}, None),
+                 ({"requesttypedescriptions": ["CURRENCYRATE", "AUTH"]}, {},
+                  None),
+                 ({}, {}, None),
+                 ({"requesttypedescriptions": []}, {}, None),
+                 ({"requests": [currencyrate, query]}, {}, 10),
+                 ({"requests": [currencyrate, auth]}, {}, None),
+                 (currencyrate, {"response_cache_ttls": {}}, None),
+                 (query, {"response_cache_ttls": {"CURRENCYRATE": 5}}, None),
+                 ]
+
+        for request, config_data, expected in tests:
+            cache = self.get_cache(config_data)
+            self.assertEqual(cache._get_ttl(request), expected)
+
+    def test__get_key(self):
+        cache = self.get_cache()
+        profile = TransportProfile(cache.config)
+        request1 = securetrading.Request()
+        request1.update({"requesttypedescriptions": ["CURRENCYRATE"],
+                         "baseamount": "100"})
+        request2 = securetrading.Request()
+        request2.update({"baseamount": "100",
+                         "requesttypedescriptions": ["CURRENCYRATE"]})
+        request3 = securetrading.Request()
+        request3.update({"requesttypedescriptions": ["CURRENCYRATE"],
+                         "baseamount": "200"})
+        key = cache._get_key(request1, profile)
+        self.assertNotEqual(request1["requestreference"],
+                            request2["requestreference"])
+        self.assertEqual(cache._get_key(request2, profile), key)
+        self.assertNotEqual(cache._get_key(request3, profile), key)
+        self.assertFalse(request1["requestreference"] in key)
+        requests = securetrading.Requests()
+        requests.update({"requests": [request1]})
+        self.assertEqual(cache._get_key(requests, profile), key)
+        cache.config.username = "other"
+        self.assertNotEqual(cache._get_key(request1, profile), key)
+
+    def test__get(self):
+        cache = self.get_cache()
+        self.assertEqual(cache._get("key", "A2"), None)
+        cache._put("key", 60, self.get_response(), 10)
+        actual = cache._get("key", "A2")
+        self.assertEqual(actual, self.get_response("A2"))
+        self.assertTrue(isinstance(actual, securetrading.Response))
+        actual["responses"][0]["errorcode"] = "changed"
+        self.assertEqual(cache._get("key", "A3"), self.get_response("A3"))
+        self.assertEqual(cache._get_stats(), {"hits": 2, "misses": 1,
+                                              "entries": 1, "bytes": 10})
+
+    def test__get_expired(self):
+        cache = self.get_cache()
+        cache._put("key", 60, self.get_response(), 10)
+        cache._entries["key"].expires -= 60
+        self.assertEqual(cache._get("key", "A2"), None)
+        self.assertEqual(cache._get_stats(), {"hits": 0, "misses": 1,
+                                              "entries": 0, "bytes": 0})
+
+    def test__put(self):
+        cache = self.get_cache()
+        response = self.get_response()
+        cache._put("key", 60, response, 10)
+        response["responses"][0]["errorcode"] = "changed"
+        self.assertEqual(cache._get("key", "A1"), self.get_response())
+        cache._put("key", 60, self.get_response(), 20)
+        self.assertEqual(cache._get_stats()["bytes"], 20)
+        cache._put("error", 60, self.get_response(errorcode="30000"), 10)
+        self.assertEqual(cache._get("error", "A1"), None)
+
+    def test__put_eviction(self):
+        tests = [({"response_cache_max_entries": 2}, [10, 10, 10],
+                  ["key1", "key2"]),
+                 ({"response_cache_max_bytes": 25}, [10, 10, 10],
+                  ["key1", "key2"]),
+                 ({"response_cache_max_bytes": 25}, [10, 10, 20],
+                  ["key2"]),
+                 ({"response_cache_max_bytes": 25}, [10, 10, 30],
+                  ["key0", "key1"]),
+                 ]
+
+        for config_data, sizes, expected in tests:
+            cache = self.get_cache(config_data)
+            for i, size in enumerate(sizes):
+                cache._put("key{0}".format(i), 60, self.get_response(), size)
+            self.assertEqual(list(cache._entries), expected)
+            self.assertEqual(cache._bytes,
+                             sum(cache._entries[key].size
+                                 for key in expected))
+
+    def test__put_lru(self):
+        cache = self.get_cache({"response_cache_max_entries": 2})
+        cache._put("key0", 60, self.get_response(), 10)
+        cache._put("key1", 60, self.get_response(), 10)
+        cache._get("key0", "A1")
+        cache._put("key2", 60, self.get_response(), 10)
+        self.assertEqual(list(cache._entries), ["key0", "key2"])
+
+    def test__clear(self):
+        cache = self.get_cache()
+        cache._put("key", 60, self.get_response(), 10)
+        cache._clear()
+        self.assertEqual(cache._get_stats(), {"hits": 0, "misses": 0,
+                                              "entries": 0, "bytes": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
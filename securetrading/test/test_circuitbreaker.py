@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import unittest
+import securetrading
+from securetrading.circuitbreaker import CircuitBreaker
+from securetrading.circuitbreaker import CircuitBreakers
+from securetrading.test import abstract_test
+
+
+class Test_CircuitBreaker(abstract_test.TestCase):
+
+    def get_breaker(self, threshold=2, reset_timeout=30, probes=1):
+        config = securetrading.Config()
+        config.http_circuit_failure_threshold = threshold
+        config.http_circuit_reset_timeout = reset_timeout
+        config.http_circuit_half_open_probes = probes
+        return CircuitBreaker(config, "https://test.com")
+
+    def check_rejected(self, breaker, exp_state):
+        exp_data = ["ref Circuit breaker {0} for https://test.com".format(
+            exp_state)]
+        self.check_st_exception(securetrading.ConnectionError, exp_data,
+                                "11 {0}".format(exp_data[0]), "11",
+                                breaker._before_request, func_args=("ref",))
+
+    def test_state(self):
+        breaker = self.get_breaker()
+        self.assertEqual(breaker.state, "closed")
+        breaker._record_failure()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.failures, 1)
+        breaker._record_failure()
+        self.assertEqual(breaker.state, "open")
+        breaker._opened_at -= 30
+        self.assertEqual(breaker.state, "half-open")
+        breaker._record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.failures, 0)
+
+    def test__before_request(self):
+        breaker = self.get_breaker(probes=2)
+        breaker._before_request("ref")
+        breaker._record_failure()
+        breaker._before_request("ref")
+        breaker._record_failure()
+        self.check_rejected(breaker, "open")
+        breaker._opened_at -= 30
+        breaker._before_request("ref")
+        breaker._before_request("ref")
+        self.check_rejected(breaker, "half-open")
+        # A failed probe opens the breaker again
+        breaker._record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.check_rejected(breaker, "open")
+        breaker._opened_at -= 30
+        breaker._before_request("ref")
+        breaker._record_success()
+        for i in range(5):
+            breaker._before_request("ref")
+
+    def test__before_request_disabled(self):
+        breaker = self.get_breaker(threshold=None)
+        for i in range(10):
+            breaker._before_request("ref")
+            breaker._record_failure()
+        self.assertEqual(breaker.state, "closed")
+
+    def test__release_probe(self):
+        breaker = self.get_breaker()
+        breaker._record_failure()
+        breaker._record_failure()
+        breaker._opened_at -= 30
+        breaker._before_request("ref")
+        self.check_rejected(breaker, "half-open")
+        breaker._release_probe()
+        breaker._before_request("ref")
+        breaker._release_probe()
+        breaker._release_probe()
+        self.assertEqual(breaker._probes, 0)
+
+
+class Test_CircuitBreakers(abstract_test.TestCase):
+
+    def test__get(self):
+        config = securetrading.Config()
+        breakers = CircuitBreakers(config)
+        breaker = breakers._get("https://a.com")
+        self.assertTrue(breakers._get("https://a.com") is breaker)
+        self.assertTrue(breaker.config is config)
+        self.assertEqual(breaker.datacenterurl, "https://a.com")
+        self.assertTrue(breakers._get("https://b.com") is not breaker)
+
+    def test__get_states(self):
+        config = securetrading.Config()
+        config.http_circuit_failure_threshold = 1
+        breakers = CircuitBreakers(config)
+        self.assertEqual(breakers._get_states(), {})
+        breakers._get("https://a.com")._record_failure()
+        breakers._get("https://b.com")
+        self.assertEqual(breakers._get_states(), {"https://a.com": "open",
+                                                  "https://b.com": "closed"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,6 +24,8 @@ class Test_CodeFormat(abstract_test.TestCase):
             base_path = self.get_package_path()
 
             test_cases = ["",
+                          "benchmark",
+                          "simulator",
                           "test",
                           ]
 
@@ -1,13 +1,39 @@
 #!/usr/bin/env python
 from __future__ import unicode_literals
+import threading
 import unittest
 from securetrading.test import abstract_test
 import securetrading
+import securetrading.schema
 import six
 
 
 class Test_Config(abstract_test.TestCase):
 
+    def test__revision(self):
+        config = securetrading.Config()
+        revision = config._revision
+        config.username = "user"
+        self.assertEqual(config._revision, revision + 1)
+        config.http_pool_maxsize = 2
+        config.locale = "fr_fr"
+        self.assertEqual(config._revision, revision + 3)
+        self.assertRaises(AssertionError, setattr, config, "locale", "BAD")
+        self.assertEqual(config._revision, revision + 3)
+
+    def test__revision_threads(self):
+        config = securetrading.Config()
+        revision = config._revision
+        threads = [threading.Thread(target=lambda i=i: [
+            setattr(config, "username", "user{0}".format(i))
+            for j in range(200)]) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Every change has a revision of its own
+        self.assertEqual(config._revision, revision + 8 * 200)
+
     def test_http_proxy(self):
         config = securetrading.Config()
         self.assertEqual(None, config.http_proxy)
@@ -149,6 +175,343 @@ class Test_Config(abstract_test.TestCase):
                                       "http_retry_sleep",
                                       sleep_value)
 
+    def test_http_circuit_failure_threshold(self):
+        config = securetrading.Config()
+        self.assertEqual(None, config.http_circuit_failure_threshold)
+        exp_message = "An int greater than 0 or None is required for the \
+failure threshold"
+        tests = [("5", AssertionError),
+                 (0, AssertionError),
+                 (2.5, AssertionError),
+                 (1, None),
+                 (None, None),
+                 ]
+
+        for value, exp_exception in tests:
+            if exp_exception is None:
+                config.http_circuit_failure_threshold = value
+                self.assertEqual(value, config.http_circuit_failure_threshold)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "http_circuit_failure_threshold",
+                                      value)
+
+    def test_http_circuit_reset_timeout(self):
+        config = securetrading.Config()
+        self.assertEqual(30, config.http_circuit_reset_timeout)
+        exp_message = "An int or float is required for the reset timeout"
+        tests = [("30", AssertionError),
+                 (None, AssertionError),
+                 (0, None),
+                 (2.5, None),
+                 ]
+
+        for value, exp_exception in tests:
+            if exp_exception is None:
+                config.http_circuit_reset_timeout = value
+                self.assertEqual(value, config.http_circuit_reset_timeout)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "http_circuit_reset_timeout",
+                                      value)
+
+    def test_http_circuit_half_open_probes(self):
+        config = securetrading.Config()
+        self.assertEqual(1, config.http_circuit_half_open_probes)
+        exp_message = "An int greater than 0 is required for the half-open \
+probes"
+        tests = [("1", AssertionError),
+                 (0, AssertionError),
+                 (1.5, AssertionError),
+                 (3, None),
+                 ]
+
+        for value, exp_exception in tests:
+            if exp_exception is None:
+                config.http_circuit_half_open_probes = value
+                self.assertEqual(value, config.http_circuit_half_open_probes)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "http_circuit_half_open_probes",
+                                      value)
+
+    def test_http_prefer_low_latency(self):
+        config = securetrading.Config()
+        self.assertEqual(False, config.http_prefer_low_latency)
+        exp_message = "A bool is required to prefer the lowest latency"
+        tests = [("True", AssertionError),
+                 (1, AssertionError),
+                 (None, AssertionError),
+                 (True, None),
+                 (False, None),
+                 ]
+
+        for prefer_value, exp_exception in tests:
+            if exp_exception is None:
+                config.http_prefer_low_latency = prefer_value
+                self.assertEqual(prefer_value, config.http_prefer_low_latency)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "http_prefer_low_latency",
+                                      prefer_value)
+
+    def test_http_pool_maxsize(self):
+        config = securetrading.Config()
+        self.assertEqual(10, config.http_pool_maxsize)
+        exp_message = "An int greater than 0 is required for the pool size"
+        tests = [("10", AssertionError),
+                 ([10], AssertionError),
+                 (0, AssertionError),
+                 (2.5, AssertionError),
+                 (1, None),
+                 (50, None),
+                 ]
+
+        for pool_value, exp_exception in tests:
+            if exp_exception is None:
+                config.http_pool_maxsize = pool_value
+                self.assertEqual(pool_value, config.http_pool_maxsize)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "http_pool_maxsize",
+                                      pool_value)
+
+    def test_http_pool_idle_timeout(self):
+        config = securetrading.Config()
+        self.assertEqual(30, config.http_pool_idle_timeout)
+        exp_message = "An int, float or None is required for the idle timeout"
+        tests = [("10", AssertionError),
+                 ([10], AssertionError),
+                 (10, None),
+                 (2.5, None),
+                 (None, None),
+                 ]
+
+        for timeout_value, exp_exception in tests:
+            if exp_exception is None:
+                config.http_pool_idle_timeout = timeout_value
+                self.assertEqual(timeout_value, config.http_pool_idle_timeout)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "http_pool_idle_timeout",
+                                      timeout_value)
+
+    def test_http_retry_policy(self):
+        config = securetrading.Config()
+        self.assertTrue(type(config.http_retry_policy) is
+                        securetrading.RetryPolicy)
+        exp_message = "A securetrading.RetryPolicy is required for the retry \
+policy"
+        backoff_policy = securetrading.ExponentialBackoffRetryPolicy()
+        tests = [("full", AssertionError),
+                 (None, AssertionError),
+                 (securetrading.RetryPolicy(), None),
+                 (backoff_policy, None),
+                 ]
+
+        for policy_value, exp_exception in tests:
+            if exp_exception is None:
+                config.http_retry_policy = policy_value
+                self.assertEqual(policy_value, config.http_retry_policy)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "http_retry_policy",
+                                      policy_value)
+
+    def test_http_retry_budget(self):
+        config = securetrading.Config()
+        self.assertEqual(None, config.http_retry_budget)
+        exp_message = "An int or float greater than 0 or None is required \
+for the retry budget"
+        tests = [("0.1", AssertionError),
+                 (0, AssertionError),
+                 (-0.1, AssertionError),
+                 (0.1, None),
+                 (1, None),
+                 (None, None),
+                 ]
+
+        for budget_value, exp_exception in tests:
+            if exp_exception is None:
+                config.http_retry_budget = budget_value
+                self.assertEqual(budget_value, config.http_retry_budget)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "http_retry_budget",
+                                      budget_value)
+
+    def test_response_cache_ttls(self):
+        config = securetrading.Config()
+        self.assertEqual({}, config.response_cache_ttls)
+        exp_message = "A dict of cacheable request types \\(CURRENCYRATE, \
+TRANSACTIONQUERY\\) to an int or float greater than 0 is required for the \
+cache ttls"
+        tests = [([("CURRENCYRATE", 10)], AssertionError),
+                 ({"AUTH": 10}, AssertionError),
+                 ({"CURRENCYRATE": "10"}, AssertionError),
+                 ({"CURRENCYRATE": 0}, AssertionError),
+                 ({"CURRENCYRATE": 10}, None),
+                 ({"CURRENCYRATE": 10, "TRANSACTIONQUERY": 2.5}, None),
+                 ({}, None),
+                 ]
+
+        for ttls_value, exp_exception in tests:
+            if exp_exception is None:
+                config.response_cache_ttls = ttls_value
+                self.assertEqual(ttls_value, config.response_cache_ttls)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "response_cache_ttls",
+                                      ttls_value)
+
+    def test_response_cache_max_entries(self):
+        config = securetrading.Config()
+        self.assertEqual(1000, config.response_cache_max_entries)
+        exp_message = "An int greater than 0 is required for the maximum \
+entries"
+        tests = [("10", AssertionError),
+                 (0, AssertionError),
+                 (None, AssertionError),
+                 (10, None),
+                 ]
+
+        for entries_value, exp_exception in tests:
+            if exp_exception is None:
+                config.response_cache_max_entries = entries_value
+                self.assertEqual(entries_value,
+                                 config.response_cache_max_entries)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "response_cache_max_entries",
+                                      entries_value)
+
+    def test_response_cache_max_bytes(self):
+        config = securetrading.Config()
+        self.assertEqual(None, config.response_cache_max_bytes)
+        exp_message = "An int greater than 0 or None is required for the \
+maximum bytes"
+        tests = [("10", AssertionError),
+                 (0, AssertionError),
+                 (1.5, AssertionError),
+                 (1024, None),
+                 (None, None),
+                 ]
+
+        for bytes_value, exp_exception in tests:
+            if exp_exception is None:
+                config.response_cache_max_bytes = bytes_value
+                self.assertEqual(bytes_value, config.response_cache_max_bytes)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "response_cache_max_bytes",
+                                      bytes_value)
+
+    def test_singleflight_requesttypes(self):
+        config = securetrading.Config()
+        self.assertEqual([], config.singleflight_requesttypes)
+        exp_message = "A list of cacheable request types \\(CURRENCYRATE, \
+TRANSACTIONQUERY\\) is required for the single-flight request types"
+        tests = [("CURRENCYRATE", AssertionError),
+                 (["AUTH"], AssertionError),
+                 (["CURRENCYRATE", "REFUND"], AssertionError),
+                 (["CURRENCYRATE"], None),
+                 (["CURRENCYRATE", "TRANSACTIONQUERY"], None),
+                 ([], None),
+                 ]
+
+        for types_value, exp_exception in tests:
+            if exp_exception is None:
+                config.singleflight_requesttypes = types_value
+                self.assertEqual(types_value,
+                                 config.singleflight_requesttypes)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "singleflight_requesttypes",
+                                      types_value)
+
+    def test_response_timings(self):
+        config = securetrading.Config()
+        self.assertEqual(False, config.response_timings)
+        exp_message = "A bool is required to return the response timings"
+        tests = [("True", AssertionError),
+                 (1, AssertionError),
+                 (None, AssertionError),
+                 (True, None),
+                 (False, None),
+                 ]
+
+        for timings_value, exp_exception in tests:
+            if exp_exception is None:
+                config.response_timings = timings_value
+                self.assertEqual(timings_value, config.response_timings)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "response_timings",
+                                      timings_value)
+
+    def test_request_schema(self):
+        config = securetrading.Config()
+        self.assertEqual(None, config.request_schema)
+        exp_message = "A securetrading.schema.Schema or None is required for \
+the request schema"
+        request_schema = securetrading.schema.Schema()
+        tests = [(True, AssertionError),
+                 ({}, AssertionError),
+                 (request_schema, None),
+                 (None, None),
+                 ]
+
+        for schema_value, exp_exception in tests:
+            if exp_exception is None:
+                config.request_schema = schema_value
+                self.assertEqual(schema_value, config.request_schema)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "request_schema",
+                                      schema_value)
+
     def test_http_response_headers(self):
         config = securetrading.Config()
         self.assertEqual([], config.http_response_headers)
@@ -194,6 +557,36 @@ header is returned"
             config.datacenterurl = set_value
             self.assertEqual(exp_value, config.datacenterurl)
 
+    def test_datacenterurls(self):
+        config = securetrading.Config()
+        self.assertEqual(None, config.datacenterurls)
+        exp_message = "A non-empty list of strings or None is required for \
+the data center URLs"
+        tests = [("https://a.com", AssertionError),
+                 ([], AssertionError),
+                 (["https://a.com", 3], AssertionError),
+                 (("https://a.com",), AssertionError),
+                 (["https://a.com"], None),
+                 (["https://a.com", "https://b.com"], None),
+                 (None, None),
+                 ]
+
+        for urls_value, exp_exception in tests:
+            if exp_exception is None:
+                config.datacenterurls = urls_value
+                self.assertEqual(urls_value, config.datacenterurls)
+            else:
+                six.assertRaisesRegex(self, exp_exception,
+                                      exp_message,
+                                      setattr,
+                                      config,
+                                      "datacenterurls",
+                                      urls_value)
+        urls = ["https://a.com"]
+        config.datacenterurls = urls
+        urls.append("https://b.com")
+        self.assertEqual(["https://a.com"], config.datacenterurls)
+
     def test_datacenterpath(self):
         config = securetrading.Config()
         self.assertEqual("/json/",
@@ -153,6 +153,69 @@ encoding failed"
                                         _encode,
                                         func_args=(request_object,))
 
+    def test__encode_template(self):
+        template = securetrading.RequestTemplate({
+            "sitereference": "test_site12345",
+            "requesttypedescriptions": ["AUTH"],
+        })
+        requests = securetrading.Requests()
+        requests["requests"] = [template.new({"baseamount": "1050"}),
+                                self.get_securetrading_request({"a": "b"}),
+                                template.new()]
+        original_backend = securetrading.util.get_json_backend()
+        try:
+            for backend in securetrading.util.get_json_backends():
+                securetrading.util.set_json_backend(backend)
+                for config_data in [None, {"username": "other@testing.com",
+                                           "password": "testingpassword",
+                                           "jsonversion": "2.00",
+                                           "http_response_headers": [],
+                                           "acceptcustomeroutput": "2.00"}]:
+                    converter = self.get_converter(config_data)
+                    for request_object in [requests["requests"][0], requests]:
+                        expected = json.loads(securetrading.util._json_dumps(
+                            {"alias": converter.config.username,
+                             "version": converter.config.jsonversion,
+                             "libraryversion": self.lib_version,
+                             "request": requests["requests"]}))
+                        if config_data is not None:
+                            expected["acceptcustomeroutput"] = "2.00"
+                        if request_object is not requests:
+                            expected["request"] = expected["request"][:1]
+                        encoded = converter._encode(request_object)
+                        if isinstance(encoded, bytes):
+                            encoded = encoded.decode("utf-8")
+                        self.assertEqual(json.loads(encoded), expected)
+        finally:
+            securetrading.util.set_json_backend(original_backend)
+
+    def test__encode_unsupported(self):
+        tests = [({"a": "b"}, {"a": "b"}, None),
+                 ({1: "b"}, {"1": "b"}, None),
+                 ({"a": 2 ** 70}, {"a": 2 ** 70}, None),
+                 ({"a": -2 ** 64}, {"a": -2 ** 64}, None),
+                 ({"a": "b".encode("utf-8")}, None,
+                  ["All types should be specified in unicode"]),
+                 ({1: "b".encode("utf-8")}, None,
+                  ["All types should be specified in unicode"]),
+                 ]
+
+        converter = self.get_converter()
+        for fields, exp_fields, exp_data in tests:
+            request = self.get_securetrading_request(fields)
+            if exp_data is not None:
+                self.check_st_exception(securetrading.ApiError, exp_data,
+                                        "10 " + exp_data[0], "10",
+                                        converter._encode,
+                                        func_args=(request,))
+                continue
+            encoded = converter._encode(request)
+            if isinstance(encoded, bytes):
+                encoded = encoded.decode("utf-8")
+            actual = json.loads(encoded)["request"][0]
+            for key, value in exp_fields.items():
+                self.assertEqual(actual[key], value)
+
     def test__decode(self):
         auth_json = """{"requestreference": "Ahc6uwqq6",
                                       "version": "1.00",
@@ -434,5 +497,23 @@ transactions",
                                         func_args=(json_str, headers_dict,
                                                    request_reference))
 
+
+class Test_Converter_json(abstract_test.JSONBackendTestCase, Test_Converter):
+    json_backend = "json"
+
+
+class Test_Converter_orjson(abstract_test.JSONBackendTestCase, Test_Converter):
+    json_backend = "orjson"
+
+
+class Test_Converter_rapidjson(abstract_test.JSONBackendTestCase,
+                               Test_Converter):
+    json_backend = "rapidjson"
+
+
+class Test_Converter_ujson(abstract_test.JSONBackendTestCase, Test_Converter):
+    json_backend = "ujson"
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import unittest
+from securetrading.endpoint import Endpoint
+from securetrading.endpoint import EndpointLatencies
+from securetrading.test import abstract_test
+
+
+class Test_EndpointLatencies(abstract_test.TestCase):
+
+    def test__record(self):
+        latencies = EndpointLatencies()
+        self.assertEqual(latencies._get_latencies(), {})
+        latencies._record("https://a.com", 1.0)
+        latencies._record("https://b.com", 0.5)
+        self.assertEqual(latencies._get_latencies(), {"https://a.com": 1.0,
+                                                      "https://b.com": 0.5})
+        latencies._record("https://a.com", 2.0)
+        latencies._record("https://a.com", 2.0)
+        self.assertEqual(round(latencies._get_latencies()["https://a.com"], 2),
+                         1.51)
+
+    def test__sort(self):
+        tests = [({}, ["a", "b", "c"]),
+                 ({"a": 1, "b": 1, "c": 1}, ["a", "b", "c"]),
+                 ({"a": 3, "b": 2, "c": 1}, ["c", "b", "a"]),
+                 ({"a": 3, "b": 2}, ["c", "b", "a"]),
+                 ({"a": 0.1, "c": 0.2}, ["b", "a", "c"]),
+                 ]
+
+        for measurements, expected in tests:
+            latencies = EndpointLatencies()
+            for datacenterurl in measurements:
+                latencies._record(datacenterurl, measurements[datacenterurl])
+            endpoints = [Endpoint(name, name + "/json/")
+                         for name in ["a", "b", "c"]]
+            actual = latencies._sort(endpoints)
+            self.assertEqual([endpoint.datacenterurl for endpoint in actual],
+                             expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
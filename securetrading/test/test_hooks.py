@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import unittest
+import six
+import securetrading
+from securetrading.hooks import Hooks
+from securetrading.test import abstract_test
+
+
+class Test_Hooks(abstract_test.TestCase):
+
+    def test__add(self):
+        hooks = Hooks()
+        calls = []
+
+        def hook(request_reference, timings, data):
+            calls.append((request_reference, timings, data))
+
+        hooks._add("before_encode", hook)
+        hooks._add("before_encode", hook)
+        hooks._add("on_error", hook)
+        self.assertEqual(hooks._hooks, {"before_encode": (hook, hook),
+                                        "on_error": (hook,)})
+        exp_message = "The hook event must be one of before_encode, \
+after_encode, before_attempt, after_attempt, after_decode, on_error"
+        six.assertRaisesRegex(self, AssertionError, exp_message, hooks._add,
+                              "before_process", hook)
+
+    def test__remove(self):
+        hooks = Hooks()
+        first = []
+        second = []
+        hooks._add("after_decode", first.append)
+        hooks._add("after_decode", second.append)
+        hooks._remove("after_decode", first.append)
+        self.assertEqual(hooks._hooks, {"after_decode": (second.append,)})
+        hooks._remove("after_decode", second.append)
+        self.assertEqual(hooks._hooks, {})
+        self.assertRaises(ValueError, hooks._remove, "after_decode",
+                          second.append)
+
+    def test__call(self):
+        hooks = Hooks()
+        calls = []
+        timings = securetrading.Timings("A1")
+
+        def failing_hook(request_reference, timings, data):
+            raise Exception("Hook failed")
+
+        def hook(request_reference, timings, data):
+            calls.append((request_reference, timings, data))
+
+        hooks._call("after_encode", "A1", timings, {"size": 10})
+        hooks._add("after_encode", failing_hook)
+        hooks._add("after_encode", hook)
+        hooks._call("after_encode", "A1", timings, {"size": 10})
+        hooks._call("before_encode", "A1", timings, {})
+        self.assertEqual(calls, [("A1", timings, {"size": 10})])
+
+
+if __name__ == "__main__":
+    unittest.main()
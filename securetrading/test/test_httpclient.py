@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 import sys
 import unittest
 import securetrading
+import securetrading.profile
 from securetrading import ConnectionError
 from securetrading import SendReceiveError
 from securetrading.test import abstract_test
@@ -57,19 +58,22 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
     def test__get_client(self):
         original_requests = securetrading.httpclient.requests
         config = securetrading.Config()
-        request_reference = self.uni
         httpclient = securetrading.httpclient
 
         try:
             securetrading.httpclient.requests = True
-            client = httpclient._get_client(request_reference, config)
+            client = httpclient._get_client(config)
             self.assertTrue(isinstance(client,
                                        httpclient.HTTPRequestsClient))
+            self.assertEqual(client.pool, None)
+
+            pool = httpclient.HTTPConnectionPool(config)
+            client = httpclient._get_client(config, pool=pool)
+            self.assertEqual(client.pool, pool)
 
             securetrading.httpclient.requests = False
             self.assertRaises(securetrading.SecureTradingError,
                               httpclient._get_client,
-                              request_reference,
                               config)
         finally:
             securetrading.httpclient.requests = original_requests
@@ -78,16 +82,17 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
         self.assertRaises(NotImplementedError, self.http_client._close)
 
     def test__receive(self):
-        self.assertRaises(NotImplementedError, self.http_client._receive)
+        self.assertRaises(NotImplementedError, self.http_client._receive,
+                          None)
 
     def test__get_response_headers(self):
         self.assertRaises(NotImplementedError,
-                          self.http_client._get_response_headers)
+                          self.http_client._get_response_headers, None)
 
     def test__send(self):
-        args = ("https://www.securetrading.com",
+        args = (securetrading.httpclient._Call("request_reference"),
+                "https://www.securetrading.com",
                 {"request": "data"},
-                "request_reference",
                 )
 
         self.assertRaises(NotImplementedError, self.http_client._send, *args)
@@ -115,7 +120,7 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
                                 "REQUESTREFERENCE": "abc",
                                 "User-Agent": expected_agent_string,
                                 "VERSIONINFO": "v1",
-                                'Connection': 'close',
+                                'Connection': 'keep-alive',
                                 }
                   ),
                  ("123456789", "v2", {"Content-Type": content_type,
@@ -124,7 +129,7 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
                                       "REQUESTREFERENCE": "123456789",
                                       "User-Agent": expected_agent_string,
                                       "VERSIONINFO": "v2",
-                                      'Connection': 'close',
+                                      'Connection': 'keep-alive',
                                       }
                   ),
                  ("abcd12345", "v3", {"Content-Type": content_type,
@@ -133,7 +138,7 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
                                       "REQUESTREFERENCE": "abcd12345",
                                       "User-Agent": expected_agent_string,
                                       "VERSIONINFO": "v3",
-                                      'Connection': 'close',
+                                      'Connection': 'keep-alive',
                                       }
                   ),
                  (self.uni, "v4", {"Content-Type": content_type,
@@ -142,7 +147,7 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
                                    "REQUESTREFERENCE": self.uni,
                                    "User-Agent": expected_agent_string,
                                    "VERSIONINFO": "v4",
-                                   'Connection': 'close',
+                                   'Connection': 'keep-alive',
                                    }
                   ),
                  ]
@@ -156,6 +161,18 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
             # Rest for other tests
             securetrading.version_info = tmp
 
+    def test__get_headers_profile(self):
+        config = securetrading.Config()
+        profile = securetrading.profile.TransportProfile(config)
+        client = self.client(config)
+        expected = client._get_static_headers()
+        expected["REQUESTREFERENCE"] = "ref1"
+        self.assertEqual(client._get_headers("ref1", profile), expected)
+        expected["REQUESTREFERENCE"] = "ref2"
+        self.assertEqual(client._get_headers("ref2", profile), expected)
+        # The cached headers are not modified
+        self.assertFalse("REQUESTREFERENCE" in profile._get_headers(client))
+
     @unittest.skip("Placeholder method")
     def test__verify_response(self):
         pass  # Code is overriden by some child classes
@@ -203,6 +220,164 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
             six.assertRegex(self, "{0}".format(connection_time),
                             expected_connection_time)
 
+    def test__get_connection_time_out_deadline(self):
+        config = securetrading.Config()
+        config.http_max_allowed_connection_time = 10
+        config.http_connect_timeout = 5
+        tests = [(None, False, "5"),
+                 (20, False, "5"),
+                 (2, False, "[12].\\d+"),
+                 (-1, True, "-[01].\\d+"),
+                 ]
+
+        for deadline, expected_timed_out, expected_connection_time in tests:
+            if deadline is not None:
+                deadline += time.time()
+            client = self.client(config)
+            (timed_out, connection_time) = client._get_connection_time_out(
+                time.time(), deadline)
+            self.assertEqual(timed_out, expected_timed_out)
+            six.assertRegex(self, "{0}".format(connection_time),
+                            expected_connection_time)
+
+    def test__get_read_time_out(self):
+        config = securetrading.Config()
+        config.http_receive_timeout = 60
+        tests = [(None, "60"),
+                 (120, "60"),
+                 (2, "[12].\\d+"),
+                 (-1, "0.001"),
+                 ]
+
+        for deadline, expected in tests:
+            if deadline is not None:
+                deadline += time.time()
+            client = self.client(config)
+            six.assertRegex(self, "{0}".format(
+                client._get_read_time_out(deadline)), expected)
+
+    def test__get_retry_sleep(self):
+        tests = [(0.5, 10, 0, None, "0.5"),
+                 (0.5, 10, 9.8, None, "0.[12]"),
+                 (0.5, 10, 11, None, "0"),
+                 (0.5, 10, 0, 0.2, "0.[01]"),
+                 ]
+
+        for retry_sleep, max_time, elapsed, deadline, expected in tests:
+            config = securetrading.Config()
+            config.http_retry_sleep = retry_sleep
+            config.http_max_allowed_connection_time = max_time
+            if deadline is not None:
+                deadline += time.time()
+            client = self.client(config)
+            actual = client._get_retry_sleep(time.time() - elapsed, 1, None,
+                                             deadline)
+            six.assertRegex(self, "{0}".format(actual), expected)
+
+    def test__get_retry_sleep_policy(self):
+        config = securetrading.Config()
+        config.http_retry_policy = \
+            securetrading.ExponentialBackoffRetryPolicy(1, 8, None)
+        client = self.client(config)
+        start_time = time.time()
+        actual = [client._get_retry_sleep(start_time, attempt, None)
+                  for attempt in range(1, 6)]
+        self.assertEqual(actual, [1, 2, 4, 8, 8])
+
+    def test__verify_retry_budget(self):
+        config = securetrading.Config()
+        config.http_max_retries = 2
+        budget = securetrading.retry.RetryBudget(config)
+        client = self.client(config, retry_budget=budget)
+        budget._tokens = 1
+        # No budget is spent while retries are disabled or exceeded.
+        client._verify_retry_budget("url", "ref", 1)
+        config.http_retry_budget = 0.5
+        client._verify_retry_budget("url", "ref", 3)
+        self.assertEqual(budget._tokens, 1)
+        client._verify_retry_budget("url", "ref", 1)
+        self.assertEqual(budget._tokens, 0)
+        self.check_st_exception(ConnectionError,
+                                ["ref Retry budget exhausted whilst trying \
+to connect to url"],
+                                "7 ref Retry budget exhausted whilst trying \
+to connect to url", "7", client._verify_retry_budget,
+                                func_args=("url", "ref", 1))
+        client._record_request()
+        client._record_request()
+        client._verify_retry_budget("url", "ref", 2)
+
+    def test__main_circuit_breaker(self):
+        tests = [(None, "closed", 0),
+                 (ConnectionError("7"), "open", 1),
+                 (ConnectionError("8"), "open", 1),
+                 (SendReceiveError("4"), "open", 1),
+                 (ConnectionError("6"), "closed", 0),
+                 (securetrading.ApiError("10"), "closed", 0),
+                 (KeyboardInterrupt(), "half-open", 1),
+                 ]
+
+        for exception, exp_state, exp_failures in tests:
+            config = securetrading.Config()
+            config.http_circuit_failure_threshold = 2
+            config.datacenterurl = "https://test.com"
+            breakers = securetrading.circuitbreaker.CircuitBreakers(config)
+            breaker = breakers._get("https://test.com")
+            breaker._record_failure()
+            breaker._record_failure()
+            breaker._opened_at -= config.http_circuit_reset_timeout
+            client = self.client(config, circuit_breakers=breakers)
+            client._transport = self.mock_method(
+                result=("response", {}), exception=exception)
+            if exception is None:
+                self.assertEqual(client._main("url", "data", "ref", None),
+                                 ("response", {}))
+            else:
+                self.assertRaises(type(exception), client._main, "url",
+                                  "data", "ref", None)
+            self.assertEqual(breaker.state, exp_state)
+            self.assertEqual(breaker._probes, 0)
+            self.assertEqual(breaker.failures != 0, bool(exp_failures))
+            self.assertEqual(len(self.mock_receive), 1)
+            if exp_state == "open":
+                self.check_st_exception(ConnectionError,
+                                        ["ref Circuit breaker open for \
+https://test.com"],
+                                        "11 ref Circuit breaker open for \
+https://test.com", "11", client._main,
+                                        func_args=("url", "data", "ref",
+                                                   None))
+                self.assertEqual(len(self.mock_receive), 1)
+
+    def test__main_circuit_breaker_default(self):
+        # The circuit breaker is disabled unless a threshold is set
+        config = securetrading.Config()
+        breakers = securetrading.circuitbreaker.CircuitBreakers(config)
+        client = self.client(config, circuit_breakers=breakers)
+        client._transport = self.mock_method(exception=ConnectionError("7"))
+        for i in range(20):
+            self.assertRaises(ConnectionError, client._main, "url", "data",
+                              "ref", None)
+        self.assertEqual(len(self.mock_receive), 20)
+        self.assertEqual(breakers._get("url").state, "closed")
+
+    def test__main_timings(self):
+        mock_client = self.client(securetrading.Config())
+        mock_client._connect = self.mock_method()
+        mock_client._send = self.mock_method()
+        mock_client._receive = self.mock_method(result=(200, "response"))
+        mock_client._get_response_headers = self.mock_method(result={})
+        mock_client._close = self.mock_method()
+        timings = securetrading.Timings("request_reference")
+        mock_client._main("https://www.securetrading.com", "{}",
+                          "request_reference", None, timings=timings)
+        exp_phases = ["send_receive"]
+        if mock_client._measures_connect:
+            exp_phases.insert(0, "connect")
+        self.assertEqual(sorted(timings.phases), exp_phases)
+        self.assertEqual(self.client is securetrading.httpclient.
+                         GenericHTTPClient, "connect" in timings.phases)
+
     def test__main(self):
 
         c2_exp_eng = "7 Connect Error"
@@ -278,6 +453,52 @@ class Test_httpclient_GenericHTTPClient(abstract_test.TestCase):
                 self.assertEqual(actual_headers, exp_headers)
 
 
+class Test_httpclient_HTTPConnectionPool(abstract_test.TestCase):
+
+    def test__get_session(self):
+        config = securetrading.Config()
+        config.http_pool_maxsize = 3
+        pool = securetrading.httpclient.HTTPConnectionPool(config)
+        try:
+            session = pool._get_session()
+            self.assertTrue(isinstance(session, requests.Session))
+            self.assertTrue(session is pool._get_session())
+            adapter = session.get_adapter("https://www.securetrading.com")
+            self.assertEqual(adapter._pool_maxsize, 3)
+            policy = session.cookies._policy
+            self.assertEqual(list(policy.allowed_domains()), [])
+        finally:
+            pool._close()
+
+    def test__get_session_idle_eviction(self):
+        tests = [(30, 10, False),
+                 (30, 31, True),
+                 (None, 100000, False),
+                 ]
+
+        for idle_timeout, idle_time, exp_new_session in tests:
+            config = securetrading.Config()
+            config.http_pool_idle_timeout = idle_timeout
+            pool = securetrading.httpclient.HTTPConnectionPool(config)
+            try:
+                session = pool._get_session()
+                pool._last_used -= idle_time
+                new_session = pool._get_session()
+                self.assertEqual(new_session is not session, exp_new_session)
+            finally:
+                pool._close()
+
+    def test__close(self):
+        config = securetrading.Config()
+        pool = securetrading.httpclient.HTTPConnectionPool(config)
+        pool._close()
+        session = pool._get_session()
+        pool._close()
+        self.assertEqual(pool._session, None)
+        self.assertTrue(pool._get_session() is not session)
+        pool._close()
+
+
 class Test_httpclient_HTTPRequestsClient(Test_httpclient_GenericHTTPClient):
 
     client = securetrading.httpclient.HTTPRequestsClient
@@ -388,20 +609,260 @@ whilst trying to connect to https://www.securetrading.com"]
                     multiple_calls=request_responses)
                 # As we have mocked the requests.request,
                 # the args have no value
-                send_args = ("https://www.securetrading.com",
-                             {"requestreference": "data"},
-                             "request_reference",
-                             )
+                send_args = (
+                    securetrading.httpclient._Call("request_reference"),
+                    "https://www.securetrading.com",
+                    {"requestreference": "data"},
+                )
                 if exp_exception:
                     self.check_st_exception(exp_exception, exp_data,
                                             exp_english, exp_code,
                                             mock_client._send,
                                             func_args=send_args)
                 else:
-                    mock_client._send(*send_args)
-                    self.assertEqual(mock_client.response, exp_response)
+                    self.assertEqual(mock_client._send(*send_args),
+                                     exp_response)
+        finally:
+            requests.request = original_request
+
+    def test__send_retry_policy(self):
+        config = securetrading.Config()
+        config.http_retry_policy = \
+            securetrading.ExponentialBackoffRetryPolicy(0.1, 0.3, None)
+        config.http_retry_budget = 0.1
+        budget = securetrading.retry.RetryBudget(config)
+        budget._tokens = 3
+        mock_client = securetrading.httpclient.HTTPRequestsClient(
+            config, retry_budget=budget)
+        original_request = requests.request
+        original_sleep = time.sleep
+        sleeps = []
+        try:
+            time.sleep = sleeps.append
+            requests.request = self.mock_method(
+                multiple_calls=[ConnectTimeout, ConnectTimeout,
+                                ConnectTimeout, "Successful response"])
+            response = mock_client._send(
+                securetrading.httpclient._Call("request_reference"),
+                "https://www.securetrading.com", {"requestreference": "data"})
+            self.assertEqual(response, "Successful response")
+            self.assertEqual(sleeps, [0.1, 0.2, 0.3])
+            self.assertEqual(round(budget._tokens, 2), 0.1)
+            requests.request = self.mock_method(
+                multiple_calls=[ConnectTimeout, "Successful response"])
+            self.check_st_exception(ConnectionError,
+                                    ["request_reference Retry budget \
+exhausted whilst trying to connect to https://www.securetrading.com"],
+                                    "7 request_reference Retry budget \
+exhausted whilst trying to connect to https://www.securetrading.com", "7",
+                                    mock_client._send,
+                                    func_args=(
+                                        securetrading.httpclient._Call(
+                                            "request_reference"),
+                                        "https://www.securetrading.com",
+                                        {"requestreference": "data"}))
+        finally:
+            requests.request = original_request
+            time.sleep = original_sleep
+
+    def test__send_timings(self):
+        timings = securetrading.Timings("request_reference")
+        hooks = securetrading.hooks.Hooks()
+        events = []
+        for event in ["before_attempt", "after_attempt"]:
+            hooks._add(event, lambda reference, timings, data, event=event:
+                       events.append((event, reference, dict(data))))
+        mock_client = securetrading.httpclient.HTTPRequestsClient(
+            securetrading.Config(), hooks=hooks)
+        original_request = requests.request
+        original_sleep = time.sleep
+        try:
+            time.sleep = lambda seconds: None
+            requests.request = self.mock_method(
+                multiple_calls=[ConnectTimeout, "Successful response"])
+            mock_client._send(
+                securetrading.httpclient._Call("request_reference",
+                                               timings=timings),
+                "https://www.securetrading.com", {"requestreference": "data"})
         finally:
             requests.request = original_request
+            time.sleep = original_sleep
+        self.assertEqual([(attempt["url"], attempt["error"])
+                          for attempt in timings.attempts],
+                         [("https://www.securetrading.com",
+                           "ConnectTimeout()"),
+                          ("https://www.securetrading.com", None)])
+        self.assertTrue(all(attempt["seconds"] >= 0
+                            for attempt in timings.attempts))
+        url = "https://www.securetrading.com"
+        self.assertEqual([(event, reference, data["url"], data["attempt"])
+                          for event, reference, data in events],
+                         [("before_attempt", "request_reference", url, 0),
+                          ("after_attempt", "request_reference", url, 0),
+                          ("before_attempt", "request_reference", url, 1),
+                          ("after_attempt", "request_reference", url, 1),
+                          ])
+        self.assertTrue(isinstance(events[1][2]["exception"], ConnectTimeout))
+        self.assertEqual(events[3][2]["exception"], None)
+        self.assertEqual(events[3][2]["seconds"],
+                         timings.attempts[1]["seconds"])
+
+    def test__main_status_timings(self):
+        tests = [(200, None, [200]),
+                 (401, "6", [401]),
+                 (503, "8", [503]),
+                 ]
+
+        for status_code, exp_code, exp_statuses in tests:
+            response = requests.Response()
+            response._content = b"{}"
+            response.encoding = "UTF-8"
+            response.status_code = status_code
+            timings = securetrading.Timings("request_reference")
+            mock_client = self.client(securetrading.Config())
+            original_request = requests.request
+            try:
+                requests.request = self.mock_method(result=response)
+                mock_client._main("https://www.securetrading.com",
+                                  "{}", "request_reference", None,
+                                  timings=timings)
+            except ConnectionError as e:
+                self.assertEqual(e.code, exp_code)
+            else:
+                self.assertEqual(exp_code, None)
+            finally:
+                requests.request = original_request
+            self.assertEqual([attempt["status"]
+                              for attempt in timings.attempts],
+                             exp_statuses)
+
+    def test__main_failover(self):
+        tests = [({}, [], [ConnectTimeout, ConnectTimeout, "response"],
+                  ["a", "b", "c"], {"a": "closed", "b": "closed",
+                                    "c": "closed"}, None),
+                 ({}, [], [ConnectTimeout, ConnectTimeout, ConnectTimeout,
+                           "response"], ["a", "b", "c", "a"],
+                  {"a": "closed", "b": "closed", "c": "closed"}, None),
+                 ({}, ["a"], [ConnectTimeout, "response"], ["b", "c"],
+                  {"a": "open", "b": "closed", "c": "closed"}, None),
+                 ({}, ["a", "b", "c"], [], [],
+                  {"a": "open", "b": "open", "c": "open"}, "11"),
+                 ({"http_max_retries": 1}, [],
+                  [ConnectTimeout, ConnectTimeout], ["a", "b"],
+                  {"a": "closed", "b": "closed", "c": "closed"}, "7"),
+                 ({"http_circuit_failure_threshold": 1,
+                   "http_max_retries": 1}, [],
+                  [ConnectTimeout, ConnectTimeout], ["a", "b"],
+                  {"a": "open", "b": "open", "c": "closed"}, "7"),
+                 ({"http_prefer_low_latency": True}, [],
+                  [ConnectTimeout, ConnectTimeout, "response"],
+                  ["b", "c", "a"],
+                  {"a": "closed", "b": "closed", "c": "closed"}, None),
+                 ]
+
+        def get_url(name):
+            return "https://{0}.com".format(name)
+
+        original_request = requests.request
+        original_sleep = time.sleep
+        try:
+            time.sleep = lambda seconds: None
+            for config_data, open_urls, request_responses, exp_urls, \
+                    exp_states, exp_code in tests:
+                config = securetrading.Config()
+                config.datacenterurls = [get_url("a"), get_url("b"),
+                                         get_url("c")]
+                config.http_max_retries = 5
+                config.http_circuit_failure_threshold = 5
+                for key in config_data:
+                    setattr(config, key, config_data[key])
+                profile = securetrading.profile.TransportProfile(config)
+                breakers = securetrading.circuitbreaker.CircuitBreakers(config)
+                for datacenterurl in config.datacenterurls:
+                    breakers._get(datacenterurl)
+                for name in open_urls:
+                    breaker = breakers._get(get_url(name))
+                    for i in range(config.http_circuit_failure_threshold):
+                        breaker._record_failure()
+                latencies = securetrading.endpoint.EndpointLatencies()
+                for name, latency in [("a", 0.2), ("c", 0.1)]:
+                    latencies._record(get_url(name), latency)
+                client = securetrading.httpclient.HTTPRequestsClient(
+                    config, circuit_breakers=breakers, latencies=latencies)
+                client._receive = lambda response: (200, "response")
+                client._get_response_headers = lambda response: {}
+                requests.request = self.mock_method(
+                    multiple_calls=request_responses)
+                if exp_code is None:
+                    self.assertEqual(client._main(profile.url, "data",
+                                                  "ref", None,
+                                                  profile=profile),
+                                     ("response", {}))
+                    if exp_urls.count(exp_urls[-1]) == 1:
+                        self.assertTrue(latencies._get_latencies()[
+                            get_url(exp_urls[-1])] < 1)
+                else:
+                    with self.assertRaises(ConnectionError) as cm:
+                        client._main(profile.url, "data", "ref", None,
+                                     profile=profile)
+                    self.assertEqual(cm.exception.code, exp_code)
+                self.assertEqual([kwargs["url"] for args, kwargs in
+                                  self.mock_receive],
+                                 [get_url(name) + "/json/"
+                                  for name in exp_urls])
+                self.assertEqual(breakers._get_states(),
+                                 dict((get_url(name), exp_states[name])
+                                      for name in exp_states))
+                for name in exp_urls[:-1]:
+                    # Failed attempts count as the whole connect timeout
+                    self.assertTrue(latencies._get_latencies()[
+                        get_url(name)] > 1)
+        finally:
+            requests.request = original_request
+            time.sleep = original_sleep
+
+    def test__send_pooled(self):
+        config = securetrading.Config()
+        pool = securetrading.httpclient.HTTPConnectionPool(config)
+        mock_client = securetrading.httpclient.HTTPRequestsClient(
+            config, pool=pool)
+        original_request = requests.request
+        session = pool._get_session()
+        try:
+            requests.request = self.mock_method(
+                exception=Exception("requests.request called"))
+            session.request = self.mock_method(
+                multiple_calls=[ConnectTimeout, "Successful response"])
+            response = mock_client._send(
+                securetrading.httpclient._Call("request_reference"),
+                "https://www.securetrading.com", {"requestreference": "data"})
+            self.assertEqual(response, "Successful response")
+            # Nothing of the request is kept on the shared client
+            self.assertFalse(hasattr(mock_client, "response"))
+            self.assertEqual(len(self.mock_receive), 2)
+            self.assertEqual(self.mock_receive[1][1]["method"], "POST")
+            self.assertEqual(self.mock_receive[1][1]["url"],
+                             "https://www.securetrading.com")
+        finally:
+            requests.request = original_request
+            pool._close()
+
+    def test__get_auth(self):
+        config = securetrading.Config()
+        config.username = "user"
+        config.password = "pass"
+        tests = [(None, "Basic dXNlcjpwYXNz"),
+                 (securetrading.profile.TransportProfile(config),
+                  "Basic dXNlcjpwYXNz"),
+                 ]
+
+        for profile, exp_authorization in tests:
+            client = self.client(config)
+            request = requests.Request("POST", "https://www.securetrading.com",
+                                       auth=client._get_auth(profile)
+                                       ).prepare()
+            self.assertEqual(request.headers["Authorization"],
+                             exp_authorization)
 
     def test_handle_exception(self):
         tests = [(RequestException(), [''], "7", "7"),
@@ -444,13 +905,13 @@ whilst trying to connect to https://www.securetrading.com"]
             response._content = text
             response.encoding = "UTF-8"
             response.status_code = status_code
-            self.http_client.response = response
 
             if exp_exception:
                 self.check_st_exception(exp_exception, exp_data, exp_english,
-                                        exp_code, self.http_client._receive)
+                                        exp_code, self.http_client._receive,
+                                        func_args=(response,))
             else:
-                actual = self.http_client._receive()
+                actual = self.http_client._receive(response)
                 self.assertEqual(actual, exp_response)
 
     def test__get_response_headers(self):
@@ -477,13 +938,12 @@ whilst trying to connect to https://www.securetrading.com"]
         for headers, requested_headers, exp_headers in tests:
             response = requests.Response()
             response.headers = headers
-            self.http_client.response = response
 
             config = securetrading.Config()
             config.http_response_headers = requested_headers
             self.http_client.config = config
 
-            actual = self.http_client._get_response_headers()
+            actual = self.http_client._get_response_headers(response)
             self.assertEqual(actual, exp_headers)
 
 
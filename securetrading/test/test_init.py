@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import subprocess
+import sys
+import unittest
+import securetrading
+from securetrading.test import abstract_test
+
+
+class Test_init(abstract_test.TestCase):
+
+    def test_lazy_attributes(self):
+        tests = [("error_messages", dict),
+                 ("phrase_book", dict),
+                 ("version_information", list),
+                 ("version_info", type("")),
+                 ("Api", type),
+                 ]
+
+        for name, exp_type in tests:
+            self.assertTrue(isinstance(getattr(securetrading, name),
+                                       exp_type))
+            self.assertTrue(name in dir(securetrading))
+        self.assertEqual(securetrading.version_info, self.version_info)
+        self.assertEqual(securetrading.error_messages["0"], "Ok")
+        self.assertTrue(securetrading.Api is securetrading.api.Api)
+
+    def test_lazy_attributes_reassigned(self):
+        tmp = securetrading.version_info
+        try:
+            securetrading.version_info = "testing"
+            self.assertEqual(securetrading.version_info, "testing")
+            self.assertEqual(securetrading.Request()["versioninfo"],
+                             "testing")
+        finally:
+            securetrading.version_info = tmp
+
+    def test_lazy_submodules(self):
+        tests = ["api", "circuitbreaker", "httpclient", "metrics", "profile"]
+
+        for name in tests:
+            self.assertEqual(getattr(securetrading, name).__name__,
+                             "securetrading." + name)
+
+    def test_unknown_attribute(self):
+        self.assertRaises(AttributeError, getattr, securetrading, "unknown")
+        self.assertFalse(hasattr(securetrading, "unknown"))
+
+    @unittest.skipIf(sys.version_info < (3, 7),
+                     "Module __getattr__ is not supported")
+    def test_import(self):
+        script = """
+import sys
+import securetrading
+securetrading.Request()
+print(" ".join(sorted(name for name in ["asyncio", "requests", "six",
+                                        "securetrading.httpclient"]
+                      if name in sys.modules)))
+print(" ".join(sorted(name for name in ["error_messages", "phrase_book"]
+                      if name in vars(securetrading))))
+backend = securetrading.util.get_json_backend()
+print(" ".join(sorted(name for name in ["orjson", "rapidjson", "ujson"]
+                      if name in sys.modules and name != backend)))
+"""
+        output = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(output.decode("utf-8").splitlines(), ["", "", ""])
+
+
+if __name__ == "__main__":
+    unittest.main()
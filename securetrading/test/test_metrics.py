@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import threading
+import unittest
+import securetrading
+from securetrading.metrics import Metrics
+from securetrading.test import abstract_test
+
+
+class Test_Metrics(abstract_test.TestCase):
+
+    def get_result(self, errorcodes, requesttype="AUTH"):
+        result = securetrading.Response()
+        result["responses"] = [{"errorcode": errorcode,
+                                "requesttypedescription": requesttype}
+                               for errorcode in errorcodes]
+        return result
+
+    def get_timings(self, total, attempts=()):
+        timings = securetrading.Timings()
+        for url, seconds, status in attempts:
+            timings._add_attempt(url, seconds)
+            timings._set_status(status)
+        timings.total = total
+        return timings
+
+    def test__inc(self):
+        metrics = Metrics()
+        labels = (("requesttype", "AUTH"),)
+        metrics._inc("counter", labels)
+        metrics._inc("counter", labels, 2)
+        metrics._inc("other", labels)
+        self.assertEqual(metrics._get_snapshot(), {
+            "counter": [{"labels": {"requesttype": "AUTH"}, "value": 3}],
+            "other": [{"labels": {"requesttype": "AUTH"}, "value": 1}],
+        })
+
+    def test__observe(self):
+        tests = [([], None, None),
+                 ([0.05], [(0.1, 1), (1, 1), (float("inf"), 1)], 0.05),
+                 ([0.1], [(0.1, 1), (1, 1), (float("inf"), 1)], 0.1),
+                 ([0.5, 2], [(0.1, 0), (1, 1), (float("inf"), 2)], 2.5),
+                 ([1, 0.01, 30], [(0.1, 1), (1, 2), (float("inf"), 3)],
+                  31.01),
+                 ]
+
+        for observations, exp_buckets, exp_sum in tests:
+            metrics = Metrics(buckets=[1, 0.1])
+            for seconds in observations:
+                metrics._observe("histogram", (), seconds)
+            samples = metrics._get_snapshot().get("histogram", [])
+            if not observations:
+                self.assertEqual(samples, [])
+                continue
+            self.assertEqual(samples[0]["buckets"], exp_buckets)
+            self.assertEqual(samples[0]["count"], len(observations))
+            self.assertAlmostEqual(samples[0]["sum"], exp_sum)
+
+    def test__get_snapshot_threads(self):
+        metrics = Metrics()
+
+        def record():
+            for i in range(1000):
+                metrics._inc("counter", ())
+                metrics._observe("histogram", (), 0.2)
+
+        threads = [threading.Thread(target=record) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = metrics._get_snapshot()
+        # The shards of the exited threads were added to the shared shard
+        self.assertEqual(len(metrics._shards), 1)
+        self.assertEqual(snapshot["counter"][0]["value"], 4000)
+        self.assertEqual(snapshot["histogram"][0]["count"], 4000)
+
+    def test__get_shard_exited_threads(self):
+        metrics = Metrics()
+        metrics._inc("counter", ())
+        for i in range(500):
+            thread = threading.Thread(target=metrics._inc,
+                                      args=("counter", ()))
+            thread.start()
+            thread.join()
+            self.assertTrue(len(metrics._shards) <= 3)
+        self.assertEqual(len(metrics._owners), 1)
+        snapshot = metrics._get_snapshot()
+        self.assertEqual(len(metrics._shards), 2)
+        self.assertEqual(snapshot["counter"][0]["value"], 501)
+        metrics._inc("counter", ())
+        self.assertEqual(metrics._get_snapshot()["counter"][0]["value"], 502)
+
+    def test__record(self):
+        request = securetrading.Request()
+        request["requesttypedescriptions"] = ["ACCOUNTCHECK", "AUTH"]
+        tests = [(self.get_result(["0"]), {"AUTH": {"0": 1}}, "0", [], {}),
+                 (self.get_result(["0", "70000"]),
+                  {"AUTH": {"0": 1, "70000": 1}}, "70000", [], {}),
+                 (self.get_result(["7"], "ERROR"),
+                  {"ACCOUNTCHECK,AUTH": {"7": 1}}, "7",
+                  [("https://a.com", 10, None),
+                   ("https://b.com", 0.1, 200)],
+                  {("https://a.com", "error"): 1,
+                   ("https://b.com", "200"): 1}),
+                 ]
+
+        for result, exp_responses, exp_errorcode, attempts, exp_attempts in\
+                tests:
+            metrics = Metrics()
+            metrics._record(request, result, self.get_timings(0.2, attempts))
+            snapshot = metrics._get_snapshot()
+            actual = {}
+            for sample in snapshot["securetrading_responses_total"]:
+                labels = sample["labels"]
+                actual.setdefault(labels["requesttype"], {})[
+                    labels["errorcode"]] = sample["value"]
+            self.assertEqual(actual, exp_responses)
+            durations = snapshot["securetrading_request_duration_seconds"]
+            self.assertEqual([sample["labels"] for sample in durations],
+                             [{"requesttype": "ACCOUNTCHECK,AUTH",
+                               "errorcode": exp_errorcode}])
+            actual_attempts = dict(
+                ((sample["labels"]["endpoint"], sample["labels"]["status"]),
+                 sample["value"])
+                for sample in snapshot.get(
+                    "securetrading_http_attempts_total", []))
+            self.assertEqual(actual_attempts, exp_attempts)
+            retries = snapshot.get("securetrading_http_retries_total", [])
+            self.assertEqual(retries,
+                             [{"labels": {"endpoint": "https://b.com"},
+                               "value": 1}] if attempts else [])
+
+    def test__record_invalid_request(self):
+        metrics = Metrics()
+        metrics._record("invalid", self.get_result(["10"], "ERROR"),
+                        self.get_timings(None))
+        snapshot = metrics._get_snapshot()
+        self.assertEqual(snapshot, {"securetrading_responses_total": [
+            {"labels": {"requesttype": "", "errorcode": "10"}, "value": 1}]})
+
+    def test__render_prometheus(self):
+        metrics = Metrics(buckets=[0.5, 1])
+        self.assertEqual(metrics._render_prometheus(), "")
+        request = securetrading.Request()
+        request["requesttypedescriptions"] = ["AUTH"]
+        metrics._record(request, self.get_result(["0"]),
+                        self.get_timings(0.25, [('https://a.com/"x"', 0.25,
+                                                 200)]))
+        expected = """\
+# HELP securetrading_responses_total Responses by request type and error code.
+# TYPE securetrading_responses_total counter
+securetrading_responses_total{errorcode="0",requesttype="AUTH"} 1
+# HELP securetrading_request_duration_seconds Time taken to process each \
+request.
+# TYPE securetrading_request_duration_seconds histogram
+securetrading_request_duration_seconds_bucket{errorcode="0",\
+requesttype="AUTH",le="0.5"} 1
+securetrading_request_duration_seconds_bucket{errorcode="0",\
+requesttype="AUTH",le="1"} 1
+securetrading_request_duration_seconds_bucket{errorcode="0",\
+requesttype="AUTH",le="+Inf"} 1
+securetrading_request_duration_seconds_sum{errorcode="0",\
+requesttype="AUTH"} 0.25
+securetrading_request_duration_seconds_count{errorcode="0",\
+requesttype="AUTH"} 1
+# HELP securetrading_http_attempts_total Attempts to send a request by \
+endpoint and HTTP status, the status is error when no response was received.
+# TYPE securetrading_http_attempts_total counter
+securetrading_http_attempts_total{endpoint="https://a.com/\\"x\\"",\
+status="200"} 1
+# HELP securetrading_http_attempt_duration_seconds Time taken by each \
+attempt to send a request.
+# TYPE securetrading_http_attempt_duration_seconds histogram
+securetrading_http_attempt_duration_seconds_bucket{\
+endpoint="https://a.com/\\"x\\"",le="0.5"} 1
+securetrading_http_attempt_duration_seconds_bucket{\
+endpoint="https://a.com/\\"x\\"",le="1"} 1
+securetrading_http_attempt_duration_seconds_bucket{\
+endpoint="https://a.com/\\"x\\"",le="+Inf"} 1
+securetrading_http_attempt_duration_seconds_sum{\
+endpoint="https://a.com/\\"x\\""} 0.25
+securetrading_http_attempt_duration_seconds_count{\
+endpoint="https://a.com/\\"x\\""} 1
+"""
+        self.assertEqual(metrics._render_prometheus(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
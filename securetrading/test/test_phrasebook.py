@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 import unittest
 from securetrading.test import abstract_test
 import securetrading
+import securetrading.phrasebook
 
 
 class Test_PhraseBook(abstract_test.TestCase):
@@ -35,6 +36,80 @@ class Test_PhraseBook(abstract_test.TestCase):
         finally:
             securetrading.phrase_book = tmp_phrase_book
 
+    def test_lookup_error(self):
+        tmp_phrase_book = securetrading.phrase_book
+        tmp_error_messages = securetrading.error_messages
+        try:
+            securetrading.phrase_book = {"Failed": {"de_de": "Gescheitert",
+                                                    "fr_fr": "Echoue",
+                                                    },
+                                         "Other": {"fr_fr": "Autre"},
+                                         }
+            securetrading.error_messages = {"1": "Failed", "2": "Unknown"}
+
+            tests = [("en_gb", "1", "", "Failed"),
+                     ("de_de", "1", "Other", "Gescheitert"),
+                     ("fr_fr", "1", "", "Echoue"),
+                     ("fr_fr", "2", "Other", "Unknown"),
+                     ("fr_fr", "3", "Other", "Autre"),
+                     ("de_de", "3", "Other", "Other"),
+                     ("fr_fr", "3", "HERE", "HERE"),
+                     ]
+
+            for locale, error_code, error_message, expected in tests:
+                config = securetrading.Config()
+                config.locale = locale
+                phrasebook = securetrading.PhraseBook(config)
+                self.assertEqual(phrasebook.lookup_error(error_code,
+                                                         error_message),
+                                 expected)
+                self.assertEqual(phrasebook.lookup_error(
+                    error_code, error_message, locale=locale), expected)
+
+            securetrading.error_messages = {"1": "Other"}
+            self.assertEqual(phrasebook.lookup_error("1", ""), "Autre")
+        finally:
+            securetrading.phrase_book = tmp_phrase_book
+            securetrading.error_messages = tmp_error_messages
+
+    def test_get_missing(self):
+        tmp_phrase_book = securetrading.phrase_book
+        tmp_error_messages = securetrading.error_messages
+        try:
+            securetrading.phrase_book = {"Failed": {"de_de": "Gescheitert",
+                                                    "fr_fr": "Echoue",
+                                                    },
+                                         "Other": {"fr_fr": "Autre"},
+                                         "": {},
+                                         }
+            securetrading.error_messages = {"0": "Ok", "1": "Failed"}
+
+            tests = [("en_gb", []),
+                     ("en_us", []),
+                     ("fr_fr", ["Ok"]),
+                     ("de_de", ["Ok", "Other"]),
+                     ("es_es", ["Failed", "Ok", "Other"]),
+                     ]
+
+            phrasebook = securetrading.PhraseBook(securetrading.Config())
+            for locale, expected in tests:
+                self.assertEqual(phrasebook.get_missing(locale), expected)
+        finally:
+            securetrading.phrase_book = tmp_phrase_book
+            securetrading.error_messages = tmp_error_messages
+
+    def test__get_table(self):
+        config = securetrading.Config()
+        config.locale = "de_de"
+        phrasebook1 = securetrading.PhraseBook(config)
+        phrasebook2 = securetrading.PhraseBook(securetrading.Config())
+        table = phrasebook1._get_table("de_de")
+        self.assertTrue(table is phrasebook2._get_table("de_de"))
+        self.assertTrue(table is securetrading.phrasebook._tables["de_de"])
+        self.assertEqual(table.codes["1"], "Allgemeiner Fehler")
+        self.assertEqual(table.messages["Generic error"],
+                         "Allgemeiner Fehler")
+
 
 if __name__ == "__main__":
     unittest.main()
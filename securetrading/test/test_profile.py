@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import unittest
+import securetrading
+import securetrading.httpclient as httpclient
+from securetrading.profile import TransportProfile
+from securetrading.test import abstract_test
+
+
+class Test_TransportProfile(abstract_test.TestCase):
+
+    def test___init__(self):
+        tests = [({}, "https://webservices.securetrading.net/json/",
+                  "Basic Og=="),
+                 ({"datacenterurl": "https://test.com",
+                   "datacenterpath": "/some/path/",
+                   "username": "user",
+                   "password": "pass"},
+                  "https://test.com/some/path/", "Basic dXNlcjpwYXNz"),
+                 ({"username": "user\xa3", "password": "\xa3"},
+                  "https://webservices.securetrading.net/json/",
+                  "Basic dXNlcqM6ow=="),
+                 ]
+
+        for config_data, exp_url, exp_authorization in tests:
+            config = securetrading.Config()
+            for key in config_data:
+                setattr(config, key, config_data[key])
+            profile = TransportProfile(config)
+            self.assertEqual(profile.url, exp_url)
+            self.assertEqual(profile.authorization, exp_authorization)
+            self.assertTrue(isinstance(profile.converter,
+                                       securetrading.Converter))
+            self.assertTrue(profile.converter.config is config)
+
+    def test_endpoints(self):
+        tests = [({}, [("https://webservices.securetrading.net",
+                        "https://webservices.securetrading.net/json/")]),
+                 ({"datacenterurls": ["https://a.com", "https://b.com/"],
+                   "datacenterpath": "/some/path/"},
+                  [("https://a.com", "https://a.com/some/path/"),
+                   ("https://b.com/", "https://b.com/some/path/")]),
+                 ]
+
+        for config_data, expected in tests:
+            config = securetrading.Config()
+            for key in config_data:
+                setattr(config, key, config_data[key])
+            profile = TransportProfile(config)
+            self.assertEqual([(endpoint.datacenterurl, endpoint.url)
+                              for endpoint in profile.endpoints], expected)
+            self.assertEqual(profile.url, expected[0][1])
+
+    def test__is_current(self):
+        config = securetrading.Config()
+        profile = TransportProfile(config)
+        self.assertTrue(profile._is_current())
+        config.username = "changed"
+        self.assertFalse(profile._is_current())
+        self.assertTrue(TransportProfile(config)._is_current())
+
+    def test__get_headers(self):
+        config = securetrading.Config()
+        profile = TransportProfile(config)
+        for client_class in [httpclient.GenericHTTPClient,
+                             httpclient.HTTPRequestsClient]:
+            client = client_class(config)
+            headers = profile._get_headers(client)
+            self.assertEqual(headers, client._get_static_headers())
+            self.assertTrue(headers is profile._get_headers(client))
+            self.assertTrue(headers is profile._get_headers(
+                client_class(config)))
+            self.assertFalse("REQUESTREFERENCE" in headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
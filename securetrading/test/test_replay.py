@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import six
+import securetrading
+import securetrading.replay as replay
+import securetrading.simulator as simulator
+from securetrading.test import abstract_test
+
+
+class Test_replay(abstract_test.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_api(self, url="https://webservices.securetrading.net"):
+        config = securetrading.Config()
+        config.username = "webservices@example.com"
+        config.password = "Password1^"
+        config.datacenterurl = url
+        return securetrading.Api(config)
+
+    def record(self, path, requests):
+        with simulator.GatewaySimulator(latency="fixed:0.02") as running:
+            api = self.get_api(running.url)
+            api.http_pool = replay.RecordingConnectionPool(api.config, path)
+            responses = [api.process(request) for request in requests]
+            api.close()
+        return responses
+
+    def get_auth(self, **fields):
+        request = {"requesttypedescriptions": ["AUTH"],
+                   "pan": "4111111111111111",
+                   "securitycode": "123",
+                   "baseamount": "1050",
+                   "currencyiso3a": "GBP",
+                   }
+        request.update(fields)
+        return request
+
+    def test_record(self):
+        tests = ["traffic.jsonl", "traffic.jsonl.gz"]
+
+        for name in tests:
+            path = os.path.join(self.directory, name)
+            responses = self.record(path, [self.get_auth()])
+            recordings = replay.load(path)
+            self.assertEqual(len(recordings), 1)
+            recording = recordings[0]
+            self.assertEqual(recording["status"], 200)
+            self.assertTrue(recording["elapsed"] >= 0.02)
+            request = recording["request"]["request"][0]
+            self.assertEqual(request["pan"], "****************")
+            self.assertEqual(request["securitycode"], "***")
+            self.assertEqual(request["baseamount"], "1050")
+            self.assertEqual(request["requestreference"],
+                             responses[0]["requestreference"])
+            self.assertFalse(responses[0]["requestreference"] in
+                             recording["response"])
+            self.assertTrue("$requestreference" in recording["response"])
+
+    def test_replay(self):
+        path = os.path.join(self.directory, "traffic.jsonl")
+        recorded = self.record(path, [
+            self.get_auth(),
+            self.get_auth(requesttypedescriptions=["ACCOUNTCHECK"]),
+            self.get_auth(baseamount="2000"),
+        ])
+
+        api = self.get_api()
+        api.http_pool = replay.ReplayConnectionPool(api.config, path,
+                                                    speed=None)
+        tests = [(["AUTH"], recorded[0]),
+                 (["ACCOUNTCHECK"], recorded[1]),
+                 (["AUTH"], recorded[2]),
+                 (["AUTH"], recorded[0]),
+                 (["THREEDQUERY"], recorded[0]),
+                 ]
+
+        for requesttypes, expected in tests:
+            request = securetrading.Request()
+            request.update(self.get_auth(requesttypedescriptions=requesttypes))
+            response = api.process(request)
+            self.assertEqual(response["requestreference"],
+                             request["requestreference"])
+            sub_response = response["responses"][0]
+            self.assertEqual(sub_response["requestreference"],
+                             request["requestreference"])
+            expected = expected["responses"][0]
+            for key in ["requesttypedescription", "transactionreference",
+                        "baseamount"]:
+                self.assertEqual(sub_response[key], expected[key])
+
+    def get_requests(self, *requests_fields):
+        requests = securetrading.Requests()
+        requests["requests"] = []
+        for fields in requests_fields:
+            request = securetrading.Request()
+            request.update(fields)
+            requests["requests"].append(request)
+        return requests
+
+    def test_replay_requests(self):
+        path = os.path.join(self.directory, "traffic.jsonl")
+        recorded = self.record(path, [self.get_requests(
+            self.get_auth(),
+            self.get_auth(requesttypedescriptions=["ACCOUNTCHECK"]))])
+        self.assertEqual([sub_response["errorcode"]
+                          for sub_response in recorded[0]["responses"]],
+                         ["0", "0"])
+        text = replay.load(path)[0]["response"]
+        for marker in ["$requestreference", "$requestreference.0",
+                       "$requestreference.1"]:
+            self.assertTrue('"{0}"'.format(marker) in text)
+
+        api = self.get_api()
+        api.http_pool = replay.ReplayConnectionPool(api.config, path,
+                                                    speed=None)
+        requests = self.get_requests(
+            self.get_auth(),
+            self.get_auth(requesttypedescriptions=["ACCOUNTCHECK"]))
+        response = api.process(requests)
+        self.assertEqual(response["requestreference"],
+                         requests["requestreference"])
+        self.assertEqual([sub_response["errorcode"]
+                          for sub_response in response["responses"]],
+                         ["0", "0"])
+        self.assertEqual([sub_response["requestreference"]
+                          for sub_response in response["responses"]],
+                         [request["requestreference"]
+                          for request in requests["requests"]])
+
+    def test__markers(self):
+        tests = [(["A1", "A1"], "A1 x", "$requestreference x"),
+                 (["A1", "A2", "A3"], "A1 A2 A3",
+                  "$requestreference $requestreference.0 $requestreference.1"),
+                 (["", "A2"], "A2", "$requestreference.0"),
+                 ]
+
+        for request_references, text, exp_marked in tests:
+            marked = replay._add_markers(text, request_references)
+            self.assertEqual(marked, exp_marked)
+            self.assertEqual(replay._replace_markers(marked,
+                                                     request_references),
+                             text)
+        self.assertEqual(replay._replace_markers("$requestreference.1",
+                                                 ["A1", "A2"]), "")
+
+    def test_replay_speed(self):
+        path = os.path.join(self.directory, "traffic.jsonl")
+        self.record(path, [self.get_auth()])
+        elapsed = replay.load(path)[0]["elapsed"]
+        tests = [(1, elapsed),
+                 (4, elapsed / 4),
+                 (None, 0),
+                 ]
+
+        for speed, exp_minimum in tests:
+            api = self.get_api()
+            api.http_pool = replay.ReplayConnectionPool(api.config, path,
+                                                        speed=speed)
+            start = time.time()
+            response = api.process(self.get_auth())
+            self.assertTrue(time.time() - start >= exp_minimum)
+            self.assertEqual(response["responses"][0]["errorcode"], "0")
+
+    def test_replay_invalid(self):
+        path = os.path.join(self.directory, "traffic.jsonl")
+        open(path, "w").close()
+        tests = [(0, "A speed greater than 0 or None is required"),
+                 (1, "No recordings were found in"),
+                 ]
+
+        for speed, exp_message in tests:
+            six.assertRaisesRegex(self, AssertionError, exp_message,
+                                  replay.ReplayAdapter, path, speed)
+
+    def test_get_requests(self):
+        path = os.path.join(self.directory, "traffic.jsonl")
+        self.record(path, [self.get_auth(), {"requests": [
+            self.get_auth(), self.get_auth(baseamount="2000")]}])
+        requests = replay.get_requests(path)
+        self.assertEqual(len(requests), 2)
+        self.assertFalse("requestreference" in requests[0])
+        self.assertEqual(requests[0]["requesttypedescriptions"], ["AUTH"])
+        self.assertEqual(requests[0]["pan"], "****************")
+        self.assertEqual([request["baseamount"] for request in
+                          requests[1]["requests"]], ["1050", "2000"])
+
+    def test__redact(self):
+        tests = [({"pan": "4111", "a": "b"}, {"pan": "****", "a": "b"}),
+                 ({"request": [{"securitycode": "123"}]},
+                  {"request": [{"securitycode": "***"}]}),
+                 ({"pan": None}, {"pan": None}),
+                 ]
+
+        for value, expected in tests:
+            self.assertEqual(replay._redact(value, replay.redacted_fields),
+                             expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,7 @@
 #!/usr/bin/env python
+import copy
+import json
+import pickle
 import unittest
 import securetrading
 from securetrading.test import abstract_test_stobjects
@@ -120,5 +123,172 @@ outer 'securetrading.Requests' object"]),
                                       requests_list)
 
 
+class Test_RequestTemplate(abstract_test_stobjects.Abstract_Test_StObjects):
+
+    def setUp(self):
+        super(Test_RequestTemplate, self).setUp()
+        template = self.get_template()
+
+        class TemplateRequest(securetrading.TemplateRequest):
+
+            def __init__(self):
+                super(TemplateRequest, self).__init__(template)
+
+        self.class_ = TemplateRequest
+
+    def get_template(self):
+        return securetrading.RequestTemplate({
+            "sitereference": "test_site12345",
+            "accounttypedescription": "RECUR",
+            "currencyiso3a": "GBP",
+            "requesttypedescriptions": ["AUTH"],
+        })
+
+    def test_new(self):
+        template = self.get_template()
+        tests = [(None, {}),
+                 ({"baseamount": "1050"}, {"baseamount": "1050"}),
+                 ({"currencyiso3a": "USD", "parenttransactionreference": "1"},
+                  {"currencyiso3a": "USD", "parenttransactionreference": "1"}),
+                 ]
+
+        references = set()
+        for fields, exp_overlay in tests:
+            request = template.new(fields)
+            self.assertTrue(isinstance(request, securetrading.Request))
+            self.assertTrue(request.template is template)
+            six.assertRegex(self, request["requestreference"], "A[a-z0-9]+")
+            references.add(request["requestreference"])
+            expected = dict(template.fields, **exp_overlay)
+            expected["requestreference"] = request["requestreference"]
+            expected["versioninfo"] = securetrading.version_info
+            self.assertEqual(request, expected)
+            self.assertEqual(request.__dict__, {})
+        self.assertEqual(len(references), len(tests))
+
+        request = template.new()
+        request["requesttypedescriptions"].append("THREEDQUERY")
+        self.assertEqual(template.fields["requesttypedescriptions"],
+                         ["AUTH"])
+        self.assertEqual(template.new()["requesttypedescriptions"], ["AUTH"])
+
+    def test_new_field_names(self):
+        # Fields named like the methods of a TemplateRequest are kept as
+        # they are by every way of setting them
+        fields = {"changed": "yes", "all_changed": "yes", "mark_changed": "1",
+                  "template": "t", "_changed": "c"}
+        template = self.get_template()
+        tests = [lambda request: request.update(fields),
+                 lambda request: [request.__setitem__(key, fields[key])
+                                  for key in fields],
+                 lambda request: [request.setdefault(key, fields[key])
+                                  for key in fields],
+                 ]
+
+        for set_fields in tests + [None]:
+            if set_fields is None:
+                request = template.new(fields)
+            else:
+                request = template.new()
+                set_fields(request)
+            for key in fields:
+                self.assertEqual(request[key], fields[key])
+            self.assertEqual(request._changed,
+                             set(fields) | set(["requestreference"]))
+            self.assertTrue(request.template is template)
+            dumps = securetrading.util._load_json_backend("json")[0]
+            encoded = template._encode(request, dumps, "json")
+            self.assertEqual(json.loads(encoded), request)
+
+    def test___init__(self):
+        cachetoken = "17-6a0287dd04497ba8dab257acbd983741f55410b5c7094637d8c3\
+f0fb57bd25ec"
+        template = securetrading.RequestTemplate({"cachetoken": "eyJjYWNoZXR\
+va2VuIjogIjE3LTZhMDI4N2RkMDQ0OTdiYThkYWIyNTdhY2JkOTgzNzQxZjU1NDEwYjVjNzA5NDYzN\
+2Q4YzNmMGZiNTdiZDI1ZWMifQ=="})
+        self.assertEqual(template.fields["cachetoken"], cachetoken)
+        self.assertFalse("requestreference" in template.fields)
+        self.assertEqual(template._constant_keys,
+                         frozenset(["cachetoken", "versioninfo"]))
+        tests = [({"requestreference": "A1"},
+                  "The requestreference can not be part of a request \
+template"),
+                 ({"requests": []},
+                  "The requests can not be part of a request template"),
+                 ]
+
+        for fields, exp_message in tests:
+            six.assertRaisesRegex(self, AssertionError, exp_message,
+                                  securetrading.RequestTemplate, fields)
+
+    def test__encode(self):
+        def set_item(request):
+            request["baseamount"] = "2000"
+
+        def set_constant(request):
+            request["currencyiso3a"] = "USD"
+
+        def update_constant(request):
+            request.update({"sitereference": "other"})
+
+        def delete(request):
+            del request["accounttypedescription"]
+
+        def pop(request):
+            request.pop("currencyiso3a")
+
+        def append(request):
+            request["requesttypedescriptions"].append("THREEDQUERY")
+
+        tests = [(None, True),
+                 (set_item, True),
+                 (append, True),
+                 (set_constant, False),
+                 (update_constant, False),
+                 (delete, False),
+                 (pop, False),
+                 ]
+
+        template = self.get_template()
+        for change, exp_spliced in tests:
+            request = template.new({"baseamount": "1050"})
+            if change is not None:
+                change(request)
+            for backend in securetrading.util.get_json_backends():
+                dumps = securetrading.util._load_json_backend(backend)[0]
+                encoded = template._encode(request, dumps, backend)
+                self.assertEqual(encoded is not None, exp_spliced)
+                if encoded is not None:
+                    if isinstance(encoded, bytes):
+                        encoded = encoded.decode("utf-8")
+                    self.assertEqual(json.loads(encoded), request)
+
+    def test_pickle(self):
+        def delete(request):
+            del request["accounttypedescription"]
+
+        tests = [(None, {"requestreference", "baseamount"}),
+                 (delete, None),
+                 ]
+
+        template = self.get_template()
+        for change, exp_changed in tests:
+            request = template.new({"baseamount": "1050"})
+            if change is not None:
+                change(request)
+            for copied in [pickle.loads(pickle.dumps(request)),
+                           copy.copy(request)]:
+                self.assertTrue(type(copied) is securetrading.TemplateRequest)
+                self.assertEqual(copied, request)
+                self.assertEqual(copied.template.fields, template.fields)
+                self.assertEqual(copied._changed, exp_changed)
+                copied["orderreference"] = "order1"
+                self.assertFalse("orderreference" in request)
+                if exp_changed is not None:
+                    self.assertEqual(copied._changed,
+                                     exp_changed | {"orderreference"})
+                    self.assertEqual(request._changed, exp_changed)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import threading
+import unittest
+import securetrading
+from securetrading.retry import ExponentialBackoffRetryPolicy
+from securetrading.retry import RetryBudget
+from securetrading.retry import RetryPolicy
+from securetrading.test import abstract_test
+import six
+
+
+class MockRandom(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def uniform(self, low, high):
+        self.calls.append((low, high))
+        return high
+
+
+class Test_RetryPolicy(abstract_test.TestCase):
+
+    def test_get_sleep(self):
+        config = securetrading.Config()
+        policy = RetryPolicy()
+        for retry_sleep in [0.5, 0, 3]:
+            config.http_retry_sleep = retry_sleep
+            for attempt in [1, 2, 10]:
+                self.assertEqual(policy.get_sleep(config, attempt, 1),
+                                 retry_sleep)
+
+
+class Test_ExponentialBackoffRetryPolicy(abstract_test.TestCase):
+
+    def test___init__(self):
+        tests = [((), {}, None, None),
+                 ((1, 1, None), {}, None, None),
+                 ((0, 5), {}, AssertionError,
+                  "An int or float greater than 0 is required for the base \
+and cap"),
+                 (("1", 5), {}, AssertionError,
+                  "An int or float greater than 0 is required for the base \
+and cap"),
+                 ((1, 0.5), {}, AssertionError,
+                  "An int or float greater than 0 is required for the base \
+and cap"),
+                 ((), {"jitter": "equal"}, AssertionError,
+                  "Invalid jitter. Available options: None, full, \
+decorrelated"),
+                 ]
+
+        for args, kwargs, exp_exception, exp_message in tests:
+            if exp_exception is None:
+                ExponentialBackoffRetryPolicy(*args, **kwargs)
+            else:
+                six.assertRaisesRegex(self, exp_exception, exp_message,
+                                      ExponentialBackoffRetryPolicy,
+                                      *args, **kwargs)
+
+    def test_get_sleep(self):
+        config = securetrading.Config()
+        tests = [(None, [(1, None), (2, 0.1), (3, 0.2), (6, 0.4)],
+                  [0.1, 0.2, 0.4, 1], []),
+                 ("full", [(1, None), (2, 0.1), (3, 0.2), (6, 0.4)],
+                  [0.1, 0.2, 0.4, 1],
+                  [(0, 0.1), (0, 0.2), (0, 0.4), (0, 1)]),
+                 ("decorrelated", [(1, None), (2, 0.1), (3, 0.3), (6, 0.9)],
+                  [0.30000000000000004, 0.30000000000000004,
+                   0.8999999999999999, 1],
+                  [(0.1, 0.30000000000000004), (0.1, 0.30000000000000004),
+                   (0.1, 0.8999999999999999), (0.1, 2.7)]),
+                 ]
+
+        for jitter, calls, exp_sleeps, exp_random_calls in tests:
+            mock_random = MockRandom()
+            policy = ExponentialBackoffRetryPolicy(0.1, 1, jitter,
+                                                   random=mock_random)
+            actual = [policy.get_sleep(config, attempt, previous_sleep)
+                      for attempt, previous_sleep in calls]
+            self.assertEqual(actual, exp_sleeps)
+            self.assertEqual(mock_random.calls, exp_random_calls)
+
+    def test_get_sleep_random(self):
+        config = securetrading.Config()
+        for jitter, low in [("full", 0), ("decorrelated", 0.1)]:
+            policy = ExponentialBackoffRetryPolicy(0.1, 1, jitter)
+            previous_sleep = None
+            for attempt in range(1, 20):
+                previous_sleep = policy.get_sleep(config, attempt,
+                                                  previous_sleep)
+                self.assertTrue(low <= previous_sleep <= 1)
+
+
+class Test_RetryBudget(abstract_test.TestCase):
+
+    def test__withdraw(self):
+        config = securetrading.Config()
+        budget = RetryBudget(config)
+        # Without a configured budget every retry is allowed
+        for i in range(RetryBudget.burst * 2):
+            self.assertTrue(budget._withdraw())
+        config.http_retry_budget = 0.5
+        for i in range(RetryBudget.burst):
+            self.assertTrue(budget._withdraw())
+        self.assertFalse(budget._withdraw())
+        budget._deposit()
+        self.assertFalse(budget._withdraw())
+        budget._deposit()
+        self.assertTrue(budget._withdraw())
+        self.assertFalse(budget._withdraw())
+
+    def test__deposit(self):
+        config = securetrading.Config()
+        budget = RetryBudget(config)
+        budget._tokens = 0
+        budget._deposit()
+        self.assertEqual(budget._tokens, 0)
+        config.http_retry_budget = 0.25
+        budget._deposit()
+        self.assertEqual(budget._tokens, 0.25)
+        for i in range(100):
+            budget._deposit()
+        self.assertEqual(budget._tokens, RetryBudget.burst)
+
+    def test__withdraw_threads(self):
+        config = securetrading.Config()
+        config.http_retry_budget = 0.1
+        budget = RetryBudget(config)
+        results = []
+
+        def withdraw():
+            for i in range(5):
+                results.append(budget._withdraw())
+
+        threads = [threading.Thread(target=withdraw) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), RetryBudget.burst)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import unittest
+import securetrading
+import securetrading.schema as schema
+from securetrading.test import abstract_test
+
+
+class Test_Schema(abstract_test.TestCase):
+
+    def get_request(self, **fields):
+        data = {"requesttypedescriptions": ["AUTH"],
+                "sitereference": "test_site12345",
+                "baseamount": "1050",
+                "currencyiso3a": "GBP",
+                }
+        data.update(fields)
+        for key, value in list(data.items()):
+            if value is None:
+                del data[key]
+        return self.get_securetrading_request(data)
+
+    def check_invalid(self, request_schema, request, exp_field):
+        try:
+            request_schema.check(request)
+        except securetrading.ApiError as e:
+            self.assertEqual(e.code, "30000")
+            self.assertEqual(e.data, [exp_field])
+        else:
+            self.fail("{0} was not invalid".format(exp_field))
+
+    def test_check(self):
+        tests = [({}, None),
+                 ({"baseamount": None, "mainamount": "10.50"}, None),
+                 ({"baseamount": None, "parenttransactionreference": "1-2-3",
+                   "currencyiso3a": None}, None),
+                 ({"baseamount": 1050}, None),
+                 ({"expirydate": "12/2031", "pan": "4111111111111111",
+                   "securitycode": "123",
+                   "billingemail": "joe@example.com"}, None),
+                 ({"requesttypedescriptions": ["ACCOUNTCHECK", "AUTH"]},
+                  None),
+                 ({"requesttypedescriptions": ["THREEDQUERY", "AUTH"]},
+                  None),
+                 ({"requesttypedescriptions": ["RISKDEC", "ACCOUNTCHECK",
+                                               "AUTH", "SUBSCRIPTION"]},
+                  None),
+                 ({"requesttypedescriptions": ["TRANSACTIONQUERY"],
+                   "filter": {}}, None),
+                 ({"sitereference": None}, "sitereference"),
+                 ({"baseamount": None}, "baseamount"),
+                 ({"currencyiso3a": None}, "currencyiso3a"),
+                 ({"baseamount": "10.50"}, "baseamount"),
+                 ({"baseamount": "1050\n"}, "baseamount"),
+                 ({"mainamount": "10.5x"}, "mainamount"),
+                 ({"expirydate": "13/2031"}, "expirydate"),
+                 ({"expirydate": "12/31"}, "expirydate"),
+                 ({"currencyiso3a": "GB"}, "currencyiso3a"),
+                 ({"pan": "4111"}, "pan"),
+                 ({"billingemail": "joe"}, "billingemail"),
+                 ({"requesttypedescriptions": None},
+                  "requesttypedescriptions"),
+                 ({"requesttypedescriptions": "AUTH"},
+                  "requesttypedescriptions"),
+                 ({"requesttypedescriptions": []}, "requesttypedescriptions"),
+                 ({"requesttypedescriptions": ["AUTH", "AUTH"]},
+                  "requesttypedescriptions"),
+                 ({"requesttypedescriptions": ["AUTH", "THREEDQUERY"]},
+                  "requesttypedescriptions"),
+                 ({"requesttypedescriptions": ["REFUND", "AUTH"]},
+                  "requesttypedescriptions"),
+                 ({"requesttypedescriptions": ["TRANSACTIONUPDATE",
+                                               "REFUND"]},
+                  "requesttypedescriptions"),
+                 ({"requesttypedescriptions": [{}]},
+                  "requesttypedescriptions"),
+                 ({"requesttypedescriptions": [1]},
+                  "requesttypedescriptions"),
+                 ({"requesttypedescriptions": ["UNKNOWN"]}, None),
+                 ({"requesttypedescriptions": ["STORE"]}, None),
+                 ({"requesttypedescriptions": ["STORE"],
+                   "sitereference": None}, "sitereference"),
+                 ({"requesttypedescriptions": ["REFUND"]},
+                  "parenttransactionreference"),
+                 ({"requesttypedescriptions": None,
+                   "requesttypedescription": "AUTH"}, None),
+                 ({"requesttypedescriptions": None,
+                   "requesttypedescription": "AUTH", "baseamount": None},
+                  "baseamount"),
+                 ({"requesttypedescriptions": None,
+                   "requesttypedescription": "REFUND"},
+                  "parenttransactionreference"),
+                 ({"requesttypedescriptions": None,
+                   "requesttypedescription": "UNKNOWN"}, None),
+                 ({"requesttypedescriptions": None,
+                   "requesttypedescription": ["AUTH"]},
+                  "requesttypedescription"),
+                 ({"requesttypedescription": "UNKNOWN"}, None),
+                 ]
+
+        request_schema = schema.Schema()
+        for fields, exp_field in tests:
+            request = self.get_request(**fields)
+            if exp_field is None:
+                request_schema.check(request)
+            else:
+                self.check_invalid(request_schema, request, exp_field)
+
+    def test_check_requests(self):
+        request_schema = schema.Schema()
+        tests = [([self.get_request(), self.get_request()], None),
+                 ([self.get_request(), self.get_request(pan="1")], "pan"),
+                 ([], None),
+                 ]
+
+        for requests_list, exp_field in tests:
+            requests = self.get_securetrading_requests(requests_list)
+            if exp_field is None:
+                request_schema.check(requests)
+            else:
+                self.check_invalid(request_schema, requests, exp_field)
+
+    def test_custom(self):
+        requesttypes = {"AUTH": ["orderreference"], "ORDER": []}
+        fields = {"orderreference": lambda value: value.startswith("order"),
+                  "baseamount": r"[0-9]{4}"}
+        request_schema = schema.Schema(requesttypes, fields)
+        tests = [({"orderreference": "order1"}, None),
+                 ({"orderreference": "order1", "sitereference": None,
+                   "currencyiso3a": None}, None),
+                 ({}, "orderreference"),
+                 ({"orderreference": "1"}, "orderreference"),
+                 ({"orderreference": "order1", "baseamount": "105"},
+                  "baseamount"),
+                 ({"requesttypedescriptions": ["ORDER"]}, None),
+                 ({"requesttypedescriptions": ["REFUND"]}, None),
+                 ({"requesttypedescriptions": ["ORDER", "AUTH"]},
+                  "requesttypedescriptions"),
+                 ]
+
+        for fields_, exp_field in tests:
+            request = self.get_request(**fields_)
+            if exp_field is None:
+                request_schema.check(request)
+            else:
+                self.check_invalid(request_schema, request, exp_field)
+
+    def test__get_checks(self):
+        request_schema = schema.Schema()
+        checks = request_schema._get_checks(["THREEDQUERY", "AUTH"])
+        self.assertTrue(request_schema._get_checks(
+            ["THREEDQUERY", "AUTH"]) is checks)
+        self.assertEqual([name for name, check in checks][:3],
+                         ["sitereference", "baseamount", "currencyiso3a"])
+        self.assertEqual(request_schema._get_checks(["REFUND", "AUTH"]),
+                         None)
+        self.assertEqual(request_schema._get_checks(["AUTH", "AUTH"]), None)
+        self.assertEqual(sorted(request_schema._checks),
+                         [("THREEDQUERY", "AUTH")])
+
+    def test_combinations(self):
+        tests = [(None, ["REFUND", "AUTH"], True),
+                 (None, ["AUTH", "AUTH"], False),
+                 ([["REFUND", "AUTH"]], ["REFUND", "AUTH"], True),
+                 ([["REFUND", "AUTH"]], ["THREEDQUERY", "AUTH"], False),
+                 ([], ["THREEDQUERY", "AUTH"], False),
+                 ([], ["AUTH"], True),
+                 ]
+
+        for combinations, requesttypes, exp_valid in tests:
+            request_schema = schema.Schema(combinations=combinations)
+            checks = request_schema._get_checks(requesttypes)
+            self.assertEqual(checks is not None, exp_valid)
+        self.assertTrue(("THREEDQUERY", "AUTH") in
+                        schema.default_combinations)
+        self.assertTrue(("ACCOUNTCHECK", "AUTH", "SUBSCRIPTION") in
+                        schema.default_combinations)
+
+
+if __name__ == "__main__":
+    unittest.main()
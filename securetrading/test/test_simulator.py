@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import gzip
+import io
+import json
+import random
+import socket
+import sys
+import unittest
+import six
+import securetrading
+import securetrading.simulator as simulator
+import securetrading.simulator.loadgen as loadgen
+from securetrading.simulator import __main__ as simulator_main
+from securetrading.test import abstract_test
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+
+class Test_simulator(abstract_test.TestCase):
+
+    def setUp(self):
+        self.simulator = simulator.GatewaySimulator(
+            username="webservices@example.com", password="Password1^",
+            seed=1)
+        self.simulator.start()
+
+    def tearDown(self):
+        self.simulator.stop()
+
+    def get_api(self, password="Password1^"):
+        config = securetrading.Config()
+        config.username = "webservices@example.com"
+        config.password = password
+        config.datacenterurl = self.simulator.url
+        config.http_max_retries = 0
+        config.http_retry_sleep = 0
+        return securetrading.Api(config)
+
+    def post(self, body, headers=None):
+        connection = six.moves.http_client.HTTPConnection(
+            self.simulator.host, self.simulator.port, timeout=5)
+        try:
+            connection.request("POST", "/json/", body, headers or {})
+            response = connection.getresponse()
+            return (response.status, dict(response.getheaders()),
+                    response.read())
+        finally:
+            connection.close()
+
+    def test_process(self):
+        tests = [("AUTH", {"baseamount": "1050", "currencyiso3a": "GBP",
+                           "pan": "4111111111111111"},
+                  {"authcode": "TEST22", "baseamount": "1050",
+                   "currencyiso3a": "GBP", "maskedpan": "411111######1111",
+                   "operatorname": "webservices@example.com"}),
+                 ("ACCOUNTCHECK", {"baseamount": "1050"},
+                  {"authcode": "", "baseamount": "0"}),
+                 ("CURRENCYRATE", {"baseamount": "1000"},
+                  {"dccbaseamount": "1000", "dccmainamount": "12.35",
+                   "dccconversionrate": "1.2345"}),
+                 ("THREEDQUERY", {}, {"enrolled": "Y", "status": "C"}),
+                 ("TRANSACTIONQUERY", {}, {"found": "1"}),
+                 ("UNKNOWN", {}, {"errorcode": "30000",
+                                  "errordata": ["requesttypedescriptions"]}),
+                 ]
+
+        api = self.get_api()
+        for requesttype, fields, expected in tests:
+            request = securetrading.Request()
+            request.update(dict(fields, requesttypedescriptions=[
+                requesttype]))
+            response = api.process(request)
+            self.assertEqual(response["requestreference"],
+                             request["requestreference"])
+            sub_response = response["responses"][0]
+            self.assertEqual(sub_response["requestreference"],
+                             request["requestreference"])
+            self.assertEqual(sub_response["requesttypedescription"],
+                             requesttype)
+            self.assertEqual(sub_response.get("errorcode"),
+                             expected.get("errorcode", "0"))
+            for key, value in expected.items():
+                self.assertEqual(sub_response[key], value)
+
+    def test_process_multiple_requesttypes(self):
+        response = self.get_api().process(
+            {"requesttypedescriptions": ["ACCOUNTCHECK", "AUTH"]})
+        self.assertEqual([sub_response["requesttypedescription"]
+                          for sub_response in response["responses"]],
+                         ["ACCOUNTCHECK", "AUTH"])
+        self.assertNotEqual(
+            response["responses"][0]["transactionreference"],
+            response["responses"][1]["transactionreference"])
+
+    def test_process_requests(self):
+        requests = securetrading.Requests()
+        inner = [securetrading.Request(), securetrading.Request()]
+        for request in inner:
+            request["requesttypedescriptions"] = ["AUTH"]
+        requests["requests"] = inner
+        response = self.get_api().process(requests)
+        self.assertEqual(response["requestreference"],
+                         requests["requestreference"])
+        self.assertEqual([sub_response["errorcode"]
+                          for sub_response in response["responses"]],
+                         ["0", "0"])
+        self.assertEqual([sub_response["requestreference"]
+                          for sub_response in response["responses"]],
+                         [request["requestreference"] for request in inner])
+
+    def test__respond_disconnected(self):
+        errors = [BrokenPipeError, ConnectionResetError] if six.PY3 else\
+            [socket.error]
+
+        class File(object):
+
+            def __init__(self, error):
+                self.error = error
+
+            def write(self, data):
+                raise self.error()
+
+        for error in errors:
+            handler = simulator._Handler.__new__(simulator._Handler)
+            handler.server = self.simulator._server
+            handler.headers = {}
+            handler.request_version = "HTTP/1.1"
+            handler.requestline = "POST /json/ HTTP/1.1"
+            handler.command = "POST"
+            handler.wfile = File(error)
+            handler.close_connection = False
+            handler._respond(200, b"{}", "application/json")
+            self.assertTrue(handler.close_connection)
+
+    def test_unauthorised(self):
+        response = self.get_api(password="wrong").process(
+            {"requesttypedescriptions": ["AUTH"]})
+        self.assertEqual(response["responses"][0]["errorcode"], "6")
+        self.assertEqual(self.simulator.unauthorised, 1)
+
+    def test_decline(self):
+        self.simulator.decline_rate = 1
+        response = self.get_api().process(
+            {"requesttypedescriptions": ["AUTH", "THREEDQUERY"]})
+        self.assertEqual(response["responses"][0]["errorcode"], "70000")
+        self.assertEqual(response["responses"][0]["acquirerresponsecode"],
+                         "05")
+        self.assertEqual(response["responses"][1]["errorcode"], "0")
+
+    def test_reset(self):
+        self.simulator.reset_rate = 1
+        response = self.get_api().process(
+            {"requesttypedescriptions": ["AUTH"]})
+        self.assertEqual(response["responses"][0]["errorcode"], "7")
+        self.assertEqual(self.simulator.resets, self.simulator.requests)
+
+    def test_gzip(self):
+        body = json.dumps({"version": "1.00", "request": [
+            {"requestreference": "Aabc", "requesttypedescriptions": [
+                "AUTH"]}]})
+        tests = [({"Accept-Encoding": "gzip, deflate"}, True, True),
+                 ({}, True, False),
+                 ({"Accept-Encoding": "gzip"}, False, False),
+                 ]
+
+        authorization = "Basic \
+d2Vic2VydmljZXNAZXhhbXBsZS5jb206UGFzc3dvcmQxXg=="
+        for headers, enabled, exp_gzipped in tests:
+            self.simulator.gzip = enabled
+            headers = dict(headers, Authorization=authorization)
+            status, response_headers, data = self.post(body, headers)
+            self.assertEqual(status, 200)
+            self.assertEqual(response_headers.get("Content-Encoding") ==
+                             "gzip", exp_gzipped)
+            if exp_gzipped:
+                data = gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+            response = json.loads(data.decode("utf-8"))
+            self.assertEqual(response["requestreference"], "Aabc")
+
+    def test_bad_request(self):
+        self.simulator.username = None
+        status, _, data = self.post("not json")
+        self.assertEqual(status, 400)
+
+    def test__get_latency(self):
+        tests = [(None, 0.0, 0.0),
+                 (0.25, 0.25, 0.25),
+                 ("fixed:0.5", 0.5, 0.5),
+                 ("uniform:0.1,0.2", 0.1, 0.2),
+                 ("normal:0.05,0.01", 0.0, 1.0),
+                 ("lognormal:-3,0.5", 0.0, 1.0),
+                 ("exponential:0.05", 0.0, 10.0),
+                 ("normal:-5,0.01", 0.0, 0.0),
+                 (lambda random_: 0.3, 0.3, 0.3),
+                 ]
+
+        random_ = random.Random(1)
+        for spec, minimum, maximum in tests:
+            latency = simulator._get_latency(spec)
+            for i in range(20):
+                delay = latency(random_)
+                self.assertTrue(minimum <= delay <= maximum,
+                                "{0} {1}".format(spec, delay))
+
+    def test__get_latency_invalid(self):
+        tests = ["fixed", "fixed:a", "uniform:0.1", "normal:1,2,3",
+                 "poisson:1"]
+
+        for spec in tests:
+            exp_message = "A latency of fixed:S, .* is required, not \
+{0}".format(spec)
+            six.assertRaisesRegex(self, AssertionError, exp_message,
+                                  simulator._get_latency, spec)
+
+
+@unittest.skipIf(futures is None, "concurrent.futures is not installed")
+class Test_loadgen(abstract_test.TestCase):
+
+    def test__get_percentile(self):
+        values = list(range(1, 101))
+        tests = [(50, 50),
+                 (95, 95),
+                 (99, 99),
+                 (100, 100),
+                 (0, 1),
+                 ]
+
+        for percentile, expected in tests:
+            self.assertEqual(loadgen._get_percentile(values, percentile),
+                             expected)
+        self.assertEqual(loadgen._get_percentile([], 50), None)
+
+    def test_run_load(self):
+        with simulator.GatewaySimulator(decline_rate=1,
+                                        latency="fixed:0.001") as running:
+            config = securetrading.Config()
+            config.username = "webservices@example.com"
+            config.password = "Password1^"
+            config.datacenterurl = running.url
+            api = securetrading.Api(config)
+            report = loadgen.run_load(
+                api, lambda: {"requesttypedescriptions": ["AUTH"]}, rps=100,
+                duration=0.2, max_workers=4)
+            api.close()
+        self.assertEqual(report["requests"], 20)
+        self.assertEqual(report["target_rps"], 100)
+        self.assertEqual(report["errors"], {"70000": 20})
+        self.assertTrue(report["throughput"] > 0)
+        for name in ["latency", "service_time"]:
+            summary = report[name]
+            self.assertTrue(0.001 <= summary["p50"] <= summary["p95"] <=
+                            summary["p99"] <= summary["max"])
+        lines = loadgen.format_report(report)
+        self.assertEqual(lines[0], "requests    20")
+        self.assertEqual(lines[3], "errors      70000: 20")
+
+        exp_message = "A target rate and duration greater than 0 are required"
+        six.assertRaisesRegex(self, AssertionError, exp_message,
+                              loadgen.run_load, api, dict, 0, 1)
+
+    def test_main_load(self):
+        stdout = six.StringIO()
+        original_stdout = sys.stdout
+        try:
+            sys.stdout = stdout
+            status = simulator_main.main(["load", "--rps", "50",
+                                          "--duration", "0.1"])
+        finally:
+            sys.stdout = original_stdout
+        self.assertEqual(status, 0)
+        self.assertTrue(stdout.getvalue().startswith("requests    5\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
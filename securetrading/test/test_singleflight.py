@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import threading
+import time
+import unittest
+import securetrading
+from securetrading.singleflight import SingleFlight
+from securetrading.test import abstract_test
+
+
+class Test_SingleFlight(abstract_test.TestCase):
+
+    def get_response(self, requestreference):
+        response = securetrading.Response()
+        response.update({"requestreference": requestreference,
+                         "responses": [{"requestreference": requestreference,
+                                        "errorcode": "0",
+                                        }],
+                         })
+        return response
+
+    def test__is_enabled(self):
+        currencyrate = {"requesttypedescriptions": ["CURRENCYRATE"]}
+        query = {"requesttypedescriptions": ["TRANSACTIONQUERY"]}
+        tests = [(currencyrate, ["CURRENCYRATE"], True),
+                 (currencyrate, ["TRANSACTIONQUERY"], False),
+                 (currencyrate, [], False),
+                 ({"requesttypedescriptions": ["AUTH"]},
+                  ["CURRENCYRATE", "TRANSACTIONQUERY"], False),
+                 ({}, ["CURRENCYRATE"], False),
+                 ({"requests": [currencyrate, query]},
+                  ["CURRENCYRATE", "TRANSACTIONQUERY"], True),
+                 ({"requests": [currencyrate, query]},
+                  ["CURRENCYRATE"], False),
+                 ]
+
+        for request, requesttypes, expected in tests:
+            config = securetrading.Config()
+            config.singleflight_requesttypes = requesttypes
+            self.assertEqual(SingleFlight(config)._is_enabled(request),
+                             expected)
+
+    def test__do(self):
+        single_flight = SingleFlight(securetrading.Config())
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def function():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return self.get_response("leader")
+
+        results = {}
+        timings = {}
+
+        def run(reference):
+            timings[reference] = securetrading.Timings(reference)
+            results[reference] = single_flight._do("key", function,
+                                                   reference,
+                                                   timings[reference])
+
+        leader = threading.Thread(target=run, args=("leader",))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=run, args=("r{0}".format(i),))
+                     for i in range(3)]
+        for follower in followers:
+            follower.start()
+        while single_flight.shared < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(single_flight.shared, 3)
+        for reference in ["leader", "r0", "r1", "r2"]:
+            self.assertEqual(results[reference],
+                             self.get_response(reference))
+        self.assertEqual(len(set(id(result)
+                                 for result in results.values())), 4)
+        self.assertEqual(single_flight._calls, {})
+        self.assertEqual(timings["leader"].phases, {})
+        for reference in ["r0", "r1", "r2"]:
+            self.assertEqual(list(timings[reference].phases),
+                             ["single_flight"])
+        # A later call is not shared with the completed one
+        self.assertEqual(single_flight._do("key", function, "later"),
+                         self.get_response("leader"))
+        self.assertEqual(len(calls), 2)
+
+    def test__do_error(self):
+        single_flight = SingleFlight(securetrading.Config())
+        started = threading.Event()
+        release = threading.Event()
+        error = securetrading.ConnectionError("7", data=["Failed"])
+
+        def function():
+            started.set()
+            release.wait(5)
+            raise error
+
+        errors = []
+
+        def run(reference):
+            try:
+                single_flight._do("key", function, reference)
+            except securetrading.ConnectionError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=("r{0}".format(i),))
+                   for i in range(3)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while single_flight.shared < 2:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [error] * 3)
+        self.assertEqual(single_flight._calls, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
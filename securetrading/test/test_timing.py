@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals
+import unittest
+import securetrading
+from securetrading.test import abstract_test
+
+
+class Test_Timings(abstract_test.TestCase):
+
+    def test___init__(self):
+        timings = securetrading.Timings("A1")
+        self.assertEqual(timings.request_reference, "A1")
+        self.assertEqual(timings.phases, {})
+        self.assertEqual(timings.attempts, [])
+        self.assertEqual(timings.total, None)
+
+    def test__measure(self):
+        timings = securetrading.Timings()
+        with timings._measure("encode"):
+            pass
+        first = timings.phases["encode"]
+        self.assertTrue(first >= 0)
+        try:
+            with timings._measure("encode"):
+                raise ValueError("failed")
+        except ValueError:
+            pass
+        self.assertTrue(timings.phases["encode"] >= first)
+        self.assertEqual(list(timings.phases), ["encode"])
+
+    def test__add(self):
+        tests = [([("connect", 0.5)], {"connect": 0.5}),
+                 ([("connect", 0.5), ("connect", 0.25)], {"connect": 0.75}),
+                 ([("connect", 0.5), ("decode", 0.25)],
+                  {"connect": 0.5, "decode": 0.25}),
+                 ([], {}),
+                 ]
+
+        for additions, expected in tests:
+            timings = securetrading.Timings()
+            for phase, seconds in additions:
+                timings._add(phase, seconds)
+            self.assertEqual(timings.phases, expected)
+
+    def test__add_attempt(self):
+        timings = securetrading.Timings()
+        timings._add_attempt("https://a.com", 1.5, "ConnectTimeout()")
+        timings._add_attempt("https://b.com", 0.5)
+        self.assertEqual(timings.attempts,
+                         [{"url": "https://a.com", "seconds": 1.5,
+                           "error": "ConnectTimeout()", "status": None},
+                          {"url": "https://b.com", "seconds": 0.5,
+                           "error": None, "status": None},
+                          ])
+
+    def test__set_status(self):
+        timings = securetrading.Timings()
+        timings._set_status(200)
+        self.assertEqual(timings.attempts, [])
+        timings._add_attempt("https://a.com", 1.5, "ConnectTimeout()")
+        timings._add_attempt("https://b.com", 0.5)
+        timings._set_status(200)
+        self.assertEqual([attempt["status"] for attempt in timings.attempts],
+                         [None, 200])
+
+    def test_as_dict(self):
+        timings = securetrading.Timings()
+        self.assertEqual(timings.as_dict(), {"total": None, "attempts": []})
+        timings._add("encode", 0.5)
+        timings._add_attempt("https://a.com", 1.5)
+        timings._finish()
+        actual = timings.as_dict()
+        self.assertEqual(actual, {"encode": 0.5, "total": timings.total,
+                                  "attempts": [{"url": "https://a.com",
+                                                "seconds": 1.5,
+                                                "error": None,
+                                                "status": None}]})
+        self.assertTrue(timings.total >= 0)
+        actual["attempts"][0]["url"] = "changed"
+        self.assertEqual(timings.attempts[0]["url"], "https://a.com")
+
+
+if __name__ == "__main__":
+    unittest.main()
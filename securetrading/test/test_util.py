@@ -5,12 +5,50 @@ import re
 import securetrading
 import securetrading.util as util
 from securetrading.test import abstract_test
+import json
+import logging
+import os
 import sys
 import six
 
 
 class Test_util(abstract_test.TestCase):
 
+    def test__check_fork(self):
+        calls = []
+
+        class Handler(object):
+
+            def _after_fork(self):
+                calls.append(os.getpid())
+
+        handler = Handler()
+        original = (util._pid, util._registered_at_fork)
+        tests = [(True, -1, []),
+                 (False, os.getpid(), []),
+                 (False, -1, [os.getpid()]),
+                 ]
+
+        # A lock held by another thread of the parent when it forked
+        revision_lock = securetrading.config._revision_lock
+        revision_lock.acquire()
+        try:
+            util._register_after_fork(handler)
+            for registered_at_fork, pid, exp_calls in tests:
+                calls[:] = []
+                util._registered_at_fork = registered_at_fork
+                util._pid = pid
+                util._check_fork()
+                self.assertEqual(calls, exp_calls)
+                self.assertEqual(securetrading.config._revision_lock is
+                                 revision_lock, not exp_calls)
+            self.assertEqual(util._pid, os.getpid())
+            securetrading.Config().locale = "en_gb"
+        finally:
+            util._pid, util._registered_at_fork = original
+            util._fork_handlers.discard(handler)
+            revision_lock.release()
+
     def test__get_random(self):
 
         test_cases = [(10, "0123456789abcdefghjkmnpqrtuvwxy"),
@@ -82,6 +120,241 @@ kontaktieren Sie bitte Trust Payments"),
             actual = util._get_errormessage(code, gateway_err_msg, phrasebook)
             self.assertEqual(expected, actual)
 
+    def test_set_json_backend(self):
+        original = util.get_json_backend()
+        original_env = os.environ.pop("SECURETRADING_JSON_BACKEND", None)
+        try:
+            util.set_json_backend("json")
+            self.assertEqual(util.get_json_backend(), "json")
+            self.assertEqual(util._json_dumps({"a": 1}), '{"a": 1}')
+
+            util.set_json_backend()
+            self.assertEqual(util.get_json_backend(),
+                             util.get_json_backends()[0])
+
+            os.environ["SECURETRADING_JSON_BACKEND"] = "json"
+            util.set_json_backend()
+            self.assertEqual(util.get_json_backend(), "json")
+
+            six.assertRaisesRegex(self, AssertionError,
+                                  "Unknown JSON backend missing",
+                                  util.set_json_backend, "missing")
+            self.assertEqual(util.get_json_backend(), "json")
+        finally:
+            os.environ.pop("SECURETRADING_JSON_BACKEND", None)
+            if original_env is not None:
+                os.environ["SECURETRADING_JSON_BACKEND"] = original_env
+            util.set_json_backend(original)
+
+    def test_register_json_backend(self):
+        original = util.get_json_backend()
+        calls = []
+
+        def dumps(obj):
+            calls.append("dumps")
+            return json.dumps(obj)
+
+        def loads(data):
+            calls.append("loads")
+            raise ValueError("Custom backend error")
+
+        try:
+            util.register_json_backend("custom", dumps, loads)
+            self.assertEqual(util.get_json_backends()[-1], "custom")
+            self.assertEqual(util.get_json_backends()[-2], "json")
+            util.set_json_backend("custom")
+            self.assertEqual(util._json_dumps([1]), "[1]")
+            self.assertEqual(util._json_loads("[2]"), [2])
+            # Errors are always those of the standard library
+            six.assertRaisesRegex(self, ValueError,
+                                  "Expecting value: line 1 column 1",
+                                  util._json_loads, "BAD")
+            self.assertEqual(calls, ["dumps", "loads", "loads"])
+        finally:
+            util.set_json_backend(original)
+            del util._json_backends["custom"]
+
+    def test__load_json_backend(self):
+        original = util.get_json_backend()
+        calls = []
+
+        def load_lazy():
+            calls.append("lazy")
+            return json.dumps, json.loads
+
+        def load_missing():
+            calls.append("missing")
+            raise ImportError("No module named missing")
+
+        try:
+            util._json_backend_loaders["lazy"] = load_lazy
+            util._json_backend_loaders["missing"] = load_missing
+            self.assertEqual(util.get_json_backends()[-2:],
+                             ["lazy", "missing"])
+            self.assertEqual(calls, [])
+            util.set_json_backend("lazy")
+            self.assertEqual(util.get_json_backend(), "lazy")
+            self.assertEqual(util._json_dumps([1]), "[1]")
+            self.assertTrue(util._load_json_backend("lazy") is
+                            util._json_backends["lazy"])
+            self.assertFalse("lazy" in util._json_backend_loaders)
+            six.assertRaisesRegex(self, AssertionError,
+                                  "Unknown JSON backend missing",
+                                  util.set_json_backend, "missing")
+            self.assertFalse("missing" in util.get_json_backends())
+            self.assertEqual(util._load_json_backend("unknown"), None)
+            self.assertEqual(calls, ["lazy", "missing"])
+        finally:
+            util.set_json_backend(original)
+            util._json_backends.pop("lazy", None)
+            util._json_backend_loaders.pop("lazy", None)
+            util._json_backend_loaders.pop("missing", None)
+
+    def test_json_backends(self):
+        original = util.get_json_backend()
+        try:
+            for backend in util.get_json_backends():
+                util.set_json_backend(backend)
+                data = {"a": [self.uni, 1, None, True]}
+                encoded = util._json_dumps(data)
+                self.assertEqual(json.loads(encoded), data)
+                self.assertEqual(util._json_loads(encoded), data)
+                self.assertRaises(TypeError, util._json_dumps,
+                                  {"a": self.byt_uni})
+                # Encoded by the standard library if the backend cannot
+                encoded = util._json_dumps({1: "a", "b": 2 ** 70})
+                if isinstance(encoded, bytes):
+                    encoded = encoded.decode("utf-8")
+                self.assertEqual(json.loads(encoded), {"1": "a", "b": 2 ** 70})
+                self.assertRaises(TypeError, util._json_dumps,
+                                  {1: self.byt_uni})
+                six.assertRaisesRegex(self, ValueError,
+                                      "Expecting value: line 1 column 1",
+                                      util._json_loads, "BAD")
+        finally:
+            util.set_json_backend(original)
+
+    def capture_logs(self, level, handler_filter=None, formatter=None):
+        records = []
+
+        class Handler(logging.Handler):
+
+            def emit(self, record):
+                if formatter is not None:
+                    records.append(self.format(record))
+                    return
+                records.append("{0} {1} {2}".format(
+                    record.levelname,
+                    getattr(record, "requestreference", None),
+                    record.getMessage()))
+
+        handler = Handler()
+        if handler_filter is not None:
+            handler.addFilter(handler_filter)
+        if formatter is not None:
+            handler.setFormatter(formatter)
+        original_level = util.logger.level
+        util.logger.addHandler(handler)
+        util.logger.setLevel(level)
+        return records, handler, original_level
+
+    def release_logs(self, handler, original_level):
+        util.logger.removeHandler(handler)
+        util.logger.setLevel(original_level)
+
+    def test__log(self):
+        formats = []
+
+        class Value(object):
+
+            def __str__(self):
+                formats.append(1)
+                return "value"
+
+        tests = [(logging.DEBUG, ["DEBUG A1 A1 Setting value",
+                                  "INFO A1 A1 Finished: 0.50"], True),
+                 (logging.INFO, ["INFO A1 A1 Finished: 0.50"], False),
+                 (logging.ERROR, [], False),
+                 ]
+
+        for level, expected, formatted in tests:
+            del formats[:]
+            records, handler, original_level = self.capture_logs(level)
+            try:
+                util._log(logging.DEBUG, "A1", "Setting %s", Value())
+                util._log(logging.INFO, "A1", "Finished: %.2f", 0.5)
+            finally:
+                self.release_logs(handler, original_level)
+            self.assertEqual(records, expected)
+            # Only formatted when the record is emitted
+            self.assertEqual(bool(formats), formatted)
+
+    def test_SampledLogFilter(self):
+        tests = [(0, 0), (1, 200), (0.5, 100)]
+
+        for sample_rate, exp_kept in tests:
+            log_filter = util.SampledLogFilter(sample_rate)
+            records, handler, original_level = self.capture_logs(
+                logging.INFO, log_filter)
+            try:
+                for i in range(200):
+                    reference = "A{0}".format(i)
+                    util._log(logging.INFO, reference, "Begin")
+                    util._log(logging.INFO, reference, "End")
+                util._log(logging.WARNING, "A1", "Warning")
+                util.logger.info("No reference")
+            finally:
+                self.release_logs(handler, original_level)
+            self.assertEqual(records[-2:], ["WARNING A1 A1 Warning",
+                                            "INFO None No reference"])
+            kept = [record.split(" ")[1] for record in records[:-2]]
+            # Either both records of a request are kept or neither is
+            self.assertEqual(kept[::2], kept[1::2])
+            self.assertAlmostEqual(len(kept) / 2, exp_kept,
+                                   delta=exp_kept * 0.2)
+        exp_message = "A sample rate between 0 and 1 is required"
+        for sample_rate in [-0.1, 1.5, "1", True, None]:
+            six.assertRaisesRegex(self, AssertionError, exp_message,
+                                  util.SampledLogFilter, sample_rate)
+
+    def test_StructuredLogFormatter(self):
+        records, handler, original_level = self.capture_logs(
+            logging.INFO, formatter=util.StructuredLogFormatter())
+        try:
+            util._log(logging.INFO, "A1", "Connect time %.2f", 0.25)
+            try:
+                raise ValueError("Failed")
+            except ValueError:
+                util._log(logging.ERROR, "A1", "Unexpected error",
+                          exc_info=True)
+            util.logger.info("No reference")
+        finally:
+            self.release_logs(handler, original_level)
+        actual = [json.loads(record) for record in records]
+        for entry in actual:
+            self.assertTrue(isinstance(entry.pop("time"), float))
+        self.assertEqual(actual[0], {"level": "INFO",
+                                     "logger": "securetrading",
+                                     "requestreference": "A1",
+                                     "message": "A1 Connect time 0.25"})
+        self.assertTrue("ValueError: Failed" in actual[1].pop("exception"))
+        self.assertEqual(actual[1]["message"], "A1 Unexpected error")
+        self.assertEqual(actual[2]["requestreference"], None)
+
+    def test_enable_structured_logging(self):
+        stream = six.StringIO()
+        original_level = util.logger.level
+        handler = util.enable_structured_logging(
+            1, handler=logging.StreamHandler(stream))
+        try:
+            util._log(logging.DEBUG, "A1", "Hidden")
+            util._log(logging.INFO, "A1", "Shown")
+        finally:
+            self.release_logs(handler, original_level)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual([json.loads(line)["message"] for line in lines],
+                         ["A1 Shown"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,88 @@
+from __future__ import unicode_literals
+import time
+
+_clock = getattr(time, "perf_counter", time.time)
+
+
+class _Phase(object):
+
+    def __init__(self, timings, phase):
+        self.timings = timings
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timings._add(self.phase, _clock() - self.start)
+        return False
+
+
+class Timings(object):
+    """The time taken by each phase of one Api.process call.
+
+    The phases are "verify", "cache", "encode", "connect", "send_receive",
+"decode", "errormessage" and "single_flight", the time spent waiting for
+an identical request whose response is shared. A phase that did not run is
+absent and a phase that ran more than once holds the sum of its durations.
+Every attempt to send the request is listed in attempts.
+
+    The "connect" phase is only measured by the AsyncApi. The requests
+library used by the Api connects while it sends the request, so there the
+time taken to connect is part of "send_receive".
+
+    Usage:
+       >>> def on_timings(timings):
+       ...     histogram.observe(timings.total)
+       >>> st_api.add_timing_callback(on_timings)
+"""
+
+    def __init__(self, request_reference=""):
+        super(Timings, self).__init__()
+        self.request_reference = request_reference
+        self.phases = {}
+        self.attempts = []
+        self.total = None
+        self._start = _clock()
+
+    def _measure(self, phase):
+        return _Phase(self, phase)
+
+    def _add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    def _add_attempt(self, url, seconds, error=None):
+        self.attempts.append({"url": url,
+                              "seconds": seconds,
+                              "error": error,
+                              "status": None,
+                              })
+
+    def _set_status(self, status):
+        # The HTTP status is only known once the response has been read,
+        # after the attempt that received it was recorded.
+        if self.attempts:
+            self.attempts[-1]["status"] = status
+
+    def _finish(self):
+        self.total = _clock() - self._start
+
+    def as_dict(self):
+        """Returns the timings as a dict.
+
+        Returns:
+           A dict of each phase to its duration in seconds, plus the "total"
+duration and the list of "attempts", each with the "url", its duration in
+"seconds", the connection "error" or None and the HTTP "status" or None.
+
+        Usage:
+           >>> timings.as_dict()
+           {'verify': 2e-05, 'encode': 4e-05, ..., 'total': 0.31,
+            'attempts': [{'url': '...', 'seconds': 0.3, 'error': None,
+                          'status': 200}]}
+        """
+        result = dict(self.phases)
+        result["total"] = self.total
+        result["attempts"] = [dict(attempt) for attempt in self.attempts]
+        return result
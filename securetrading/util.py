@@ -3,6 +3,9 @@ from __future__ import unicode_literals
 import logging
 import os
 import sys
+import threading
+import weakref
+import zlib
 import securetrading
 
 logger = logging.getLogger("securetrading")
@@ -15,6 +18,304 @@ except ImportError:
     # Could use simplejson here if we wanted to.
     raise ImportError("Trust Payments API requires a JSON library")
 
+# Preferred order of the JSON backends, fastest first.
+json_backend_preference = ["orjson", "rapidjson", "ujson", "json"]
+_json_backends = {}
+# The installed backends that are only imported once they are selected
+_json_backend_loaders = {}
+_json_backend = None
+_json_dumps = json.dumps
+_json_loads = json.loads
+
+
+def _loads_with_json_errors(loads):
+    def wrapped(data):
+        try:
+            return loads(data)
+        except ValueError:
+            # Parse the invalid data again so that every backend reports
+            # the same error as the standard library.
+            return json.loads(data)
+    return wrapped
+
+
+def _dumps_with_json_fallback(dumps, as_bytes):
+    def wrapped(obj):
+        try:
+            return dumps(obj)
+        except TypeError:
+            # Encode what the backend does not support, such as dict keys
+            # that are not strings or integers outside 64 bits, with the
+            # standard library. Byte strings still raise a TypeError.
+            encoded = json.dumps(obj, separators=(",", ":"))
+            return encoded.encode("utf-8") if as_bytes else encoded
+    return wrapped
+
+
+def register_json_backend(name, dumps, loads):
+    """Registers a JSON backend that can be selected by set_json_backend.
+
+    Args:
+       name: [string] The name of the backend.
+       dumps: A function serialising an object to a JSON string or UTF-8
+bytes. It must raise a TypeError or UnicodeDecodeError for byte strings.
+       loads: A function parsing a JSON string. It must raise a ValueError
+for invalid JSON.
+
+    Usage:
+       >>> import simplejson
+       >>> securetrading.util.register_json_backend(
+       ...     "simplejson", simplejson.dumps, simplejson.loads)
+    """
+    if name != "json":
+        loads = _loads_with_json_errors(loads)
+    _json_backends[name] = (dumps, loads)
+    _json_backend_loaders.pop(name, None)
+
+
+def _load_json_backend(name):
+    # The dumps and loads of a backend, imported the first time it is
+    # needed, or None if it is not registered or cannot be imported.
+    functions = _json_backends.get(name)
+    if functions is None:
+        loader = _json_backend_loaders.get(name)
+        if loader is None:
+            return None
+        try:
+            dumps, loads = loader()
+        except ImportError:
+            _json_backend_loaders.pop(name, None)
+            return None
+        register_json_backend(name, dumps, loads)
+        functions = _json_backends[name]
+    return functions
+
+
+def get_json_backends():
+    """Returns the names of the registered JSON backends, fastest first.
+
+    The installed backends are included, although each is only imported
+once it is selected.
+    """
+    names = set(_json_backends) | set(_json_backend_loaders)
+    preferred = [name for name in json_backend_preference if name in names]
+    others = sorted(names - set(preferred))
+    return preferred + others
+
+
+def get_json_backend():
+    """Returns the name of the JSON backend currently in use."""
+    return _json_backend
+
+
+def set_json_backend(name=None):
+    """Selects the JSON backend used to encode requests and decode responses.
+
+    Args:
+       name: (optional [string]) The name of a registered backend. If None
+the fastest installed backend is used, or the one named in the
+SECURETRADING_JSON_BACKEND environment variable.
+
+    Raises:
+       AssertionError: If the backend is not registered.
+
+    Usage:
+       >>> securetrading.util.set_json_backend("json")
+    """
+    global _json_backend, _json_dumps, _json_loads
+    if name is None:
+        name = os.environ.get("SECURETRADING_JSON_BACKEND")
+    if name is None:
+        # The fastest backend that can be imported
+        for name in get_json_backends():
+            if _load_json_backend(name) is not None:
+                break
+    functions = _load_json_backend(name)
+    msg = "Unknown JSON backend {0}, available backends: {1}".format(
+        name, ", ".join(get_json_backends()))
+    assert functions is not None, msg
+    _json_dumps, _json_loads = functions
+    _json_backend = name
+
+
+def _load_orjson():
+    import orjson
+    return _dumps_with_json_fallback(orjson.dumps, True), orjson.loads
+
+
+def _load_rapidjson():
+    import rapidjson
+
+    def rapidjson_dumps(obj):
+        # Byte strings are rejected as they are by the standard library.
+        return rapidjson.dumps(obj, bytes_mode=rapidjson.BM_NONE)
+    return _dumps_with_json_fallback(rapidjson_dumps, False), rapidjson.loads
+
+
+def _load_ujson():
+    import ujson
+    return ujson.dumps, ujson.loads
+
+
+def _is_installed(module_name):
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        # Python 2
+        import imp
+        try:
+            imp.find_module(module_name)
+        except ImportError:
+            return False
+        return True
+    return find_spec(module_name) is not None
+
+
+def _register_json_backends():
+    register_json_backend("json", json.dumps, json.loads)
+    for name, loader in [("orjson", _load_orjson),
+                         ("rapidjson", _load_rapidjson),
+                         ("ujson", _load_ujson)]:
+        if _is_installed(name):
+            _json_backend_loaders[name] = loader
+
+
+_register_json_backends()
+set_json_backend()
+
+
+def _log(level, request_reference, msg, *args, **kwargs):
+    # The message is only formatted by a handler that emits it, so a
+    # disabled level only costs the isEnabledFor check.
+    if logger.isEnabledFor(level):
+        kwargs["extra"] = {"requestreference": request_reference}
+        logger.log(level, "%s " + msg, request_reference, *args, **kwargs)
+
+
+class SampledLogFilter(logging.Filter):
+    """Keeps the log records of a sample of the requests.
+
+    Whether a request is sampled only depends on its requestreference, so
+either every record of a request is kept or none are. Records at or above
+always_level, and records that are not about a request, are always kept.
+
+    Args:
+       sample_rate: (optional [int or float]) The fraction of requests to
+keep the records of, between 0 and 1.
+       always_level: (optional [int]) The level from which every record is
+kept.
+
+    Usage:
+       >>> handler.addFilter(securetrading.util.SampledLogFilter(0.01))
+    """
+
+    def __init__(self, sample_rate=1, always_level=logging.WARNING):
+        msg = "A sample rate between 0 and 1 is required"
+        assert isinstance(sample_rate, (int, float)) and\
+            not isinstance(sample_rate, bool) and 0 <= sample_rate <= 1, msg
+        super(SampledLogFilter, self).__init__()
+        self.sample_rate = sample_rate
+        self.always_level = always_level
+        self._threshold = int(sample_rate * 0x100000000)
+
+    def filter(self, record):
+        request_reference = getattr(record, "requestreference", None)
+        if record.levelno >= self.always_level or not request_reference:
+            return True
+        checksum = zlib.crc32(request_reference.encode("utf-8")) & 0xffffffff
+        return checksum < self._threshold
+
+
+class StructuredLogFormatter(logging.Formatter):
+    """Formats each log record as a single line JSON object.
+
+    The object holds the "time", "level", "logger", "requestreference" (or
+null) and "message" of the record, and the "exception" when there is one.
+
+    Usage:
+       >>> handler.setFormatter(securetrading.util.StructuredLogFormatter())
+    """
+
+    def format(self, record):
+        entry = {"time": record.created,
+                 "level": record.levelname,
+                 "logger": record.name,
+                 "requestreference": getattr(record, "requestreference",
+                                             None),
+                 "message": record.getMessage(),
+                 }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, sort_keys=True, default=repr)
+
+
+def enable_structured_logging(sample_rate=1, level=logging.INFO,
+                              handler=None):
+    """Logs the records of a sample of requests as structured JSON lines.
+
+    Adds a handler to the securetrading logger that formats its records
+with StructuredLogFormatter and keeps them with SampledLogFilter.
+
+    Args:
+       sample_rate: (optional [int or float]) The fraction of requests to
+log, between 0 and 1. Warnings and errors are always logged.
+       level: (optional [int]) The minimum level to log.
+       handler: (optional [logging.Handler]) The handler to use, defaults
+to a logging.StreamHandler writing to stderr.
+
+    Returns:
+       The handler added to the securetrading logger.
+
+    Usage:
+       >>> securetrading.util.enable_structured_logging(0.01)
+    """
+    if handler is None:
+        handler = logging.StreamHandler()
+    handler.setLevel(level)
+    handler.setFormatter(StructuredLogFormatter())
+    handler.addFilter(SampledLogFilter(sample_rate))
+    logger.addHandler(handler)
+    if logger.level == logging.NOTSET or logger.level > level:
+        logger.setLevel(level)
+    return handler
+
+
+# The objects whose _after_fork method is called in a forked child process,
+# and the pid they were last used in.
+_fork_handlers = weakref.WeakSet()
+_fork_handlers_lock = threading.Lock()
+_pid = os.getpid()
+_registered_at_fork = hasattr(os, "register_at_fork")
+
+
+def _register_after_fork(handler):
+    # A WeakSet is not safe to change from several threads at once.
+    with _fork_handlers_lock:
+        _fork_handlers.add(handler)
+
+
+def _after_fork_in_child():
+    global _pid, _fork_handlers_lock
+    _pid = os.getpid()
+    _fork_handlers_lock = threading.Lock()
+    config = sys.modules.get("securetrading.config")
+    if config is not None:
+        # Taken by every Config attribute assignment
+        config._revision_lock = threading.Lock()
+    for handler in list(_fork_handlers):
+        handler._after_fork()
+
+
+def _check_fork():
+    # Only needed where os.register_at_fork is unavailable, a request made
+    # in a forked child notices that the pid changed instead.
+    if not _registered_at_fork and os.getpid() != _pid:
+        _after_fork_in_child()
+
+
+if _registered_at_fork:
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
 
 def _is_python_2():
     return sys.version_info < (3, 0)
@@ -24,15 +325,9 @@ def _get_random(n, all_chars=list('0123456789abcdefghjkmnpqrtuvwxy'),
                 urandom=os.urandom,
                 ):
     length = len(all_chars)
-
-    def ord_or_not(x):
-        if _is_python_2():
-            x = ord(x)
-        return x
-
-    return "".join([all_chars[ord_or_not(c) % length] for c in urandom(n)])
+    # A bytearray iterates over ints on Python 2 as well as Python 3
+    return "".join([all_chars[c % length] for c in bytearray(urandom(n))])
 
 
 def _get_errormessage(error_code, error_message, phrasebook):
-    english = securetrading.error_messages.get(error_code, error_message)
-    return phrasebook.lookup(english)
+    return phrasebook.lookup_error(error_code, error_message)
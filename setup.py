@@ -44,7 +44,9 @@ setup(
         'Operating System :: OS Independent',
     ],
     keywords='securetrading api python trustpayments',
-    packages=["securetrading", "securetrading.test"],
+    packages=["securetrading", "securetrading.benchmark",
+              "securetrading.simulator",
+              "securetrading.test"],
     include_package_data=True,
     install_requires=['requests >= 2.9.0'],
     test_suite="securetrading.test.all",